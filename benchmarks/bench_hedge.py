@@ -0,0 +1,89 @@
+# coding=utf-8
+"""Mide la latencia de cola con y sin hedged requests.
+
+El servidor local tarda ``--delay`` segundos en responder y una fracción
+``--slow`` de las consultas tarda ``--slow-delay`` segundos más. Se lanzan
+``-n`` consultas con ``--threads`` hilos y se comparan los percentiles de
+latencia, las copias lanzadas y las que han llegado antes. También se
+comprueba que ``timeout`` corta las consultas bloqueadas.
+
+    $ python benchmarks/bench_hedge.py [-n 2000] [--slow 0.02]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests
+
+from pycatastro import PyCatastro
+from pycatastro.batch import map_batch
+from pycatastro.hedge import Hedger
+from pycatastro.metrics import Metrics
+from server import StandinServer
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(round(p / 100.0 * (len(values) - 1)))]
+
+
+def run(client, n, threads):
+    def query(i):
+        start = time.time()
+        client.ConsultaMunicipio('BARCELONA', str(i))
+        return time.time() - start
+
+    latencies = []
+    for result in map_batch(query, ((i,) for i in range(n)), threads,
+                            ordered=False):
+        if result.error is not None:
+            raise result.error
+        latencies.append(result.result)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=2000, help='consultas')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.005)
+    parser.add_argument('--slow', type=float, default=0.02,
+                        help='fracción de consultas lentas')
+    parser.add_argument('--slow-delay', type=float, default=0.5)
+    parser.add_argument('--percentile', type=float, default=95)
+    args = parser.parse_args()
+
+    print('%-8s %8s %8s %8s %8s %6s %6s' % (
+        'mode', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'fired', 'won'))
+    for mode in ('plain', 'hedged'):
+        with StandinServer(delay=args.delay, slow_fraction=args.slow,
+                           slow_delay=args.slow_delay) as server:
+            hedger = Hedger(args.percentile) if mode == 'hedged' else None
+            metrics = Metrics()
+            client = PyCatastro(base_url=server.url, pool_maxsize=args.threads * 2,
+                                hedger=hedger, hooks=[metrics])
+            latencies = run(client, args.n, args.threads)
+            stats = hedger.stats if hedger else {'fired': 0, 'won': 0}
+            print('%-8s %8.1f %8.1f %8.1f %8.1f %6d %6d' % (
+                mode, percentile(latencies, 50) * 1e3,
+                percentile(latencies, 95) * 1e3, percentile(latencies, 99) * 1e3,
+                max(latencies) * 1e3, stats['fired'], stats['won']))
+            client.close()
+            if hedger:
+                hedger.close()
+
+    with StandinServer(delay=1.0) as server:
+        client = PyCatastro(base_url=server.url, timeout=0.2)
+        start = time.time()
+        try:
+            client.ConsultaProvincia()
+            print('timeout: not raised')
+        except requests.Timeout:
+            print('timeout: raised after %.2fs' % (time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# coding=utf-8
+"""Mide el tiempo de ``import pycatastro`` en un intérprete nuevo.
+
+Importa el paquete ``-n`` veces, cada una en un proceso nuevo, y muestra la
+mediana. Termina con error si la mediana supera ``--max-ms`` o si la
+importación carga alguno de los módulos que sólo se necesitan al hacer la
+primera consulta, así que sirve para detectar regresiones del arranque.
+
+    $ python benchmarks/bench_import.py [-n 20] [--max-ms 100]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+LAZY = ('requests', 'urllib3', 'xmltodict', 'pkg_resources', 'lxml',
+        'aiohttp', 'numpy', 'pyarrow', 'sqlite3')
+"""Módulos que ``import pycatastro`` no debe cargar."""
+
+SCRIPT = '''
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+import pycatastro
+elapsed = time.perf_counter() - start
+print(json.dumps({'ms': elapsed * 1000,
+                  'loaded': [m for m in %r
+                             if m in sys.modules and m not in before]}))
+''' % (LAZY,)
+
+
+def measure():
+    # Los módulos que ya carga el arranque del intérprete no cuentan
+    output = subprocess.check_output(
+        [sys.executable, '-c', SCRIPT], cwd=ROOT,
+        env=dict(os.environ, PYTHONPATH=ROOT))
+    return json.loads(output.decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=20, help='importaciones')
+    parser.add_argument('--max-ms', type=float, default=100.0,
+                        help='mediana máxima (ms)')
+    args = parser.parse_args()
+    # La primera importación compila los .pyc
+    measure()
+    times = []
+    loaded = set()
+    for _ in range(args.n):
+        result = measure()
+        times.append(result['ms'])
+        loaded.update(result['loaded'])
+    times.sort()
+    median = times[len(times) // 2]
+    print('import pycatastro  median %.1f ms  min %.1f ms  max %.1f ms' % (
+        median, times[0], times[-1]))
+    failed = False
+    if loaded:
+        print('FAIL: loaded at import: %s' % ', '.join(sorted(loaded)))
+        failed = True
+    if median > args.max_ms:
+        print('FAIL: median %.1f ms > %.1f ms' % (median, args.max_ms))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# coding=utf-8
+"""Compara la memoria y el tiempo de xmltodict, los modelos y raw.
+
+Procesa ``-n`` veces la respuesta de Consulta_DNPRC de ``payloads`` y
+mantiene todos los resultados en memoria. El tiempo se mide en una pasada
+sin ``tracemalloc``.
+
+    $ python benchmarks/bench_models.py [-n 20000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import xmltodict
+
+from pycatastro.models import parse_inmuebles
+from pycatastro.parsers import get_parser
+from pycatastro.raw import RawResponse
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), 'payloads')
+
+
+def measure(parse, content, n):
+    # El tiempo se mide sin tracemalloc, que hace más lenta cada reserva
+    start = time.time()
+    results = [parse(content) for _ in range(n)]
+    elapsed = time.time() - start
+    del results
+    tracemalloc.start()
+    results = [parse(content) for _ in range(n)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return current / float(n), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=20000, help='resultados')
+    args = parser.parse_args()
+    with open(os.path.join(PAYLOADS, 'Consulta_DNPRC.xml'), 'rb') as f:
+        content = f.read()
+
+    def to_dict(content):
+        return xmltodict.parse(content, process_namespaces=False, xml_attribs=False)
+
+    def to_raw(content, parser=get_parser('xmltodict')):
+        # Cada respuesta tiene sus propios bytes, como al leerla de la red
+        return RawResponse('Consulta_DNPRC', bytes(bytearray(content)), parser)
+
+    for name, parse in (('xmltodict', to_dict), ('models', parse_inmuebles),
+                        ('raw', to_raw)):
+        size, elapsed = measure(parse, content, args.n)
+        print('%-10s %8.0f bytes/result %8.1f us/parse' % (
+            name, size, elapsed / args.n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
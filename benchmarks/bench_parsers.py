@@ -0,0 +1,45 @@
+# coding=utf-8
+"""Compara el tiempo de los procesadores de XML de pycatastro.parsers.
+
+Procesa las respuestas de ``payloads`` con cada procesador disponible.
+
+    $ python benchmarks/bench_parsers.py [-n 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pycatastro.parsers import PARSERS, get_parser
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), 'payloads')
+ENDPOINTS = ('Consulta_DNPRC', 'Consulta_DNPLOC', 'ConsultaVia', 'Consulta_RCCOOR')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=200, help='repeticiones')
+    args = parser.parse_args()
+    parsers = []
+    for name in PARSERS:
+        try:
+            parsers.append(get_parser(name))
+        except ImportError:
+            print('%s: no disponible' % name)
+    print('%-16s %8s' % ('', 'bytes') + ''.join('%12s' % p.name for p in parsers))
+    for endpoint in ENDPOINTS:
+        with open(os.path.join(PAYLOADS, endpoint + '.xml'), 'rb') as f:
+            content = f.read()
+        times = [
+            min(timeit.repeat(lambda: p.parse(content), number=args.n, repeat=3))
+            / args.n * 1e6
+            for p in parsers
+        ]
+        print('%-16s %8d' % (endpoint, len(content)) +
+              ''.join('%10.1fus' % t for t in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# coding=utf-8
+"""Compara procesar respuestas en un proceso y en un pool de procesos.
+
+Procesa ``-n`` copias de la respuesta de Consulta_DNPRC de ``payloads``
+hasta filas de :mod:`pycatastro.export`: primero en el proceso actual con
+varios hilos (limitado por el GIL) y después con
+:class:`pycatastro.pipeline.ParsePool` con distintos números de procesos y
+tamaños de lote.
+
+    $ python benchmarks/bench_pipeline.py [-n 20000] [-p 1 2 4] [-b 1 64]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pycatastro.export import flatten
+from pycatastro.parsers import get_parser
+from pycatastro.pipeline import ParsePool
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), 'payloads')
+
+
+def threads(content, n, workers, parser):
+    parser = get_parser(parser)
+
+    def parse(content):
+        return list(flatten('Consulta_DNPRC', parser.parse(content)))
+
+    with ThreadPoolExecutor(workers) as executor:
+        return sum(len(rows) for rows in executor.map(parse, [content] * n))
+
+
+def processes(content, n, count, batch_size, parser):
+    with ParsePool('rows', parser, count, batch_size) as pool:
+        # Arranca los procesos antes de medir
+        pool.submit('Consulta_DNPRC', content)
+        pool.flush()
+        start = time.time()
+        futures = [pool.submit('Consulta_DNPRC', content) for _ in range(n)]
+        pool.flush()
+        rows = sum(len(f.result()) for f in futures)
+    return rows, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=20000, help='respuestas')
+    parser.add_argument('-p', type=int, nargs='+', default=[1, 2, 4],
+                        help='procesos')
+    parser.add_argument('-b', type=int, nargs='+', default=[1, 64],
+                        help='respuestas por lote')
+    parser.add_argument('--parser', default='expat', help='procesador de XML')
+    args = parser.parse_args()
+    with open(os.path.join(PAYLOADS, 'Consulta_DNPRC.xml'), 'rb') as f:
+        content = f.read()
+    print('cores: %d' % (os.cpu_count() or 1))
+    start = time.time()
+    rows = threads(content, args.n, 8, args.parser)
+    elapsed = time.time() - start
+    print('%-22s %8.0f responses/s  (%d rows)' % (
+        'threads (8)', args.n / elapsed, rows))
+    for count in args.p:
+        for batch_size in args.b:
+            rows, elapsed = processes(content, args.n, count, batch_size,
+                                      args.parser)
+            print('%-22s %8.0f responses/s  (%d rows)' % (
+                'processes %d, batch %d' % (count, batch_size),
+                args.n / elapsed, rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# coding=utf-8
+"""Compara consultas con ``requests.get`` contra el cliente con pool.
+
+    $ python benchmarks/bench_pool.py [-n 2000] [-t 8]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests
+import xmltodict
+
+from pycatastro import PyCatastro
+from server import StandinServer
+
+
+def unpooled(base_url):
+    url = base_url + '/OVCCallejero.asmx/ConsultaProvincia'
+
+    def call():
+        response = requests.get(url)
+        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+    return call
+
+
+def pooled(base_url, size):
+    client = PyCatastro(base_url=base_url, pool_maxsize=size)
+    return client.ConsultaProvincia
+
+
+def run(call, n, threads):
+    start = time.time()
+    with ThreadPoolExecutor(threads) as executor:
+        for _ in executor.map(lambda _: call(), range(n)):
+            pass
+    return n / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=2000, help='consultas')
+    parser.add_argument('-t', type=int, default=8, help='hilos')
+    args = parser.parse_args()
+    with StandinServer() as server:
+        before = run(unpooled(server.url), args.n, args.t)
+        after = run(pooled(server.url, args.t), args.n, args.t)
+    print('requests.get  %8.1f req/s' % before)
+    print('PyCatastro()  %8.1f req/s' % after)
+    print('speedup       %8.2fx' % (after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""Comprueba el limitador AIMD contra un servidor local que se satura.
+
+El servidor responde 503 por encima de ``--capacity`` consultas por
+segundo. Se lanzan consultas con muchos hilos con y sin limitador y se
+comparan las consultas correctas por segundo y las rechazadas.
+
+    $ python benchmarks/bench_ratelimit.py [--capacity 50] [-s 10]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pycatastro import PyCatastro
+from pycatastro.ratelimit import RateLimiter
+from server import StandinServer
+
+
+def run(base_url, seconds, threads, rate_limiter):
+    client = PyCatastro(base_url=base_url, pool_maxsize=threads,
+                        rate_limiter=rate_limiter)
+    ok = [0]
+    failed = [0]
+    lock = threading.Lock()
+    end = time.time() + seconds
+
+    def worker():
+        while time.time() < end:
+            try:
+                client.ConsultaProvincia()
+                result = ok
+            except Exception:
+                result = failed
+            with lock:
+                result[0] += 1
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return ok[0] / float(seconds), failed[0] / float(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--capacity', type=float, default=50)
+    parser.add_argument('-s', '--seconds', type=float, default=10)
+    parser.add_argument('-t', '--threads', type=int, default=16)
+    args = parser.parse_args()
+    for name, limiter in (('sin limitador', None),
+                          ('AIMD', RateLimiter(rate=5, max_rate=1000))):
+        with StandinServer(throttle_rate=args.capacity) as server:
+            ok, failed = run(server.url, args.seconds, args.threads, limiter)
+        print('%-14s %7.1f ok/s %7.1f rechazadas/s' % (name, ok, failed))
+        if limiter is not None:
+            print('%-14s tasa final %s' % ('', limiter.rates()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# coding=utf-8
+"""Servidor HTTP local que imita los servicios OVC del Catastro.
+
+Responde a cualquier ``/<servicio>.asmx/<consulta>`` con el XML registrado
+para esa consulta, de manera que los benchmarks no dependen del servicio
+real. Uso::
+
+    with StandinServer() as server:
+        client = PyCatastro(base_url=server.url)
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+DEFAULT_PAYLOAD = (
+    b'<?xml version="1.0" encoding="utf-8"?>'
+    b'<consulta_provinciero xmlns="http://www.catastro.meh.es/">'
+    b'<control><cuprov>1</cuprov></control>'
+    b'<provinciero><prov><cpine>8</cpine><np>BARCELONA</np></prov>'
+    b'</provinciero></consulta_provinciero>'
+)
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), 'payloads')
+
+
+def load_payloads(directory=PAYLOADS):
+    """Lee los XML ``<consulta>.xml`` de un directorio.
+
+       :return: XML por nombre de consulta
+       :rtype: dict
+    """
+
+    payloads = {}
+    for filename in os.listdir(directory):
+        name, ext = os.path.splitext(filename)
+        if ext == '.xml':
+            with open(os.path.join(directory, filename), 'rb') as f:
+                payloads[name] = f.read()
+    return payloads
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+    throttle_rate = None
+
+    def handle_error(self, request, client_address):
+        # Los clientes cortan conexiones a propósito (timeouts, hedging)
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            HTTPServer.handle_error(self, request, client_address)
+
+    def throttled(self):
+        """Cierto si se ha superado ``throttle_rate`` en el último segundo."""
+
+        if self.throttle_rate is None:
+            return False
+        with self.lock:
+            now = time.time()
+            while self.served and self.served[0] < now - 1:
+                self.served.popleft()
+            if len(self.served) >= self.throttle_rate:
+                self.throttled_count += 1
+                return True
+            self.served.append(now)
+            return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.server.throttled():
+            body = b'Service Unavailable'
+            self.send_response(503)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        endpoint = self.path.split('?', 1)[0].rsplit('/', 1)[-1]
+        body = self.server.payloads.get(endpoint, DEFAULT_PAYLOAD)
+        delay = self.server.delay
+        if self.server.slow_fraction:
+            with self.server.lock:
+                slow = self.server.random.random() < self.server.slow_fraction
+            if slow:
+                delay += self.server.slow_delay
+        if delay:
+            time.sleep(delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandinServer(object):
+    """Servidor en un hilo propio escuchando en ``127.0.0.1``.
+
+       :param dict: Opcional, XML a retornar por nombre de consulta
+       :param float: Opcional, consultas por segundo a partir de las que
+                     responde 503 como cuando el servicio está saturado
+       :param float: Segundos que tarda en responder cada consulta
+       :param float: Fracción de consultas que tardan ``slow_delay``
+                     segundos más, para simular la latencia de cola
+       :param float: Retraso adicional de las consultas lentas
+       :param int: Semilla de la elección de consultas lentas
+    """
+
+    def __init__(self, payloads=None, host='127.0.0.1', port=0,
+                 throttle_rate=None, delay=0, slow_fraction=0, slow_delay=0,
+                 seed=0):
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.payloads = payloads or {}
+        self.httpd.throttle_rate = throttle_rate
+        self.httpd.delay = delay
+        self.httpd.slow_fraction = slow_fraction
+        self.httpd.slow_delay = slow_delay
+        self.httpd.random = random.Random(seed)
+        self.httpd.throttled_count = 0
+        self.httpd.served = deque()
+        self.httpd.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%s/ovcservweb/OVCSWLocalizacionRC' % (host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
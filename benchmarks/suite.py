@@ -0,0 +1,156 @@
+# coding=utf-8
+"""Benchmark de todas las consultas de PyCatastro contra el servidor local.
+
+Reproduce las respuestas grabadas en ``payloads`` y mide, por consulta:
+
+* latencia de extremo a extremo (p50, p90, p99 y máxima) en serie,
+* consultas por segundo con distintos niveles de concurrencia,
+* tiempo de procesado del XML,
+* memoria máxima de una consulta.
+
+El resultado se escribe en JSON para poder compararlo entre versiones::
+
+    $ python benchmarks/suite.py -o actual.json
+    $ python benchmarks/suite.py --compare anterior.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pycatastro
+from pycatastro import PyCatastro
+from server import StandinServer, load_payloads
+
+CALLS = [
+    ('ConsultaProvincia', ()),
+    ('ConsultaMunicipio', ('BARCELONA',)),
+    ('ConsultaVia', ('BARCELONA', 'BARCELONA')),
+    ('ConsultaNumero', ('BARCELONA', 'BARCELONA', 'CL', 'MALLORCA', 401)),
+    ('Consulta_DNPLOC', ('BARCELONA', 'BARCELONA', 'CL', 'MALLORCA', 401)),
+    ('Consulta_DNPRC', ('BARCELONA', 'BARCELONA', '9872023VH5797S0001WX')),
+    ('Consulta_DNPPP', ('BARCELONA', 'SANT PERE DE VILAMAJOR', 1, 12)),
+    ('Consulta_RCCOOR', ('EPSG:4326', 2.1622138, 41.3965743)),
+    ('Consulta_RCCOOR_Distancia', ('EPSG:4326', 2.1622138, 41.3965743)),
+    ('Consulta_CPMRC', ('BARCELONA', 'BARCELONA', 'EPSG:4326', '9872023VH5797S')),
+]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def latency(call, n):
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': percentile(times, 50), 'p90_ms': percentile(times, 90),
+            'p99_ms': percentile(times, 99), 'max_ms': max(times)}
+
+
+def throughput(call, n, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for _ in executor.map(lambda _: call(), range(n)):
+            pass
+    return n / (time.perf_counter() - start)
+
+
+def peak_memory(call):
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run(args):
+    payloads = load_payloads()
+    results = {}
+    with StandinServer(payloads) as server:
+        client = PyCatastro(base_url=server.url, parser=args.parser,
+                           pool_maxsize=max(args.concurrency))
+        for name, params in CALLS:
+            method = getattr(client, name)
+            call = lambda: method(*params)
+            call()
+            content = payloads[name]
+            parse = min(timeit.repeat(lambda: client.parser.parse(content),
+                                      number=args.n, repeat=3)) / args.n
+            results[name] = {
+                'bytes': len(content),
+                'latency': latency(call, args.n),
+                'rps': dict(('c%d' % c, throughput(call, args.n, c))
+                            for c in args.concurrency),
+                'parse_ms': parse * 1000,
+                'peak_memory_bytes': peak_memory(call),
+            }
+            print('%-26s p50 %6.2fms  p99 %6.2fms  %s  parse %6.3fms' % (
+                name, results[name]['latency']['p50_ms'],
+                results[name]['latency']['p99_ms'],
+                '  '.join('c%d %6.0f/s' % (c, results[name]['rps']['c%d' % c])
+                          for c in args.concurrency),
+                results[name]['parse_ms']), file=sys.stderr)
+    return {
+        'version': pycatastro.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'parser': args.parser,
+        'n': args.n,
+        'endpoints': results,
+    }
+
+
+def compare(current, previous):
+    print('%-26s %10s %10s %10s' % ('', 'p50', 'parse', 'rps'), file=sys.stderr)
+    for name, data in sorted(current['endpoints'].items()):
+        old = previous['endpoints'].get(name)
+        if old is None:
+            continue
+        top = max(data['rps'], key=lambda k: int(k[1:]))
+        print('%-26s %9.2fx %9.2fx %9.2fx' % (
+            name,
+            data['latency']['p50_ms'] / old['latency']['p50_ms'],
+            data['parse_ms'] / old['parse_ms'],
+            data['rps'][top] / old['rps'].get(top, data['rps'][top]),
+        ), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', type=int, default=200,
+                        help='consultas por medida')
+    parser.add_argument('-c', '--concurrency', type=int, nargs='+',
+                        default=[1, 4, 16], help='niveles de concurrencia')
+    parser.add_argument('-p', '--parser', default='xmltodict',
+                        help='procesador de XML')
+    parser.add_argument('-o', '--output', help='fichero JSON de salida')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior')
+    args = parser.parse_args()
+    results = run(args)
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
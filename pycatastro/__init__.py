@@ -1,524 +1,529 @@
 # coding=utf-8
-import requests
-import xmltodict
+import copy
+import threading
+import types
+from timeit import default_timer as timer
 
+from pycatastro import models
+from pycatastro.cache import cache_key
+from pycatastro.endpoints import ENDPOINTS
+from pycatastro.metrics import Call
+from pycatastro.parsers import get_parser
+from pycatastro.raw import RawResponse
+from pycatastro.stream import iter_elements
+from pycatastro.version import __version__
 
-try:
-    __version__ = __import__('pkg_resources') \
-        .get_distribution(__name__).version
-except Exception as e:
-    __version__ = 'unknown'
 
+RESULT_TYPES = ('dict', 'model', 'raw')
 
-class PyCatastro(object):
-    base_url = "http://ovc.catastro.meh.es/ovcservweb/OVCSWLocalizacionRC"
 
-    @classmethod
-    def ConsultaProvincia(cls):
-        """Proporciona un listado de todas las provincias.
+class clientmethod(object):
+    """Método de consulta que se puede llamar desde la clase o una instancia.
 
-           Proporciona un listado de todas las provincias españolas en
-           las que tiene competencia la Dirección general del Catastro.
-           :return: Retorna un dicionario con los datos de la consulta
-           :rtype: dict
-        """
+       Llamado desde una instancia usa la conexión de esa instancia. Llamado
+       desde la clase (``PyCatastro.Consulta_DNPRC(...)``) usa el cliente
+       compartido que retorna :meth:`PyCatastro.default`.
+    """
 
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaProvincia"
-        response = requests.get(url)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
 
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            obj = objtype.default()
+        return types.MethodType(self.func, obj)
 
-    @classmethod
-    def ConsultaMunicipio(cls, provincia, municipio=None):
-        """Proporciona un listado de todos los municipios de una provincia.
-
-            Proporciona un listado de todos los nombres de los municipios de una
-            provincia (parámetro "Provincia"),así como sus códigos (de Hacienda
-            y del INE), cuyo nombre Servicios web del Catastro 5 contiene la cadena
-            del parámetro de entrada "Municipio". En caso de que este último
-            parámetro no tenga ningún valor, el servicio devuelve todos los
-            municipios de la  provincia.También proporciona información de si
-            existe cartografía catastral (urbana o rústica) de cada municipio.
-
-            :param str: Nombre de la provincia
-            :param str: Opcional , nombre del municipio
-            :return: Retorna un dicionario con los datos de la consulta
-            :rtype: dict
-        """
-
-        params = {'Provincia': provincia}
-        if municipio:
-            params['Municipio'] = municipio
-        else:
-            params['Municipio'] = ''
-
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaMunicipio"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
 
+class PyCatastro(object):
+    base_url = "http://ovc.catastro.meh.es/ovcservweb/OVCSWLocalizacionRC"
 
-    @classmethod
-    def ConsultaVia(cls, provincia, municipio, tipovia=None, nombrevia=None):
-        """Proporciona un listado de todas las vías de un municipio.
-
-            Proporciona un listado de todas las vías de un municipio (parámetros
-            "Provincia" y "Municipio"), así como los códigos de las mismas según la
-            Dirección General del Catastro (DGC) , cuyo nombre contiene la cadena
-            del parámetro de entrada "NombreVia" y, en caso de que el parámetro
-            "TipoVia" contenga información, existe coincidencia en el tipo de la
-            vía. En caso de que el parámetro "NombreVia" no tenga ningún valor, el
-            servicio devuelve todas las vías del municipio del "TipoVia" indicado.
-
-            :param str: Nombre de la provincia
-            :param str: Nombre de municipio
-            :return: Retorna un dicionario con los datos de la consutla
-            :rtype: dict
+    _default_lock = threading.Lock()
+
+    def __init__(self, base_url=None, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, keep_alive=True, session=None, cache=None,
+                 result='dict', parser='xmltodict', hooks=None,
+                 rate_limiter=None, single_flight=None, spatial_index=None,
+                 number_index=None, timeout=None, hedger=None):
+        """Cliente con un pool de conexiones persistentes.
+
+           Todas las consultas de una instancia comparten una misma
+           :class:`requests.Session`, de manera que las conexiones TCP con el
+           servidor se reutilizan entre llamadas. La sesión es segura para
+           usar desde varios hilos.
+
+           :param str: Opcional, URL base del servicio (por ejemplo un
+                       servidor local de pruebas)
+           :param int: Número de hosts distintos que mantiene el pool
+           :param int: Máximo de conexiones abiertas por host
+           :param bool: Si es cierto, espera a que quede una conexión libre
+                        en lugar de abrir conexiones fuera del pool
+           :param bool: Si es falso, cierra la conexión después de cada
+                        consulta
+           :param requests.Session: Opcional, sesión a utilizar
+           :param pycatastro.cache.Cache: Opcional, caché de respuestas
+           :param str: Tipo de resultado: ``'dict'`` para la estructura de
+                       ``xmltodict``, ``'model'`` para los objetos de
+                       :mod:`pycatastro.models` en las consultas que los
+                       tienen o ``'raw'`` para un
+                       :class:`pycatastro.raw.RawResponse` que procesa el XML
+                       sólo si se necesita (sin índices locales)
+           :param str,pycatastro.parsers.Parser: Procesador de XML para los
+                       resultados ``'dict'`` y ``'raw'`` (ver
+                       :mod:`pycatastro.parsers`)
+           :param list: Opcional, funciones a las que se llama después de
+                        cada consulta con un :class:`pycatastro.metrics.Call`
+                        (por ejemplo un :class:`pycatastro.metrics.Metrics`)
+           :param pycatastro.ratelimit.RateLimiter: Opcional, limitador de
+                        tasa compartido por las consultas
+           :param pycatastro.singleflight.SingleFlight: Opcional, agrupa
+                        las consultas idénticas que están en curso a la vez
+                        (el resultado se comparte, no se debe modificar)
+           :param pycatastro.spatial.SpatialIndex: Opcional, índice donde
+                        se guardan las parcelas de las consultas de
+                        coordenadas
+           :param pycatastro.streets.NumberIndex: Opcional, índice de los
+                        números de cada vía que responde localmente las
+                        consultas ConsultaNumero de números conocidos
+           :param float: Opcional, tiempo máximo (segundos) de cada consulta,
+                        incluidas la conexión y la lectura de la respuesta;
+                        si se supera se lanza :class:`requests.Timeout`
+           :param pycatastro.hedge.Hedger: Opcional, lanza una copia de las
+                        consultas que tardan más de lo habitual; la que
+                        pierde sólo se corta si se indica al crear el
+                        cliente y sin ``session``
         """
 
-        params = {'Provincia': provincia,
-                  'Municipio': municipio}
-        if tipovia:
-            params['TipoVia'] = tipovia
-        else:
-            params['TipoVia'] = ''
-        if nombrevia:
-            params['NombreVia'] = nombrevia
-        else:
-            params['NombreVia'] = ''
-
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaVia"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def ConsultaNumero(cls, provincia, municipio, tipovia, nombrevia, numero):
-        """Proporciona la referencia catastral de la finca correspondiente.
-
-            Proporciona,o bien la referencia catastral de la finca correspondiente
-            al contenido del parámetro "Número",en caso de que este exista,o bien se
-            devuelve un error ("El número no existe") y se proporciona una lista
-            de los números más aproximados al solicitado, en un rango de 5 por
-            arriba y 5 por abajo. Por ejemplo, si se solicita el número 10, y en
-            esa vía existen los números 2,3,6,7,9,11,15 y 17, se devuelve una lista
-            con los números 6,7,9,11 y 15.Junto con la lista de números, se
-            proporcionan las referencias catastrales de las fincas.
-
-            :param str: Nombre de la provincia
-            :param str: Nombre del municipio
-            :param str: Tipo d ela via
-            :param str: Nombre de la via
-            :param str,int: Numero del que se desea conocer la referencia
-            :return: Retorna un dicionario con los datos de la consutla
-            :rtype: dict
+        if result not in RESULT_TYPES:
+            raise ValueError('Invalid result type: %s' % result)
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+        if session is None:
+            # requests se importa al crear el primer cliente, no con el módulo
+            from requests import Session
+            from requests.adapters import HTTPAdapter
+
+            session = Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections,
+                                  pool_maxsize=pool_maxsize,
+                                  pool_block=pool_block)
+            if hedger is not None:
+                from pycatastro.hedge import abortable
+
+                abortable(adapter)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        self.session = session
+        self.cache = cache
+        self.result = result
+        self.parser = get_parser(parser)
+        self.hooks = list(hooks or [])
+        self.rate_limiter = rate_limiter
+        self.single_flight = single_flight
+        self.spatial_index = spatial_index
+        self.number_index = number_index
+        self.timeout = timeout
+        self.hedger = hedger
+
+    OPTIONS = ('timeout', 'hedger', 'cache', 'result', 'parser', 'hooks',
+               'rate_limiter', 'single_flight', 'spatial_index', 'number_index')
+    """Opciones que se pueden cambiar con :meth:`with_options`."""
+
+    def with_options(self, **options):
+        """Retorna una copia del cliente con otras opciones.
+
+           La copia comparte la sesión (y el pool de conexiones) y el resto
+           de opciones con el cliente original, así que sirve para cambiar
+           opciones de una sola consulta::
+
+               client.with_options(timeout=2).Consulta_DNPRC(...)
+
+           :param options: Opciones de :data:`OPTIONS` con su nuevo valor
+           :rtype: PyCatastro
         """
 
-        params = {'Provincia': provincia,
-                  'Municipio': municipio,
-                  'TipoVia': tipovia,
-                  'NomVia': nombrevia,
-                  'Numero': str(numero)}
-
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaNumero"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+        clone = copy.copy(self)
+        for name, value in options.items():
+            if name not in self.OPTIONS:
+                raise TypeError('Invalid option: %s' % name)
+            if name == 'result' and value not in RESULT_TYPES:
+                raise ValueError('Invalid result type: %s' % value)
+            if name == 'parser':
+                value = get_parser(value)
+            if name == 'hooks':
+                value = list(value or [])
+            setattr(clone, name, value)
+        return clone
 
     @classmethod
-    def Consulta_DNPLOC(cls, provincia, municipio, sigla, calle, numero, bloque=None, escalera=None, planta=None,puerta=None):
-        """Proporciona la lista de todos los inmuebles coincidentes o sus datos.
-
-            Este servicio puede devolver o bien la lista de todos los inmuebles que
-            coinciden con los criterios de búsqueda, proporcionando para cada
-            inmueble la referencia catastral y su localización
-            (bloque/escalera/planta/puerta) o bien, en el caso de que solo exista
-            un inmueble con los parámetros de entrada indicados, proporciona los
-            datos de un inmueble.
-
-            :param str: Nombre de la provincia
-            :param str: Nombre del municipio
-            :param str: Sigla
-            :param str: Nombre de la calle
-            :param str,int: Numero del que se quiere conocer los datos
-            :param str,int: Opcional,numero de bloque
-            :param str: Opcional, numero d'escala
-            :param str,int: Opcional, numero de planta
-            :param str,int: Opcional, numero de puerta
-            :return: Retorna un dicionario con los datos de la consutla
-            :rtype: dict
+    def default(cls):
+        """Retorna el cliente compartido que usan las llamadas de clase.
+
+           :return: Instancia creada la primera vez que se necesita
+           :rtype: PyCatastro
         """
 
-        params = {'Provincia': provincia,
-                  'Municipio': municipio,
-                  'Sigla': sigla,
-                  'Calle': calle,
-                  'Numero': str(numero)}
-        if bloque:
-            params['Bloque'] = str(bloque)
+        client = cls.__dict__.get('_default')
+        if client is None:
+            with cls._default_lock:
+                client = cls.__dict__.get('_default')
+                if client is None:
+                    client = cls()
+                    cls._default = client
+        return client
+
+    def close(self):
+        """Cierra las conexiones del pool."""
+
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get(self, path, params=None):
+        call = Call(path.rsplit('/', 1)[-1])
+        try:
+            result = self._query(path, params, call)
+            self._observe(call, params, result)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if (self.rate_limiter is not None
+                    and not call.cache_hit and not call.coalesced):
+                self.rate_limiter.feedback(path, call)
+            for hook in self.hooks:
+                hook(call)
+
+    def _query(self, path, params, call):
+        result = self._local(call, params)
+        if result is not None:
+            return result
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(path, params)
+            value = self.cache.get(key)
+            if value is not None:
+                call.cache_hit = True
+                if not self.cache.raw:
+                    return value
+                call.bytes = len(value)
+                return self._parse_timed(path, value, call)
+        if self.single_flight is None:
+            return self._load(path, params, call, key)
+        result, call.coalesced = self.single_flight.do(
+            (cache_key(path, params), self.result),
+            lambda: self._load(path, params, call, key))
+        return result
+
+    def _indexes(self, call):
+        if self.result == 'raw':
+            return
+        for index in (self.spatial_index, self.number_index):
+            if index is not None and call.endpoint in index.endpoints:
+                yield index
+
+    def _local(self, call, params):
+        for index in self._indexes(call):
+            result = index.lookup(call.endpoint, params, self.result)
+            if result is not None:
+                call.cache_hit = True
+                return result
+        return None
+
+    def _observe(self, call, params, result):
+        for index in self._indexes(call):
+            index.observe(call.endpoint, params, result)
+
+    def _load(self, path, params, call, key):
+        content = self._fetch(path, params, call)
+        result = self._parse_timed(path, content, call)
+        if key is not None and call.status < 400:
+            self.cache.set(key, content if self.cache.raw else result,
+                           len(content))
+        return result
+
+    def _fetch(self, path, params, call):
+        deadline = timer() + self.timeout if self.timeout else None
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(path)
+        if self.hedger is None or self.hedger.delay(call.endpoint) is None:
+            attempt = self._attempt(path, params, deadline)
+            latency = attempt[2] + attempt[3]
         else:
-            params['Bloque'] = ''
-        if escalera:
-            params['Escalera'] = escalera
+            attempt, latency = self._hedged(path, params, call, deadline)
+        status, content, call.connect, call.transfer = attempt
+        call.status = status
+        call.bytes = len(content)
+        if self.hedger is not None:
+            self.hedger.observe(call.endpoint, latency)
+        return content
+
+    def _attempt(self, path, params, deadline):
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - timer(), 0.001)
+        start = timer()
+        response = self.session.get(self.base_url + path, params=params,
+                                    stream=True, timeout=timeout)
+        headers = timer()
+        if deadline is None:
+            content = response.content
         else:
-            params['Escalera'] = ''
-        if planta:
-            params['Planta'] = str(planta)
+            # El timeout de requests es por lectura; el plazo es del total
+            chunks = []
+            for chunk in response.iter_content(64 * 1024):
+                chunks.append(chunk)
+                if timer() > deadline:
+                    from requests import Timeout
+
+                    response.close()
+                    raise Timeout('Deadline exceeded: %s' % path)
+            content = b''.join(chunks)
+        return response.status_code, content, headers - start, timer() - headers
+
+    def _hedged(self, path, params, call, deadline):
+        # La original se hace en este hilo; la copia, si hace falta, en el
+        # pool del hedger. La primera que termina cierra la conexión de la
+        # otra, así que este hilo no espera a una original lenta.
+        from pycatastro.hedge import Race
+
+        hedger = self.hedger
+        race = Race()
+        primary, hedge = race.attempts
+        hedges = []
+
+        def run():
+            with hedge:
+                result = self._attempt(path, params, deadline)
+            race.finish(hedge, result)
+
+        def launch():
+            with race.lock:
+                if race.closed or race.winner is not None or not hedger.allow():
+                    return
+                if (self.rate_limiter is not None
+                        and not self.rate_limiter.try_reserve(path)):
+                    return
+                call.hedged = True
+                hedger.fired()
+                hedges.append(hedger.executor.submit(run))
+
+        start = timer()
+        scheduled = hedger.schedule(hedger.delay(call.endpoint), launch)
+        error = None
+        try:
+            with primary:
+                result = self._attempt(path, params, deadline)
+            race.finish(primary, result)
+        except Exception as e:
+            error = e
+        hedger.unschedule(scheduled)
+        with race.lock:
+            race.closed = True
+        if race.winner is None and hedges:
+            # La original ha fallado: queda la copia
+            hedges[0].exception()
+        if race.winner is None:
+            raise error
+        if call.hedged:
+            call.hedge_won = race.winner is hedge
+            if call.hedge_won:
+                hedger.won()
+        # El percentil se calcula con la latencia de la original; si no ha
+        # terminado, como mínimo ha tardado hasta que ha llegado la copia
+        if race.winner is primary:
+            latency = race.result[2] + race.result[3]
         else:
-            params['Planta'] = ''
-        if puerta:
-            params['Puerta'] = str(puerta)
-        else:
-            params['Puerta'] = ''
-
-        url = cls.base_url + "/OVCCallejero.asmx/Consulta_DNPLOC"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def Consulta_DNPRC(cls, provincia, municipio, rc):
-        """Proporciona los datos catastrales no protegidos de un inmueble
-
-           Este servicio es idéntico al de "Consulta de DATOS CATASTRALES NO
-           PROTEGIDOS de un inmueble identificado por su localización" en todo
-           excepto en los parámetros de entrada.
-
-           :param str: Nombre de la provincia
-           :param str: Nombre del municipio
-           :param str: Referencia catastral
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
-        """
-
-        params = {"Provincia": provincia,
-                  "Municipio": municipio,
-                  "RC": rc}
-
-        url = cls.base_url + "/OVCCallejero.asmx/Consulta_DNPRC"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def Consulta_DNPPP(cls, provincia, municipio, poligono, parcela):
-        """Proporciona los datos catastrales no protegidos de un inmueble
-
-           Este servicio es idéntico al de "Consulta de DATOS CATASTRALES NO
-           PROTEGIDOS de un inmueble identificado por su localización" en todo
-           excepto en los parámetros de entrada.
-
-           :param str: Nombre de la provincia
-           :param str: Nombre del municipio
-           :param str: Codigo del poligono
-           :param str: Codigo de la parcela
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
+            latency = race.finished - start
+        return race.result, latency
+
+    def _parse_timed(self, path, content, call):
+        start = timer()
+        result = self._parse(path, content)
+        call.parse = timer() - start
+        return result
+
+    def _cache_key(self, path, params):
+        key = cache_key(path, params)
+        if not self.cache.raw and self.result != 'dict':
+            key += (self.result,)
+        return key
+
+    def _parse(self, path, content):
+        if self.result == 'raw':
+            return RawResponse(path.rsplit('/', 1)[-1], content, self.parser)
+        if self.result == 'model':
+            parser = models.PARSERS.get(path.rsplit('/', 1)[-1])
+            if parser is not None:
+                return parser(content)
+        return self.parser.parse(content)
+
+    def _chunks(self, response, chunk_size, call):
+        for chunk in response.iter_content(chunk_size):
+            call.bytes += len(chunk)
+            yield chunk
+
+    def _stream(self, path, params, tag, chunk_size=64 * 1024):
+        call = Call(path.rsplit('/', 1)[-1])
+        try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait(path)
+            start = timer()
+            response = self.session.get(self.base_url + path, params=params,
+                                        stream=True, timeout=self.timeout)
+            headers = timer()
+            call.connect = headers - start
+            call.status = response.status_code
+            try:
+                chunks = self._chunks(response, chunk_size, call)
+                for item in iter_elements(chunks, tag):
+                    yield item
+            finally:
+                response.close()
+                call.transfer = timer() - headers
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.feedback(path, call)
+            for hook in self.hooks:
+                hook(call)
+
+    endpoints = ENDPOINTS
+    """Consultas del servicio (ver :mod:`pycatastro.endpoints`)."""
+
+    @clientmethod
+    def lote(self, consulta, argumentos, workers=8, ordered=True):
+        """Ejecuta cualquier consulta con un lote de argumentos.
+
+           Ejecuta la consulta en un pool de hilos con
+           :func:`pycatastro.batch.map_batch`, así que la caché, los índices,
+           el limitador y los hooks del cliente se aplican a cada llamada::
+
+               client.lote('Consulta_DNPPP', [(provincia, municipio, 1, 5),
+                                              (provincia, municipio, 1, 6)])
+
+           :param str: Nombre de la consulta (ver :data:`endpoints`)
+           :param iterable: Tuplas con los argumentos de cada llamada
+           :param int: Número de hilos
+           :param bool: Si es cierto los resultados se retornan en el orden
+                        de entrada, si no a medida que terminan
+           :return: Generador de :class:`pycatastro.batch.BatchResult`
         """
 
-        params = {'Provincia': provincia,
-                  'Municipio': municipio,
-                  'Poligono': poligono,
-                  'Parcela': parcela}
+        from pycatastro.batch import map_batch
 
-        url = cls.base_url + "/OVCCallejero.asmx/Consulta_DNPPP"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+        if consulta not in self.endpoints:
+            raise ValueError('Invalid endpoint: %s' % consulta)
+        return map_batch(getattr(self, consulta), argumentos, workers, ordered)
 
-    @classmethod
-    def ConsultaProvincia(cls):
-        """Proporciona un listado de las provincias.
+    @clientmethod
+    def Consulta_DNPRC_Lote(self, referencias, workers=8, ordered=True):
+        """Consulta los datos catastrales de un lote de inmuebles.
 
-           Proporciona un listado de todas las provincias españolas en las que
-           tiene competencia la Dirección general del Catastro.
+           Ejecuta :meth:`Consulta_DNPRC` en un pool de hilos. Las
+           referencias se leen y los resultados se retornan a medida que se
+           procesan, así que el lote puede ser arbitrariamente grande. Para
+           aprovechar todos los hilos el cliente debe tener un
+           ``pool_maxsize`` de como mínimo ``workers``.
 
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
+           :param iterable: Tuplas (provincia, municipio, referencia catastral)
+           :param int: Número de hilos
+           :param bool: Si es cierto los resultados se retornan en el orden
+                        de entrada, si no a medida que terminan
+           :return: Generador de :class:`pycatastro.batch.BatchResult`
         """
 
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaProvincia"
-        response = requests.get(url)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+        return self.lote('Consulta_DNPRC', referencias, workers, ordered)
 
-    @classmethod
-    def ConsultaMunicipioCodigos(cls, provincia, municipio):
-        """Proporciona un listado de todos los nombres de los municipios de una provincia.
-
-           Proporciona un listado de todos los nombres de los municipios de una
-           provincia (parámetro "Provincia"),así como sus códigos (de Hacienda y
-           del INE), cuyo nombre Servicios web del Catastro 5 contiene la cadena
-           del parámetro de entrada "Municipio".En caso de que este último
-           parámetro no tenga ningún valor, el servicio devuelve todos los
-           municipios de la provincia.También proporciona información de si existe
-           cartografía catastral (urbana o rústica) de cada municipio.
+    @clientmethod
+    def Consulta_CPMRC_Lote(self, referencias, srs='', workers=8, ordered=True):
+        """Consulta la localización de un lote de parcelas.
 
-           :param str: Nombre de la provincia
-           :param str: Nombre del municipio
+           Igual que :meth:`Consulta_DNPRC_Lote` pero ejecutando
+           :meth:`Consulta_CPMRC` con el sistema de coordenadas ``srs``.
 
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
+           :param iterable: Tuplas (provincia, municipio, referencia catastral)
+           :param str,int: Opcional, sistema de coordenadas
+           :param int: Número de hilos
+           :param bool: Si es cierto los resultados se retornan en el orden
+                        de entrada, si no a medida que terminan
+           :return: Generador de :class:`pycatastro.batch.BatchResult`
         """
 
-        params = {"Provincia": provincia,
-                  "Municipio": municipio}
-
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaMunicipio"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def ConsultaViaCodigos(cls, provincia, municipio, tipovia=None, nombrevia=None):
-        """Proporciona un listado de las vías de un municipio
-
-           Proporciona un listado de todas las vías de un municipio
-           (parámetros "Provincia" y "Municipio"), así como los códigos de las
-           mismas según la Dirección General del Catastro (DGC), cuyo nombre
-           contiene la cadena del parámetro de entrada "NombreVia" y, en caso
-           de que el parámetro "TipoVia" contenga información, existe
-           coincidencia en el tipo de la vía. En caso de que el parámetro
-           "NombreVia" no tenga ningún valor, el servicio devuelve todas
-           las vías del municipio del "TipoVia" indicado.
-
-           :param str: Nombre de provincia
-           :param str: Nombre del municipio
-           :param str: Opcional,Tipo de via
-           :param str: Nombre de via
+        from pycatastro.batch import map_batch
 
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
-        """
+        def consulta(provincia, municipio, rc):
+            return self.Consulta_CPMRC(provincia, municipio, srs, rc)
+        return map_batch(consulta, referencias, workers, ordered)
 
-        params = {'Provincia': provincia,
-                  'Municipio': municipio}
-        if nombrevia:
-            params['NombreVia'] = nombrevia
-        else:
-            params['NombreVia'] = ''
-        if tipovia:
-            params['TipoVia'] = tipovia
-        else:
-            params['TipoVia'] = ''
+    @clientmethod
+    def Consulta_RCCOOR_Lote(self, srs, x, y, tolerance=0, workers=8):
+        """Consulta la referencia catastral de arrays de coordenadas.
 
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaVia"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+           Agrupa los puntos en una rejilla de ``tolerance`` de lado y sólo
+           consulta un punto por celda (ver
+           :func:`pycatastro.vector.consulta_rccoor`). Requiere ``numpy``.
 
-    @classmethod
-    def ConsultaNumeroCodigos(cls, provincia, municipio, tipovia, nombrevia,numero):
-        """Proporciona la referencia catastral de la finca correspondiente.
-
-           Proporciona, o bien la referencia catastral de la finca correspondiente
-           al contenido del parámetro "Número", en caso de que este exista, o bien
-           se devuelve un error ("El número no existe") y se proporciona una lista
-           de los números más aproximados al solicitado, en un rango de 5 por arriba
-           y 5 por abajo. Por ejemplo, si se solicita el número 10, y en esa vía
-           existen los números 2,3,6,7,9,11,15 y 17, se devuelve una lista con los
-           números 6,7,9,11 y 15. Junto con la lista de números, se proporcionan
-           las referencias catastrales de las fincas.
-
-           :param str: Nombre de la provincia
-           :param str: Nombre del municipio
-           :param str: Tipo de la via
-           :param str: Nombre de la via
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
-        """
-
-        params = {'Provincia': provincia,
-                  'Municipio': municipio,
-                  'TipoVia': tipovia,
-                  'NomVia': nombrevia,
-                  'Numero': numero}
-
-        url = cls.base_url + "/OVCCallejero.asmx/ConsultaVia"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def Consulta_DNPLOC_Codigos(cls, provincia, municipio, sigla, nombrevia, numero, bloque=None, escalera=None, planta=None, puerta=None):
-        """Proporciona la lista de todos los inmuebles que coinciden.
-
-           Este servicio puede devolver o bien la lista de todos los inmuebles que
-           coinciden con los criterios de búsqueda, proporcionando para cada
-           inmueble la referencia catastral y su localización
-           (bloque/escalera/planta/puerta) o bien,en el caso de que solo exista un
-           inmueble con los parámetros de entrada indicados, proporciona los datos
-           de un inmueble.
-
-           :param str: Nombre de la provincia
-           :param str: Nombre del municipio
-           :param str: Sigla
-           :param str: Nombre de la via
-           :param str,int: Numero de inmueble
-           :param str,int: Numero de bloque
-           :param str: Escalera
-           :param str,int: Numero de planta
-           :param str,int: Numero de puerta
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
+           :param str,int: Sistema de coordenadas
+           :param array_like: Coordenadas X
+           :param array_like: Coordenadas Y
+           :param float: Lado de la celda en unidades del sistema de
+                         coordenadas, 0 para agrupar sólo puntos idénticos
+           :param int: Número de hilos
+           :rtype: pycatastro.vector.ResultadoCoordenadas
         """
 
-        params = {
-            'Provincia': provincia,
-            'Municipio': municipio,
-            'Sigla': sigla,
-            'Calle': nombrevia,
-            'Numero': str(numero)}
-        if bloque:
-            params['Bloque'] = bloque
-        else:
-            params['Bloque'] = ''
-        if planta:
-            params['Escalera'] = escalera
-        else:
-            params['Escalera'] = ''
-        if puerta:
-            params['Puerta'] = str(puerta)
-        else:
-            params['Puerta'] = ''
-        if escalera:
-            params['Escalera'] = str(escalera)
-        else:
-            params['Escalera'] = ''
-        if planta:
-            params["Planta"] = str(planta)
-        else:
-            params["Planta"] = ""
-
-        url = cls.base_url + "/OVCCallejero.asmx/Consulta_DNPLOC"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+        from pycatastro.vector import consulta_rccoor
+        return consulta_rccoor(self, srs, x, y, tolerance, workers)
 
-    @classmethod
-    def Consulta_DNPRC_Codigos(cls, provincia, municipio, rc):
-        """Proporciona los datos catastrales de un inmueble,
+    @clientmethod
+    def ConsultaMunicipio_Iter(self, provincia, municipio=None):
+        """Itera los municipios de una provincia a medida que se descargan.
 
-           Este servicio es idéntico al de "Consulta de DATOS CATASTRALES NO
-           PROTEGIDOS de un inmueble identificado por su localización"
-           en todo excepto en los parámetros de entrada.
+           Igual que :meth:`ConsultaMunicipio` pero procesa la respuesta a
+           trozos y retorna cada municipio (el nodo ``muni``) por separado,
+           sin cargar el documento entero en memoria. No usa la caché.
 
            :param str: Nombre de la provincia
-           :param str: Nombre del municipio
-           :param str: Referencia catastral
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
+           :param str: Opcional, nombre del municipio
+           :return: Generador de diccionarios con los datos de cada municipio
         """
 
-        params = {
-            'Provincia': provincia,
-            'Municipio': municipio,
-            'RC': rc}
+        endpoint = ENDPOINTS['ConsultaMunicipio']
+        return self._stream(endpoint.path,
+                            endpoint.params(provincia, municipio), 'muni')
 
-        url = cls.base_url + "/OVCCallejero.asmx/Consulta_DNPRC"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+    @clientmethod
+    def ConsultaVia_Iter(self, provincia, municipio, tipovia=None, nombrevia=None):
+        """Itera las vías de un municipio a medida que se descargan.
 
-    @classmethod
-    def Consulta_DNPPP_Codigos(cls, provincia, municipio, poligono, parcela):
-        """Proporciona los datos catastrales de un inmueble.
-
-           Este servicio es idéntico al de "Consulta de DATOS CATASTRALES NO
-           PROTEGIDOS de un inmueble identificado por su localización" en todo
-           excepto en los parámetros de entrada.
+           Igual que :meth:`ConsultaVia` pero procesa la respuesta a trozos y
+           retorna cada vía (el nodo ``calle``) por separado, sin cargar el
+           documento entero en memoria. No usa la caché.
 
            :param str: Nombre de la provincia
            :param str: Nombre del municipio
-           :param str: Codigo del poligono
-           :param str: Codigo de la parcela
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
-        """
-
-        params = {
-            "Provincia": provincia,
-            "Municipio": municipio,
-            "Poligono": poligono,
-            "Parcela": parcela}
-
-        url = cls.base_url + "/OVCCallejero.asmx/Consulta_DNPPP"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def Consulta_RCCOOR(cls, srs, x, y):
-        """
-        A partir de unas coordenadas se obtiene la referencia catastral.
-
-        A partir de unas coordenadas (X e Y) y su sistema de referencia se
-        obtiene la referencia catastral de la parcela localizada en ese punto
-        así como el domicilio (municipio, calle y número o polígono, parcela y
-        municipio).
-
-        :param srs: Sistema de coordenadas
-        :type srs:str,int
-        :param x: Coordanda x
-        :type x: str,int,float
-        :param y: Coordenada Y
-        :type y: str,int,float
-        :return: Retorna un dicionario con los datos de la consutla
-        :rtype: dict
-        """
-
-        params = {
-            "Coordenada_X": str(x),
-            "Coordenada_Y": str(y)}
-        if type(srs) == str:
-            params["SRS"] = srs
-        else:
-            params["SRS"] = "EPSG:"+str(srs)
-
-        url = cls.base_url + "/OVCCoordenadas.asmx/Consulta_RCCOOR"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def Consulta_RCCOOR_Distancia(cls, srs, x, y):
-        """Proporciona la referencia catastral a partir de unas coordenadas.
-
-           A partir de unas coordenadas (X e Y) y su sistema de referencia se
-           obtiene la referencia catastral de la parcela localizada en ese
-           punto así como el domicilio (municipio, calle y número o polígono,
-           parcela y municipio). En caso de no encontrar ninguna referencia
-           catastral en dicho punto, se buscará en un área cuadrada de 50
-           metros de lado, centrada en dichas coordenadas, y se devolverá
-           la lista de referencias catastrales encontradas en dicha área.
-
-           :param str,int: Sistema de coordenadas
-           :param str,int,float: Coordanda X
-           :param str,int,float: Coordanda Y
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
+           :param str: Opcional, tipo de via
+           :param str: Opcional, nombre de via
+           :return: Generador de diccionarios con los datos de cada vía
         """
 
-        params = {'Coordenada_X': x,
-                  'Coordenada_Y': y}
-        if type(srs) == str:
-            params['SRS'] = srs
-        else:
-            params['SRS'] = "EPSG:"+str(srs)
-
-        url = cls.base_url + "/OVCCoordenadas.asmx/Consulta_RCCOOR_Distancia"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
-
-    @classmethod
-    def Consulta_CPMRC(cls, provicia, municipio, srs, rc):
-        """Proporciona la localizacion de una parcela.
-
-           A partir de la RC de una parcela se obtienen las coordenadas X, Y en el
-           sistema de referencia en el que está almacenado el dato en la D.G. del
-           Catastro, a menos que se especifique lo contrario en el parámetro
-           opcional SRS que se indica en la respuesta, así como el domicilio
-           (municipio, calle y número o polígono, parcela y unicipio).
-
-           :param str: Nombre de la provincia
-           :param str: Nombre del municipio
-           :param str,int: Sistema de coordenadas
-           :param str: Referencia catastral
-           :return: Retorna un dicionario con los datos de la consutla
-           :rtype: dict
-        """
+        endpoint = ENDPOINTS['ConsultaVia']
+        return self._stream(
+            endpoint.path,
+            endpoint.params(provincia, municipio, tipovia, nombrevia), 'calle')
 
-        params = {'SRS': srs,
-                  'Provincia': provicia,
-                  'Municipio': municipio,
-                  'RC': rc}
 
-        url = cls.base_url + "/OVCCoordenadas.asmx/Consulta_CPMRC"
-        response = requests.get(url, params=params)
-        return xmltodict.parse(response.content, process_namespaces=False, xml_attribs=False)
+for _endpoint in ENDPOINTS.values():
+    setattr(PyCatastro, _endpoint.name, clientmethod(_endpoint.method()))
+del _endpoint
@@ -0,0 +1,429 @@
+# coding=utf-8
+import asyncio
+from collections import deque
+from timeit import default_timer as timer
+
+import aiohttp
+
+from pycatastro import RESULT_TYPES, PyCatastro, clientmethod
+from pycatastro.batch import BatchResult
+from pycatastro.cache import cache_key
+from pycatastro.metrics import Call
+from pycatastro.parsers import get_parser
+from pycatastro.stream import ElementStream
+
+
+class AsyncSingleFlight(object):
+    """Versión de :class:`pycatastro.singleflight.SingleFlight` para corutinas.
+
+       La llamada se ejecuta en su propia tarea, así que si se cancela una
+       de las corutinas que la esperan las demás siguen recibiendo el
+       resultado.
+    """
+
+    def __init__(self):
+        self.stats = {'calls': 0, 'coalesced': 0}
+        self._tasks = {}
+
+    async def do(self, key, factory):
+        """Ejecuta ``await factory()`` o espera a la ejecución en curso.
+
+           :param hashable: Clave de la llamada
+           :param callable: Función que retorna la corutina a ejecutar
+           :return: Tupla (resultado, si se ha compartido una llamada en curso)
+        """
+
+        self.stats['calls'] += 1
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            self.stats['coalesced'] += 1
+        else:
+            task = self._tasks[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task), shared
+
+
+async def map_batch_async(func, items, workers=8, ordered=True):
+    """Versión de :func:`pycatastro.batch.map_batch` para corutinas.
+
+       Ejecuta ``await func(*item)`` para cada elemento con como mucho
+       ``workers`` llamadas en curso a la vez. Es un generador asíncrono de
+       :class:`pycatastro.batch.BatchResult`; si se deja de leer, las
+       llamadas en curso se cancelan.
+
+       :param callable: Función que retorna la corutina a ejecutar
+       :param iterable: Tuplas con los argumentos de cada llamada
+       :param int: Máximo de llamadas en curso
+       :param bool: Si es cierto los resultados se retornan en el orden de
+                    entrada, si no a medida que terminan
+    """
+
+    async def call(index, item):
+        try:
+            return BatchResult(index, item, await func(*item), None)
+        except Exception as e:
+            return BatchResult(index, item, None, e)
+
+    pending = deque() if ordered else set()
+    try:
+        for index, item in enumerate(items):
+            task = asyncio.ensure_future(call(index, tuple(item)))
+            if ordered:
+                pending.append(task)
+                if len(pending) >= workers:
+                    yield await pending.popleft()
+            else:
+                pending.add(task)
+                if len(pending) >= workers:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+        if ordered:
+            while pending:
+                yield await pending.popleft()
+        else:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class AsyncPyCatastro(PyCatastro):
+    """Cliente asíncrono con los mismos métodos de consulta que PyCatastro.
+
+       Cada método retorna una corutina::
+
+           async with AsyncPyCatastro(concurrency=20) as client:
+               data = await client.Consulta_DNPRC(provincia, municipio, rc)
+
+       Las consultas comparten un pool de conexiones de :mod:`aiohttp` y un
+       semáforo limita cuántas hay en curso a la vez. El XML se procesa en
+       ``executor`` para no bloquear el bucle de eventos, y las cachés que
+       guardan el XML (:class:`pycatastro.cache.SqliteCache`) se consultan
+       en el executor por defecto del bucle.
+
+       Los métodos de lotes (:meth:`lote`, ``Consulta_DNPRC_Lote`` y
+       ``Consulta_CPMRC_Lote``) retornan generadores asíncronos y
+       ``Consulta_RCCOOR_Lote`` una corutina::
+
+           async for r in client.Consulta_DNPRC_Lote(referencias):
+               ...
+    """
+
+    def __init__(self, base_url=None, concurrency=10, limit=100,
+                 limit_per_host=10, keepalive_timeout=15, executor=None,
+                 session=None, cache=None, result='dict', parser='xmltodict',
+                 hooks=None, rate_limiter=None, single_flight=None,
+                 spatial_index=None, number_index=None, timeout=None,
+                 hedger=None):
+        """Crea un cliente sin abrir todavía ninguna conexión.
+
+           :param str: Opcional, URL base del servicio
+           :param int: Máximo de consultas en curso a la vez
+           :param int: Máximo de conexiones abiertas del pool
+           :param int: Máximo de conexiones abiertas por host
+           :param float: Segundos que se mantiene abierta una conexión libre
+           :param concurrent.futures.Executor: Opcional, executor donde se
+                                               procesa el XML
+           :param aiohttp.ClientSession: Opcional, sesión a utilizar
+           :param pycatastro.cache.Cache: Opcional, caché de respuestas
+           :param str: Tipo de resultado, ``'dict'``, ``'model'`` o ``'raw'``
+           :param str,pycatastro.parsers.Parser: Procesador de XML
+           :param list: Opcional, funciones a las que se llama después de
+                        cada consulta con un :class:`pycatastro.metrics.Call`
+           :param pycatastro.ratelimit.RateLimiter: Opcional, limitador de
+                        tasa compartido por las consultas
+           :param AsyncSingleFlight: Opcional, agrupa las consultas
+                        idénticas que están en curso a la vez
+           :param pycatastro.spatial.SpatialIndex: Opcional, índice donde
+                        se guardan las parcelas de las consultas de
+                        coordenadas
+           :param pycatastro.streets.NumberIndex: Opcional, índice de los
+                        números de cada vía
+           :param float: Opcional, tiempo máximo (segundos) de cada consulta;
+                        si se supera se lanza :class:`asyncio.TimeoutError`
+           :param pycatastro.hedge.Hedger: Opcional, lanza una copia de las
+                        consultas que tardan más de lo habitual (la más lenta
+                        se cancela)
+        """
+
+        if result not in RESULT_TYPES:
+            raise ValueError('Invalid result type: %s' % result)
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.executor = executor
+        self._session = session
+        self._semaphore = None
+        self.cache = cache
+        self.result = result
+        self.parser = get_parser(parser)
+        self.hooks = list(hooks or [])
+        self.rate_limiter = rate_limiter
+        self.single_flight = single_flight
+        self.spatial_index = spatial_index
+        self.number_index = number_index
+        self.timeout = timeout
+        self.hedger = hedger
+
+    @property
+    def session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def with_options(self, **options):
+        """Retorna una copia del cliente con otras opciones.
+
+           Ver :meth:`pycatastro.PyCatastro.with_options`. La copia comparte
+           la sesión y el límite de consultas en curso.
+        """
+
+        self.session, self.semaphore
+        return super(AsyncPyCatastro, self).with_options(**options)
+
+    @clientmethod
+    def lote(self, consulta, argumentos, workers=8, ordered=True):
+        """Ejecuta cualquier consulta con un lote de argumentos.
+
+           Igual que :meth:`pycatastro.PyCatastro.lote` con
+           :func:`map_batch_async`: ``workers`` es el máximo de consultas en
+           curso a la vez.
+
+           :return: Generador asíncrono de
+                    :class:`pycatastro.batch.BatchResult`
+        """
+
+        if consulta not in self.endpoints:
+            raise ValueError('Invalid endpoint: %s' % consulta)
+        return map_batch_async(getattr(self, consulta), argumentos, workers,
+                               ordered)
+
+    @clientmethod
+    def Consulta_CPMRC_Lote(self, referencias, srs='', workers=8, ordered=True):
+        """Consulta la localización de un lote de parcelas.
+
+           Ver :meth:`pycatastro.PyCatastro.Consulta_CPMRC_Lote`.
+
+           :return: Generador asíncrono de
+                    :class:`pycatastro.batch.BatchResult`
+        """
+
+        def consulta(provincia, municipio, rc):
+            return self.Consulta_CPMRC(provincia, municipio, srs, rc)
+        return map_batch_async(consulta, referencias, workers, ordered)
+
+    @clientmethod
+    async def Consulta_RCCOOR_Lote(self, srs, x, y, tolerance=0, workers=8):
+        """Consulta la referencia catastral de arrays de coordenadas.
+
+           Ver :meth:`pycatastro.PyCatastro.Consulta_RCCOOR_Lote`.
+
+           :rtype: pycatastro.vector.ResultadoCoordenadas
+        """
+
+        from pycatastro.vector import consulta_rccoor_async
+        return await consulta_rccoor_async(self, srs, x, y, tolerance, workers)
+
+    async def close(self):
+        """Cierra las conexiones del pool."""
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _get(self, path, params=None):
+        call = Call(path.rsplit('/', 1)[-1])
+        try:
+            result = await self._query(path, params, call)
+            self._observe(call, params, result)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if (self.rate_limiter is not None
+                    and not call.cache_hit and not call.coalesced):
+                self.rate_limiter.feedback(path, call)
+            for hook in self.hooks:
+                hook(call)
+
+    async def _query(self, path, params, call):
+        result = self._local(call, params)
+        if result is not None:
+            return result
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(path, params)
+            value = await self._cache_call(self.cache.get, key)
+            if value is not None:
+                call.cache_hit = True
+                if not self.cache.raw:
+                    return value
+                call.bytes = len(value)
+                return await self._parse_async(path, value, call)
+        if self.single_flight is None:
+            return await self._load(path, params, call, key)
+        result, call.coalesced = await self.single_flight.do(
+            (cache_key(path, params), self.result),
+            lambda: self._load(path, params, call, key))
+        return result
+
+    async def _load(self, path, params, call, key):
+        content = await self._fetch(path, params, call)
+        result = await self._parse_async(path, content, call)
+        if key is not None and call.status < 400:
+            await self._cache_call(self.cache.set, key,
+                                   content if self.cache.raw else result,
+                                   len(content))
+        return result
+
+    async def _cache_call(self, func, *args):
+        # Las cachés que guardan el XML (por ejemplo SqliteCache) leen y
+        # escriben en disco: se llaman desde un hilo para no bloquear el bucle
+        if not self.cache.raw:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    @staticmethod
+    def _clean(params):
+        if params:
+            params = dict((k, str(v)) for k, v in params.items() if v is not None)
+        return params
+
+    async def _fetch(self, path, params, call):
+        params = self._clean(params)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout if self.timeout else None
+        if self.rate_limiter is not None:
+            delay = self.rate_limiter.reserve(path)
+            if delay:
+                await asyncio.sleep(delay)
+        if self.hedger is None or self.hedger.delay(call.endpoint) is None:
+            attempt = await self._attempt(path, params, deadline)
+            latency = attempt[2] + attempt[3]
+        else:
+            attempt, latency = await self._hedged(path, params, call, deadline)
+        status, content, call.connect, call.transfer = attempt
+        call.status = status
+        call.bytes = len(content)
+        if self.hedger is not None:
+            self.hedger.observe(call.endpoint, latency)
+        return content
+
+    async def _attempt(self, path, params, deadline):
+        kwargs = {}
+        if deadline is not None:
+            remaining = deadline - asyncio.get_running_loop().time()
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=max(remaining, 0.001))
+        async with self.semaphore:
+            start = timer()
+            async with self.session.get(self.base_url + path, params=params,
+                                        **kwargs) as response:
+                headers = timer()
+                content = await response.read()
+                return (response.status, content, headers - start,
+                        timer() - headers)
+
+    async def _hedged(self, path, params, call, deadline):
+        hedger = self.hedger
+        start = timer()
+        tasks = [asyncio.ensure_future(self._attempt(path, params, deadline))]
+        pending = set(tasks)
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedger.delay(call.endpoint))
+            if (not done and hedger.allow()
+                    and (self.rate_limiter is None
+                         or self.rate_limiter.try_reserve(path))):
+                call.hedged = True
+                hedger.fired()
+                tasks.append(asyncio.ensure_future(
+                    self._attempt(path, params, deadline)))
+                pending.add(tasks[1])
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if call.hedged:
+                            call.hedge_won = task is tasks[1]
+                            if call.hedge_won:
+                                hedger.won()
+                        # Latencia de la original, como mínimo hasta la copia
+                        result = task.result()
+                        if task is tasks[0]:
+                            return result, result[2] + result[3]
+                        return result, timer() - start
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _parse_async(self, path, content, call):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._parse_timed, path, content, call)
+
+    async def _stream(self, path, params, tag, chunk_size=64 * 1024):
+        call = Call(path.rsplit('/', 1)[-1])
+        stream = ElementStream(tag)
+        params = self._clean(params)
+        try:
+            if self.rate_limiter is not None:
+                delay = self.rate_limiter.reserve(path)
+                if delay:
+                    await asyncio.sleep(delay)
+            # El semáforo sólo se ocupa hasta recibir la respuesta: mientras
+            # se itera el cuerpo otras consultas pueden empezar
+            async with self.semaphore:
+                start = timer()
+                response = await self.session.get(self.base_url + path,
+                                                  params=params)
+                headers = timer()
+            async with response:
+                call.connect = headers - start
+                call.status = response.status
+                try:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        call.bytes += len(chunk)
+                        for item in stream.feed(chunk):
+                            yield item
+                finally:
+                    call.transfer = timer() - headers
+            for item in stream.close():
+                yield item
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.feedback(path, call)
+            for hook in self.hooks:
+                hook(call)
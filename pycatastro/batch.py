@@ -0,0 +1,61 @@
+# coding=utf-8
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+BatchResult = namedtuple('BatchResult', ['index', 'item', 'result', 'error'])
+"""Resultado de un elemento del lote.
+
+   ``error`` contiene la excepción producida por la consulta, en cuyo caso
+   ``result`` es ``None``.
+"""
+
+
+def _call(func, index, item):
+    try:
+        return BatchResult(index, item, func(*item), None)
+    except Exception as e:
+        return BatchResult(index, item, None, e)
+
+
+def map_batch(func, items, workers=8, ordered=True, max_pending=None):
+    """Ejecuta ``func(*item)`` para cada elemento en un pool de hilos.
+
+       Los elementos se leen de ``items`` a medida que quedan hilos libres y
+       nunca hay más de ``max_pending`` consultas pendientes, de manera que
+       la memoria no depende del tamaño del lote. Un error en un elemento no
+       interrumpe el lote, se retorna en su :class:`BatchResult`.
+
+       :param callable: Función a ejecutar
+       :param iterable: Tuplas con los argumentos de cada llamada
+       :param int: Número de hilos
+       :param bool: Si es cierto los resultados se retornan en el orden de
+                    entrada, si no a medida que terminan
+       :param int: Opcional, máximo de consultas pendientes (por defecto el
+                   doble de hilos)
+       :return: Generador de :class:`BatchResult`
+    """
+
+    max_pending = max_pending or workers * 2
+    with ThreadPoolExecutor(workers) as executor:
+        pending = deque() if ordered else set()
+        for index, item in enumerate(items):
+            future = executor.submit(_call, func, index, tuple(item))
+            if ordered:
+                pending.append(future)
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            else:
+                pending.add(future)
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
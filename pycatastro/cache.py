@@ -0,0 +1,329 @@
+# coding=utf-8
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+DEFAULT_TTL = HOUR
+
+DEFAULT_TTLS = {
+    'ConsultaProvincia': 30 * DAY,
+    'ConsultaMunicipio': 7 * DAY,
+    'ConsultaVia': DAY,
+    'ConsultaNumero': DAY,
+    'Consulta_DNPLOC': HOUR,
+    'Consulta_DNPRC': HOUR,
+    'Consulta_DNPPP': HOUR,
+    'Consulta_RCCOOR': HOUR,
+    'Consulta_RCCOOR_Distancia': HOUR,
+    'Consulta_CPMRC': HOUR,
+}
+
+
+def cache_key(path, params=None):
+    """Retorna la clave de caché de una consulta.
+
+       Los parámetros se normalizan para que consultas equivalentes
+       compartan clave: se ignoran los ``None``, los valores se convierten a
+       texto en mayúsculas sin espacios a los extremos y se ordenan por
+       nombre.
+
+       :param str: Ruta de la consulta, por ejemplo
+                   ``/OVCCallejero.asmx/Consulta_DNPRC``
+       :param dict: Parámetros de la consulta
+       :rtype: tuple
+    """
+
+    if not params:
+        return path, ()
+    return path, tuple(sorted(
+        (k, str(v).strip().upper()) for k, v in params.items() if v is not None
+    ))
+
+
+def endpoint_name(key):
+    """Retorna el nombre de la consulta de una clave de caché."""
+
+    return key[0].rsplit('/', 1)[-1]
+
+
+class Cache(object):
+    """Interfaz de los backends de caché de PyCatastro.
+
+       Si ``raw`` es cierto el cliente guarda el contenido XML de la
+       respuesta y lo vuelve a procesar en cada acierto, si no guarda
+       directamente el resultado procesado.
+    """
+
+    raw = False
+
+    def __init__(self, ttl=DEFAULT_TTL, ttls=None):
+        """Crea una caché vacía.
+
+           :param int: Segundos de validez por defecto
+           :param dict: Opcional, segundos de validez por nombre de consulta
+                        (por defecto :data:`DEFAULT_TTLS`)
+        """
+
+        self.ttl = ttl
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def ttl_for(self, key):
+        """Retorna los segundos de validez de una clave."""
+
+        return self.ttls.get(endpoint_name(key), self.ttl)
+
+    def get(self, key):
+        """Retorna el valor guardado o ``None`` si no existe o ha caducado."""
+
+        raise NotImplementedError
+
+    def set(self, key, value, size):
+        """Guarda un valor que ocupa ``size`` bytes."""
+
+        raise NotImplementedError
+
+    def clear(self):
+        """Elimina todas las entradas."""
+
+        raise NotImplementedError
+
+
+class MemoryCache(Cache):
+    """Caché LRU en memoria con caducidad por consulta.
+
+       Los resultados guardados se comparten entre todas las llamadas que
+       aciertan, así que no se deben modificar.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024,
+                 ttl=DEFAULT_TTL, ttls=None):
+        """Crea una caché vacía.
+
+           :param int: Número máximo de entradas
+           :param int: Máximo de bytes de XML de las entradas guardadas
+           :param int: Segundos de validez por defecto
+           :param dict: Opcional, segundos de validez por nombre de consulta
+        """
+
+        super(MemoryCache, self).__init__(ttl, ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires = entry
+                if expires > time.time():
+                    self._entries[key] = self._entries.pop(key)
+                    self.stats['hits'] += 1
+                    return value
+                self._remove(key)
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        expires = time.time() + self.ttl_for(key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires)
+            self.size += size
+            while (len(self._entries) > self.max_entries
+                   or self.size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        value, size, expires = self._entries.pop(key)
+        self.size -= size
+
+
+class SqliteCache(Cache):
+    """Caché persistente en un fichero SQLite.
+
+       Guarda el XML de las respuestas, así que se puede compartir entre
+       procesos (por ejemplo varios workers y tareas programadas) y se
+       mantiene entre reinicios. Cada hilo usa su propia conexión y la base
+       de datos funciona en modo WAL, de manera que las lecturas no se
+       bloquean por las escrituras de otros procesos. Después de un ``fork``
+       el proceso hijo abre sus propias conexiones.
+
+       Si se indica ``max_bytes``, cada ``check_every`` escrituras se
+       eliminan las entradas caducadas y, si hace falta, las más antiguas.
+    """
+
+    raw = True
+
+    def __init__(self, path, max_bytes=None, ttl=DEFAULT_TTL, ttls=None,
+                 timeout=30, check_every=100):
+        """Abre o crea la caché.
+
+           :param str: Ruta del fichero SQLite
+           :param int: Opcional, máximo de bytes de XML guardados
+           :param int: Segundos de validez por defecto
+           :param dict: Opcional, segundos de validez por nombre de consulta
+           :param float: Segundos de espera cuando otro proceso bloquea la
+                         base de datos
+           :param int: Cada cuántas escrituras se comprueba el tamaño
+        """
+
+        import json
+        import sqlite3
+
+        super(SqliteCache, self).__init__(ttl, ttls)
+        self._json = json
+        self._sqlite3 = sqlite3
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.check_every = check_every
+        self._local = threading.local()
+        self._writes = 0
+        with self.connection as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                ' endpoint TEXT NOT NULL,'
+                ' params TEXT NOT NULL,'
+                ' content BLOB NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' created REAL NOT NULL,'
+                ' expires REAL NOT NULL,'
+                ' PRIMARY KEY (endpoint, params))'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS responses_expires'
+                ' ON responses (expires)'
+            )
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, 'connection', None)
+        # Una conexión heredada con fork no se puede usar en el hijo: se
+        # descarta sin cerrarla, ya que es del proceso padre
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _columns(self, key):
+        return key[0], self._json.dumps(key[1])
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    @property
+    def size(self):
+        """Bytes de XML guardados."""
+
+        return self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key):
+        row = self.connection.execute(
+            'SELECT content FROM responses'
+            ' WHERE endpoint = ? AND params = ? AND expires > ?',
+            self._columns(key) + (time.time(),)
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return bytes(row[0])
+
+    def set(self, key, value, size):
+        now = time.time()
+        with self.connection as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses'
+                ' (endpoint, params, content, size, created, expires)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                self._columns(key) + (self._sqlite3.Binary(value), size,
+                                      now, now + self.ttl_for(key))
+            )
+        self._writes += 1
+        if self.max_bytes and self._writes % self.check_every == 0:
+            self.shrink()
+
+    def clear(self):
+        with self.connection as conn:
+            conn.execute('DELETE FROM responses')
+
+    def purge(self):
+        """Elimina las entradas caducadas.
+
+           :return: Número de entradas eliminadas
+           :rtype: int
+        """
+
+        with self.connection as conn:
+            return conn.execute('DELETE FROM responses WHERE expires <= ?',
+                                (time.time(),)).rowcount
+
+    def shrink(self, max_bytes=None):
+        """Elimina entradas caducadas y las más antiguas hasta ``max_bytes``.
+
+           Si no se indica ``max_bytes`` ni la caché tiene un máximo sólo se
+           eliminan las caducadas.
+
+           :param int: Opcional, bytes máximos (por defecto ``max_bytes``)
+        """
+
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        self.purge()
+        if max_bytes is None:
+            return
+        excess = self.size - max_bytes
+        if excess <= 0:
+            return
+        with self.connection as conn:
+            removed = 0
+            rows = conn.execute('SELECT endpoint, params, size FROM responses'
+                                ' ORDER BY created').fetchall()
+            for endpoint, params, size in rows:
+                if removed >= excess:
+                    break
+                conn.execute('DELETE FROM responses'
+                             ' WHERE endpoint = ? AND params = ?',
+                             (endpoint, params))
+                removed += size
+                self.stats['evictions'] += 1
+
+    def vacuum(self):
+        """Elimina las entradas caducadas y compacta el fichero."""
+
+        self.purge()
+        self.connection.execute('VACUUM')
+
+    def close(self):
+        """Cierra la conexión del hilo actual."""
+
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
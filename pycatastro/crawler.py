@@ -0,0 +1,340 @@
+# coding=utf-8
+"""Inventario completo y reanudable de un municipio.
+
+El recorrido consulta ConsultaVia para obtener las vías del municipio,
+ConsultaNumero para recorrer los números de cada vía y Consulta_DNPRC para
+los datos de cada inmueble. Cada consulta es una tarea que se guarda en una
+base de datos SQLite junto con su resultado, de manera que si se
+interrumpe una nueva ejecución con el mismo fichero sólo hace las tareas
+pendientes::
+
+    $ python -m pycatastro.crawler inventario.db BARCELONA BARCELONA
+
+O desde Python::
+
+    crawler = Crawler(client, 'inventario.db', 'BARCELONA', 'BARCELONA')
+    crawler.run(progress=print)
+    for rc, data in crawler.results('dnprc'):
+        ...
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+from pycatastro.batch import map_batch
+from pycatastro.streets import RANGO, numero
+from pycatastro.utils import as_list, path
+
+
+PENDING, DONE, FAILED = 0, 1, 2
+
+KINDS = ('via', 'numero', 'dnprc')
+"""Tipos de tarea, en el orden en que se procesan."""
+
+
+Progress = namedtuple('Progress', ['done', 'pending', 'failed', 'rate', 'eta'])
+"""Estado del recorrido que recibe la función ``progress``.
+
+   ``rate`` son las tareas por segundo de esta ejecución y ``eta`` los
+   segundos estimados hasta terminar las tareas conocidas (que aumentan a
+   medida que se descubren vías, números e inmuebles).
+"""
+
+
+def _root(result):
+    return next(iter(result.values()))
+
+
+def _rc(node):
+    return ''.join(node.get(k) or '' for k in ('pc1', 'pc2', 'car', 'cc1', 'cc2'))
+
+
+class CrawlStore(object):
+    """Tareas del recorrido y sus resultados en una base de datos SQLite."""
+
+    def __init__(self, filename, timeout=30):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename, timeout=timeout)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            ' kind TEXT NOT NULL, key TEXT NOT NULL, args TEXT NOT NULL,'
+            ' state INTEGER NOT NULL DEFAULT 0,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' result TEXT, error TEXT, PRIMARY KEY (kind, key))')
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, kind)')
+        self.conn.commit()
+
+    def meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?',
+                                (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    def add(self, kind, key, args):
+        """Añade una tarea si no existe ya."""
+
+        self.conn.execute(
+            'INSERT OR IGNORE INTO tasks (kind, key, args) VALUES (?, ?, ?)',
+            (kind, key, json.dumps(args)))
+
+    def pending(self, kind, limit):
+        """Retorna hasta ``limit`` tareas pendientes (kind, key, args)."""
+
+        rows = self.conn.execute(
+            'SELECT kind, key, args FROM tasks WHERE state = ? AND kind = ?'
+            ' LIMIT ?', (PENDING, kind, limit)).fetchall()
+        return [(kind, key, json.loads(args)) for kind, key, args in rows]
+
+    def done(self, kind, key, result):
+        self.conn.execute(
+            'UPDATE tasks SET state = ?, result = ?, error = NULL'
+            ' WHERE kind = ? AND key = ?',
+            (DONE, json.dumps(result), kind, key))
+
+    def fail(self, kind, key, error, retries):
+        """Anota un error; la tarea falla del todo tras ``retries`` reintentos."""
+
+        self.conn.execute(
+            'UPDATE tasks SET attempts = attempts + 1, error = ?,'
+            ' state = CASE WHEN attempts + 1 > ? THEN ? ELSE state END'
+            ' WHERE kind = ? AND key = ?',
+            (repr(error), retries, FAILED, kind, key))
+
+    def retry_failed(self):
+        """Vuelve a dejar pendientes las tareas fallidas."""
+
+        self.conn.execute('UPDATE tasks SET state = ?, attempts = 0 WHERE state = ?',
+                          (PENDING, FAILED))
+        self.conn.commit()
+
+    def counts(self):
+        """Retorna el número de tareas por (tipo, estado).
+
+           :rtype: dict
+        """
+
+        rows = self.conn.execute(
+            'SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state')
+        return dict(((kind, state), n) for kind, state, n in rows)
+
+    def results(self, kind):
+        """Generador de (clave, resultado) de las tareas terminadas."""
+
+        rows = self.conn.execute(
+            'SELECT key, result FROM tasks WHERE kind = ? AND state = ?'
+            ' ORDER BY key', (kind, DONE))
+        for key, result in rows:
+            yield key, json.loads(result)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class Crawler(object):
+    """Recorrido reanudable de las vías, números e inmuebles de un municipio.
+
+       Requiere un cliente con resultados ``'dict'``. Las consultas se hacen
+       en paralelo con :func:`pycatastro.batch.map_batch` y los resultados
+       se guardan en el hilo principal, así que el fichero sólo lo escribe
+       un proceso.
+    """
+
+    def __init__(self, client, filename, provincia, municipio, units=True,
+                 workers=8, chunk=500, retries=3, commit_every=100, max_gap=50):
+        """Abre (o crea) el fichero del recorrido.
+
+           :param pycatastro.PyCatastro: Cliente con resultados ``'dict'``
+           :param str: Fichero SQLite del recorrido
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param bool: Si es cierto se consulta Consulta_DNPRC de cada
+                        inmueble de las parcelas con varios inmuebles
+           :param int: Consultas simultáneas
+           :param int: Tareas que se leen de la base de datos cada vez
+           :param int: Reintentos de una tarea antes de darla por fallida
+           :param int: Tareas terminadas entre dos commits
+           :param int: Números seguidos sin portales a partir de los que se
+                       da por terminada una vía
+        """
+
+        if getattr(client, 'result', 'dict') != 'dict':
+            raise ValueError('The crawler needs a client with dict results')
+        self.client = client
+        self.provincia = provincia
+        self.municipio = municipio
+        self.units = units
+        self.workers = workers
+        self.chunk = chunk
+        self.retries = retries
+        self.commit_every = commit_every
+        self.max_gap = max_gap
+        self.store = CrawlStore(filename)
+        stored = self.store.meta('municipio')
+        if stored is None:
+            self.store.set_meta('municipio', '%s|%s' % (provincia, municipio))
+            self.store.add('via', '', {})
+            self.store.commit()
+        elif stored != '%s|%s' % (provincia, municipio):
+            raise ValueError('The crawl file belongs to %s' % stored)
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run_task(self, kind, key, args):
+        if kind == 'via':
+            return self.client.ConsultaVia(self.provincia, self.municipio)
+        if kind == 'numero':
+            return self.client.ConsultaNumero(self.provincia, self.municipio,
+                                              args['tv'], args['nv'],
+                                              args['numero'])
+        return self.client.Consulta_DNPRC(self.provincia, self.municipio, key)
+
+    def _discover(self, kind, args, result):
+        store = self.store
+        root = _root(result)
+        if kind == 'via':
+            for calle in as_list(path(root, 'callejero', 'calle')):
+                tv, nv = path(calle, 'dir', 'tv'), path(calle, 'dir', 'nv')
+                store.add('numero', '%s|%s|0' % (tv, nv),
+                          {'tv': tv, 'nv': nv, 'numero': 0})
+        elif kind == 'numero':
+            requested = args['numero']
+            ultimo = args.get('ultimo', 0)
+            for nump in as_list(path(root, 'numerero', 'nump')):
+                rc = _rc(nump.get('pc') or {})
+                if rc:
+                    store.add('dnprc', rc, {})
+                n = numero(path(nump, 'num', 'pnp'))
+                if n is not None:
+                    ultimo = max(ultimo, n)
+            # Si el número existe sólo se retorna ese y se sigue por el
+            # siguiente. Si no existe se retornan todos los números a
+            # distancia RANGO y se sigue por el primero que no se conoce,
+            # hasta pasar max_gap números sin encontrar ninguno.
+            if path(root, 'lerr', 'err') is None:
+                siguiente = requested + 1
+            else:
+                siguiente = requested + RANGO + 1
+            if siguiente - ultimo <= self.max_gap:
+                store.add('numero', '%s|%s|%d' % (args['tv'], args['nv'], siguiente),
+                          {'tv': args['tv'], 'nv': args['nv'],
+                           'numero': siguiente, 'ultimo': ultimo})
+        elif self.units:
+            for rcdnp in as_list(path(root, 'lrcdnp', 'rcdnp')):
+                rc = _rc(rcdnp.get('rc') or {})
+                if rc:
+                    store.add('dnprc', rc, {})
+
+    def progress(self, rate=0.0):
+        """Retorna el estado actual del recorrido.
+
+           :rtype: Progress
+        """
+
+        counts = self.store.counts()
+        done = sum(n for (_, s), n in counts.items() if s == DONE)
+        pending = sum(n for (_, s), n in counts.items() if s == PENDING)
+        failed = sum(n for (_, s), n in counts.items() if s == FAILED)
+        eta = pending / rate if rate else None
+        return Progress(done, pending, failed, rate, eta)
+
+    def run(self, progress=None, max_tasks=None):
+        """Hace las tareas pendientes hasta terminar.
+
+           :param callable: Opcional, función a la que se llama con un
+                            :class:`Progress` cada ``commit_every`` tareas
+           :param int: Opcional, máximo de tareas de esta ejecución
+           :return: Estado final
+           :rtype: Progress
+        """
+
+        store = self.store
+        start = time.time()
+        finished = 0
+        while max_tasks is None or finished < max_tasks:
+            tasks = []
+            for kind in KINDS:
+                tasks = store.pending(kind, self.chunk)
+                if tasks:
+                    break
+            if not tasks:
+                break
+            if max_tasks is not None:
+                tasks = tasks[:max_tasks - finished]
+            for r in map_batch(self._run_task, tasks, self.workers, ordered=False):
+                kind, key, args = r.item
+                if r.error is not None:
+                    store.fail(kind, key, r.error, self.retries)
+                else:
+                    self._discover(kind, args, r.result)
+                    store.done(kind, key, r.result)
+                finished += 1
+                if finished % self.commit_every == 0:
+                    store.commit()
+                    if progress is not None:
+                        progress(self.progress(finished / (time.time() - start)))
+            store.commit()
+        elapsed = time.time() - start
+        state = self.progress(finished / elapsed if elapsed else 0.0)
+        if progress is not None:
+            progress(state)
+        return state
+
+    def results(self, kind='dnprc'):
+        """Generador de (clave, resultado) de las tareas terminadas de un tipo.
+
+           Las claves de ``'dnprc'`` son las referencias catastrales y las
+           de ``'numero'`` tienen la forma ``tipo|vía|número``.
+        """
+
+        return self.store.results(kind)
+
+
+def _print_progress(p):
+    eta = '%.0fs' % p.eta if p.eta is not None else '?'
+    sys.stderr.write('%d done, %d pending, %d failed, %.1f/s, eta %s\n'
+                     % (p.done, p.pending, p.failed, p.rate, eta))
+
+
+def main():
+    from pycatastro import PyCatastro
+
+    parser = argparse.ArgumentParser(
+        description='Inventario reanudable de un municipio del Catastro')
+    parser.add_argument('filename', help='fichero SQLite del recorrido')
+    parser.add_argument('provincia')
+    parser.add_argument('municipio')
+    parser.add_argument('--sin-inmuebles', action='store_true',
+                        help='no consulta cada inmueble de las parcelas')
+    parser.add_argument('--reintentar', action='store_true',
+                        help='vuelve a intentar las tareas fallidas')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    with Crawler(PyCatastro.default(), args.filename, args.provincia,
+                 args.municipio, not args.sin_inmuebles, args.workers) as crawler:
+        if args.reintentar:
+            crawler.store.retry_failed()
+        crawler.run(_print_progress)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,474 @@
+# coding=utf-8
+"""Registro de las consultas de los servicios web del Catastro.
+
+Cada consulta se declara una vez en :data:`ENDPOINTS` con su servicio, sus
+parámetros y cómo se convierte cada uno. A partir de la declaración se
+precalculan la ruta y los valores por defecto, y se generan las funciones
+que construyen los parámetros y los métodos de
+:class:`pycatastro.PyCatastro`, de manera que llamar a una consulta no
+tiene más coste que construir su diccionario de parámetros::
+
+    >>> ENDPOINTS['ConsultaNumero'].params('BARCELONA', 'BARCELONA', 'CL',
+    ...                                    'MALLORCA', 10)['Numero']
+    '10'
+"""
+import functools
+from collections import OrderedDict
+
+
+CALLEJERO = 'OVCCallejero'
+COORDENADAS = 'OVCCoordenadas'
+
+
+def texto(value):
+    """Valor como texto."""
+
+    return str(value)
+
+
+def opcional(value):
+    """Valor como texto, o cadena vacía si no tiene valor."""
+
+    return str(value) if value else ''
+
+
+def srs(value):
+    """Sistema de coordenadas; los números se convierten a ``EPSG:n``.
+
+       Sin valor (``''`` o ``None``) se retorna tal cual, de manera que el
+       servicio usa el sistema del dato.
+    """
+
+    if not value or isinstance(value, str):
+        return value
+    return 'EPSG:%s' % value
+
+
+_INLINE = {
+    texto: 'str(%(arg)s)',
+    opcional: "(str(%(arg)s) if %(arg)s else '')",
+}
+"""Conversiones que el código generado hace sin llamar a la función."""
+
+
+class Param(object):
+    """Parámetro de una consulta.
+
+       :param str: Nombre del argumento del método
+       :param str: Nombre del parámetro en el servicio
+       :param callable: Opcional, conversión del valor
+       :param bool: Si es cierto el argumento es opcional (por defecto
+                    ``None``) y se convierte con :func:`opcional`
+    """
+
+    __slots__ = ('arg', 'key', 'coerce', 'optional')
+
+    def __init__(self, arg, key, coerce=None, optional=False):
+        if optional and coerce is None:
+            coerce = opcional
+        self.arg = arg
+        self.key = key
+        self.coerce = coerce
+        self.optional = optional
+
+
+class Endpoint(object):
+    """Consulta de uno de los servicios web del Catastro.
+
+       :param str: Nombre del método del cliente
+       :param str: Servicio (:data:`CALLEJERO` o :data:`COORDENADAS`)
+       :param list: Parámetros (:class:`Param`) en el orden de los argumentos
+       :param str: Documentación del método
+       :param str: Opcional, operación del servicio si no se llama como el
+                   método
+       :param dict: Opcional, nombres antiguos de argumentos que el método
+                    sigue aceptando por nombre (antiguo: actual)
+    """
+
+    def __init__(self, name, service, params=(), doc=None, operation=None,
+                 aliases=None):
+        self.name = name
+        self.service = service
+        self.operation = operation or name
+        self.path = '/%s.asmx/%s' % (service, self.operation)
+        self.args = tuple(params)
+        self.doc = doc
+        self.aliases = dict(aliases or {})
+        self.params = self._compile('_params', 'return %s' % self._dict())
+
+    def __repr__(self):
+        return '<Endpoint %s %s>' % (self.name, self.path)
+
+    def _dict(self):
+        if not self.args:
+            return 'None'
+        items = []
+        for i, param in enumerate(self.args):
+            value = param.arg
+            if param.coerce in _INLINE:
+                value = _INLINE[param.coerce] % {'arg': value}
+            elif param.coerce is not None:
+                value = '_c%d(%s)' % (i, value)
+            items.append('%r: %s' % (param.key, value))
+        return '{%s}' % ', '.join(items)
+
+    def _compile(self, name, body, first=()):
+        # Se genera el código como haría a mano, para que el método tenga la
+        # firma de la consulta y no tenga que asociar los argumentos
+        args = list(first) + [p.arg + '=None' if p.optional else p.arg
+                              for p in self.args]
+        source = 'def %s(%s):\n    %s\n' % (name, ', '.join(args), body)
+        namespace = {'_path': self.path}
+        for i, param in enumerate(self.args):
+            namespace['_c%d' % i] = param.coerce
+        exec(compile(source, '<endpoint %s>' % self.name, 'exec'), namespace)
+        return namespace[name]
+
+    def method(self):
+        """Genera el método del cliente que hace la consulta.
+
+           :return: Función ``(self, *args)`` que llama a ``self._get``
+        """
+
+        if self.args:
+            body = 'return self._get(_path, %s)' % self._dict()
+        else:
+            body = 'return self._get(_path)'
+        func = self._compile(self.name, body, first=('self',))
+        func.__doc__ = self.doc
+        func.__module__ = 'pycatastro'
+        func.__qualname__ = 'PyCatastro.%s' % self.name
+        if self.aliases:
+            func = _aliased(func, self.aliases)
+        return func
+
+
+def _aliased(func, aliases):
+    @functools.wraps(func)
+    def method(*args, **kwargs):
+        for old, new in aliases.items():
+            if old in kwargs:
+                kwargs[new] = kwargs.pop(old)
+        return func(*args, **kwargs)
+    return method
+
+
+ENDPOINTS = OrderedDict((e.name, e) for e in (
+    Endpoint('ConsultaProvincia', CALLEJERO, doc=
+        """Proporciona un listado de las provincias.
+
+           Proporciona un listado de todas las provincias españolas en las que
+           tiene competencia la Dirección general del Catastro.
+
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('ConsultaMunicipio', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio', optional=True),
+    ], doc=
+        """Proporciona un listado de todos los municipios de una provincia.
+
+           Proporciona un listado de todos los nombres de los municipios de una
+           provincia (parámetro "Provincia"), así como sus códigos (de Hacienda
+           y del INE), cuyo nombre contiene la cadena del parámetro de entrada
+           "Municipio". En caso de que este último parámetro no tenga ningún
+           valor, el servicio devuelve todos los municipios de la provincia.
+           También proporciona información de si existe cartografía catastral
+           (urbana o rústica) de cada municipio.
+
+           :param str: Nombre de la provincia
+           :param str: Opcional, nombre del municipio
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('ConsultaVia', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('tipovia', 'TipoVia', optional=True),
+        Param('nombrevia', 'NombreVia', optional=True),
+    ], doc=
+        """Proporciona un listado de todas las vías de un municipio.
+
+           Proporciona un listado de todas las vías de un municipio (parámetros
+           "Provincia" y "Municipio"), así como los códigos de las mismas según
+           la Dirección General del Catastro (DGC), cuyo nombre contiene la
+           cadena del parámetro de entrada "NombreVia" y, en caso de que el
+           parámetro "TipoVia" contenga información, existe coincidencia en el
+           tipo de la vía. En caso de que el parámetro "NombreVia" no tenga
+           ningún valor, el servicio devuelve todas las vías del municipio del
+           "TipoVia" indicado.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre de municipio
+           :param str: Opcional, tipo de via
+           :param str: Opcional, nombre de via
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('ConsultaNumero', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('tipovia', 'TipoVia'),
+        Param('nombrevia', 'NomVia'),
+        Param('numero', 'Numero', texto),
+    ], doc=
+        """Proporciona la referencia catastral de la finca correspondiente.
+
+           Proporciona, o bien la referencia catastral de la finca
+           correspondiente al contenido del parámetro "Número", en caso de que
+           este exista, o bien se devuelve un error ("El número no existe") y
+           se proporciona una lista de los números más aproximados al
+           solicitado, en un rango de 5 por arriba y 5 por abajo. Por ejemplo,
+           si se solicita el número 10, y en esa vía existen los números
+           2,3,6,7,9,11,15 y 17, se devuelve una lista con los números
+           6,7,9,11 y 15. Junto con la lista de números, se proporcionan las
+           referencias catastrales de las fincas.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Tipo de la via
+           :param str: Nombre de la via
+           :param str,int: Numero del que se desea conocer la referencia
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_DNPLOC', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('sigla', 'Sigla'),
+        Param('calle', 'Calle'),
+        Param('numero', 'Numero', texto),
+        Param('bloque', 'Bloque', optional=True),
+        Param('escalera', 'Escalera', optional=True),
+        Param('planta', 'Planta', optional=True),
+        Param('puerta', 'Puerta', optional=True),
+    ], doc=
+        """Proporciona la lista de todos los inmuebles coincidentes o sus datos.
+
+           Este servicio puede devolver o bien la lista de todos los inmuebles
+           que coinciden con los criterios de búsqueda, proporcionando para
+           cada inmueble la referencia catastral y su localización
+           (bloque/escalera/planta/puerta) o bien, en el caso de que solo
+           exista un inmueble con los parámetros de entrada indicados,
+           proporciona los datos de un inmueble.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Sigla
+           :param str: Nombre de la calle
+           :param str,int: Numero del que se quiere conocer los datos
+           :param str,int: Opcional, numero de bloque
+           :param str: Opcional, escalera
+           :param str,int: Opcional, numero de planta
+           :param str,int: Opcional, numero de puerta
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_DNPRC', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('rc', 'RC'),
+    ], doc=
+        """Proporciona los datos catastrales no protegidos de un inmueble
+
+           Este servicio es idéntico al de "Consulta de DATOS CATASTRALES NO
+           PROTEGIDOS de un inmueble identificado por su localización" en todo
+           excepto en los parámetros de entrada.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Referencia catastral
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_DNPPP', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('poligono', 'Poligono'),
+        Param('parcela', 'Parcela'),
+    ], doc=
+        """Proporciona los datos catastrales no protegidos de un inmueble
+
+           Este servicio es idéntico al de "Consulta de DATOS CATASTRALES NO
+           PROTEGIDOS de un inmueble identificado por su localización" en todo
+           excepto en los parámetros de entrada.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Codigo del poligono
+           :param str: Codigo de la parcela
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('ConsultaMunicipioCodigos', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio', optional=True),
+    ], operation='ConsultaMunicipio', doc=
+        """Proporciona un listado de todos los nombres de los municipios de una provincia.
+
+           Igual que :meth:`ConsultaMunicipio`.
+
+           :param str: Nombre de la provincia
+           :param str: Opcional, nombre del municipio
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('ConsultaViaCodigos', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('tipovia', 'TipoVia', optional=True),
+        Param('nombrevia', 'NombreVia', optional=True),
+    ], operation='ConsultaVia', doc=
+        """Proporciona un listado de las vías de un municipio.
+
+           Igual que :meth:`ConsultaVia`.
+
+           :param str: Nombre de provincia
+           :param str: Nombre del municipio
+           :param str: Opcional, tipo de via
+           :param str: Opcional, nombre de via
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('ConsultaNumeroCodigos', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('tipovia', 'TipoVia'),
+        Param('nombrevia', 'NomVia'),
+        Param('numero', 'Numero', texto),
+    ], operation='ConsultaNumero', doc=
+        """Proporciona la referencia catastral de la finca correspondiente.
+
+           Igual que :meth:`ConsultaNumero`.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Tipo de la via
+           :param str: Nombre de la via
+           :param str,int: Numero del que se desea conocer la referencia
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_DNPLOC_Codigos', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('sigla', 'Sigla'),
+        Param('nombrevia', 'Calle'),
+        Param('numero', 'Numero', texto),
+        Param('bloque', 'Bloque', optional=True),
+        Param('escalera', 'Escalera', optional=True),
+        Param('planta', 'Planta', optional=True),
+        Param('puerta', 'Puerta', optional=True),
+    ], operation='Consulta_DNPLOC', doc=
+        """Proporciona la lista de todos los inmuebles que coinciden.
+
+           Igual que :meth:`Consulta_DNPLOC`.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Sigla
+           :param str: Nombre de la via
+           :param str,int: Numero de inmueble
+           :param str,int: Opcional, numero de bloque
+           :param str: Opcional, escalera
+           :param str,int: Opcional, numero de planta
+           :param str,int: Opcional, numero de puerta
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_DNPRC_Codigos', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('rc', 'RC'),
+    ], operation='Consulta_DNPRC', doc=
+        """Proporciona los datos catastrales de un inmueble.
+
+           Igual que :meth:`Consulta_DNPRC`.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Referencia catastral
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_DNPPP_Codigos', CALLEJERO, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('poligono', 'Poligono'),
+        Param('parcela', 'Parcela'),
+    ], operation='Consulta_DNPPP', doc=
+        """Proporciona los datos catastrales de un inmueble.
+
+           Igual que :meth:`Consulta_DNPPP`.
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str: Codigo del poligono
+           :param str: Codigo de la parcela
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_RCCOOR', COORDENADAS, [
+        Param('srs', 'SRS', srs),
+        Param('x', 'Coordenada_X', texto),
+        Param('y', 'Coordenada_Y', texto),
+    ], doc=
+        """A partir de unas coordenadas se obtiene la referencia catastral.
+
+           A partir de unas coordenadas (X e Y) y su sistema de referencia se
+           obtiene la referencia catastral de la parcela localizada en ese
+           punto así como el domicilio (municipio, calle y número o polígono,
+           parcela y municipio).
+
+           :param str,int: Sistema de coordenadas
+           :param str,int,float: Coordenada X
+           :param str,int,float: Coordenada Y
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_RCCOOR_Distancia', COORDENADAS, [
+        Param('srs', 'SRS', srs),
+        Param('x', 'Coordenada_X', texto),
+        Param('y', 'Coordenada_Y', texto),
+    ], doc=
+        """Proporciona la referencia catastral a partir de unas coordenadas.
+
+           A partir de unas coordenadas (X e Y) y su sistema de referencia se
+           obtiene la referencia catastral de la parcela localizada en ese
+           punto así como el domicilio (municipio, calle y número o polígono,
+           parcela y municipio). En caso de no encontrar ninguna referencia
+           catastral en dicho punto, se buscará en un área cuadrada de 50
+           metros de lado, centrada en dichas coordenadas, y se devolverá
+           la lista de referencias catastrales encontradas en dicha área.
+
+           :param str,int: Sistema de coordenadas
+           :param str,int,float: Coordenada X
+           :param str,int,float: Coordenada Y
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+    Endpoint('Consulta_CPMRC', COORDENADAS, [
+        Param('provincia', 'Provincia'),
+        Param('municipio', 'Municipio'),
+        Param('srs', 'SRS', srs),
+        Param('rc', 'RC'),
+    ], aliases={'provicia': 'provincia'}, doc=
+        """Proporciona la localizacion de una parcela.
+
+           A partir de la RC de una parcela se obtienen las coordenadas X, Y en
+           el sistema de referencia en el que está almacenado el dato en la
+           D.G. del Catastro, a menos que se especifique lo contrario en el
+           parámetro opcional SRS que se indica en la respuesta, así como el
+           domicilio (municipio, calle y número o polígono, parcela y
+           municipio).
+
+           :param str: Nombre de la provincia
+           :param str: Nombre del municipio
+           :param str,int: Sistema de coordenadas (``''`` para el del dato)
+           :param str: Referencia catastral
+           :return: Retorna un dicionario con los datos de la consulta
+           :rtype: dict
+        """),
+))
+"""Consultas por nombre de método, en el orden de la documentación."""
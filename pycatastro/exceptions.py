@@ -0,0 +1,19 @@
+# coding=utf-8
+
+
+class CatastroError(Exception):
+    """Error retornado por el servicio del Catastro en el nodo ``lerr``.
+
+       :ivar code: Código del error
+       :ivar description: Descripción del error
+    """
+
+    def __init__(self, code, description):
+        super(CatastroError, self).__init__(
+            '%s: %s' % (code, description))
+        self.code = code
+        self.description = description
+
+    def __reduce__(self):
+        # Para pasar el error entre procesos (ver pycatastro.pipeline)
+        return self.__class__, (self.code, self.description)
@@ -0,0 +1,321 @@
+# coding=utf-8
+"""Exportación en columnas (CSV o Parquet) de resultados masivos.
+
+Cada respuesta se aplana en filas con un esquema fijo por consulta y las
+filas se escriben a medida que llegan, así que la memoria no depende del
+número de resultados::
+
+    results = (r.result for r in client.Consulta_CPMRC_Lote(referencias)
+               if r.error is None)
+    export(results, 'Consulta_CPMRC', 'parcelas.parquet')
+
+Parquet requiere ``pyarrow``.
+"""
+import csv
+import io
+
+from pycatastro.models import Inmueble, Parcela, as_coordenadas
+from pycatastro.utils import as_list, path
+
+
+INMUEBLES = (
+    ('rc', 'string'),
+    ('clase', 'string'),
+    ('provincia', 'string'),
+    ('municipio', 'string'),
+    ('provincia_ine', 'int'),
+    ('municipio_ine', 'int'),
+    ('municipio_dgc', 'int'),
+    ('codigo_via', 'int'),
+    ('tipo_via', 'string'),
+    ('via', 'string'),
+    ('numero', 'string'),
+    ('bloque', 'string'),
+    ('escalera', 'string'),
+    ('planta', 'string'),
+    ('puerta', 'string'),
+    ('codigo_postal', 'string'),
+    ('poligono', 'string'),
+    ('parcela', 'string'),
+    ('paraje', 'string'),
+    ('uso', 'string'),
+    ('superficie', 'int'),
+    ('coeficiente', 'string'),
+    ('antiguedad', 'int'),
+    ('direccion', 'string'),
+)
+"""Columnas de Consulta_DNPRC, DNPLOC y DNPPP (un inmueble por fila).
+
+   Las de la vía sólo tienen valor en urbana y ``poligono``, ``parcela`` y
+   ``paraje`` sólo en rústica.
+"""
+
+COORDENADAS = (
+    ('rc', 'string'),
+    ('x', 'float'),
+    ('y', 'float'),
+    ('srs', 'string'),
+    ('direccion', 'string'),
+    ('distancia', 'float'),
+)
+"""Columnas de Consulta_RCCOOR, RCCOOR_Distancia y CPMRC (una parcela por fila)."""
+
+SCHEMAS = {
+    'Consulta_DNPRC': INMUEBLES,
+    'Consulta_DNPLOC': INMUEBLES,
+    'Consulta_DNPPP': INMUEBLES,
+    'Consulta_RCCOOR': COORDENADAS,
+    'Consulta_RCCOOR_Distancia': COORDENADAS,
+    'Consulta_CPMRC': COORDENADAS,
+}
+"""Esquema (nombre y tipo de cada columna) de cada consulta."""
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rc(node):
+    return ''.join(node.get(k) or '' for k in
+                   ('pc1', 'pc2', 'car', 'cc1', 'cc2')) or None
+
+
+def _inmueble(rc, clase, dt, debi, ldt):
+    lourb = path(dt, 'locs', 'lous', 'lourb') or {}
+    via = lourb.get('dir') or {}
+    loint = lourb.get('loint') or {}
+    lorus = path(dt, 'locs', 'lors', 'lorus') or {}
+    cpp = lorus.get('cpp') or {}
+    return (
+        rc, clase, dt.get('np'), dt.get('nm'),
+        _int(path(dt, 'loine', 'cp')), _int(path(dt, 'loine', 'cm')),
+        _int(dt.get('cmc')), _int(via.get('cv')), via.get('tv'), via.get('nv'),
+        via.get('pnp'), loint.get('bq'), loint.get('es'), loint.get('pt'),
+        loint.get('pu'), lourb.get('dp'), cpp.get('cpo'), cpp.get('cpa'),
+        lorus.get('npa'), debi.get('luso'),
+        _int(debi.get('sfc')), debi.get('cpt'), _int(debi.get('ant')), ldt,
+    )
+
+
+def _bico(bico):
+    bi = bico.get('bi') or {}
+    return _inmueble(_rc(path(bi, 'idbi', 'rc') or {}), path(bi, 'idbi', 'cn'),
+                     bi.get('dt') or {}, bi.get('debi') or {}, bi.get('ldt'))
+
+
+def _rcdnp(rcdnp):
+    return _inmueble(_rc(rcdnp.get('rc') or {}), None, rcdnp.get('dt') or {},
+                     {}, None)
+
+
+def flatten_inmuebles(result):
+    """Filas de :data:`INMUEBLES` de un resultado de Consulta_DNPRC.
+
+       Acepta el diccionario del cliente o la lista de modelos.
+    """
+
+    if isinstance(result, list):
+        for item in result:
+            if isinstance(item, Inmueble):
+                yield _bico(item.to_dict())
+            elif isinstance(item, Parcela):
+                yield _rcdnp(item.to_dict())
+        return
+    root = next(iter(result.values()))
+    for bico in as_list(root.get('bico')):
+        yield _bico(bico)
+    for rcdnp in as_list(path(root, 'lrcdnp', 'rcdnp')):
+        yield _rcdnp(rcdnp)
+
+
+def flatten_coordenadas(result):
+    """Filas de :data:`COORDENADAS` de un resultado de coordenadas."""
+
+    for c in as_coordenadas(result):
+        yield (c.rc, c.x, c.y, c.srs, c.direccion, _float(c.distancia))
+
+
+FLATTEN = {
+    'Consulta_DNPRC': flatten_inmuebles,
+    'Consulta_DNPLOC': flatten_inmuebles,
+    'Consulta_DNPPP': flatten_inmuebles,
+    'Consulta_RCCOOR': flatten_coordenadas,
+    'Consulta_RCCOOR_Distancia': flatten_coordenadas,
+    'Consulta_CPMRC': flatten_coordenadas,
+}
+
+
+def flatten(endpoint, result):
+    """Retorna las filas de un resultado según el esquema de su consulta.
+
+       :param str: Nombre de la consulta (por ejemplo ``'Consulta_DNPRC'``)
+       :param dict,list: Resultado del cliente
+       :return: Generador de tuplas con las columnas de ``SCHEMAS[endpoint]``
+    """
+
+    try:
+        func = FLATTEN[endpoint]
+    except KeyError:
+        raise ValueError('No export schema for %s' % endpoint)
+    return func(result)
+
+
+class CsvWriter(object):
+    """Escribe filas en CSV (UTF-8, con cabecera)."""
+
+    def __init__(self, filename, columns, header=True):
+        """Abre el fichero de salida.
+
+           :param str,file: Ruta o fichero de texto abierto
+           :param tuple: Esquema, pares (nombre, tipo)
+           :param bool: Si es falso no se escribe la cabecera
+        """
+
+        self.columns = columns
+        self._own = not hasattr(filename, 'write')
+        if self._own:
+            filename = io.open(filename, 'w', encoding='utf-8', newline='')
+        self._file = filename
+        self._writer = csv.writer(filename)
+        if header:
+            self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        """Escribe una secuencia de filas."""
+
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._own:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetWriter(object):
+    """Escribe filas en Parquet con ``pyarrow``, un grupo de filas cada vez.
+
+       Las filas se acumulan por columnas hasta tener ``row_group_size`` y
+       entonces se escriben como un grupo de filas, de manera que la memoria
+       sólo depende del tamaño del grupo.
+    """
+
+    TYPES = {'string': 'string', 'int': 'int64', 'float': 'float64'}
+
+    def __init__(self, filename, columns, row_group_size=65536,
+                 compression='snappy'):
+        """Abre el fichero de salida.
+
+           :param str,file: Ruta o fichero binario abierto
+           :param tuple: Esquema, pares (nombre, tipo)
+           :param int: Filas de cada grupo
+           :param str: Compresión de Parquet
+        """
+
+        import pyarrow
+        import pyarrow.parquet
+
+        self._pa = pyarrow
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.schema = pyarrow.schema([
+            (name, getattr(pyarrow, self.TYPES[kind])()) for name, kind in columns
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(
+            filename, self.schema, compression=compression)
+        self._buffer = [[] for _ in columns]
+        self._size = 0
+
+    def write(self, rows):
+        """Añade filas y escribe los grupos que se completan."""
+
+        buffer = self._buffer
+        for row in rows:
+            for column, value in zip(buffer, row):
+                column.append(value)
+            self._size += 1
+            if self._size >= self.row_group_size:
+                self.flush()
+
+    def flush(self):
+        """Escribe las filas pendientes como un grupo."""
+
+        if not self._size:
+            return
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type)
+             for column, field in zip(self._buffer, self.schema)],
+            schema=self.schema)
+        self._writer.write_table(table)
+        for column in self._buffer:
+            del column[:]
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def export(results, endpoint, filename, format=None, **kwargs):
+    """Aplana y escribe una secuencia de resultados de una consulta.
+
+       Los resultados se consumen de uno en uno, así que se puede pasar un
+       generador (por ejemplo de :func:`pycatastro.batch.map_batch`). Los
+       ``None`` se ignoran.
+
+       :param iterable: Resultados del cliente
+       :param str: Nombre de la consulta
+       :param str,file: Ruta o fichero abierto de salida
+       :param str: Opcional, ``'csv'`` o ``'parquet'`` (por defecto según
+                   la extensión de la ruta, ``'csv'`` para un fichero)
+       :param kwargs: Parámetros del escritor (por ejemplo
+                      ``row_group_size``)
+       :return: Número de filas escritas
+       :rtype: int
+    """
+
+    if endpoint not in SCHEMAS:
+        raise ValueError('No export schema for %s' % endpoint)
+    if format is None:
+        format = 'csv'
+        if isinstance(filename, str) and filename.endswith(('.parquet', '.pq')):
+            format = 'parquet'
+    try:
+        writer_class = WRITERS[format]
+    except KeyError:
+        raise ValueError('Invalid export format: %s' % format)
+    rows = 0
+    with writer_class(filename, SCHEMAS[endpoint], **kwargs) as writer:
+        for result in results:
+            if result is None:
+                continue
+            batch = list(flatten(endpoint, result))
+            writer.write(batch)
+            rows += len(batch)
+    return rows
@@ -0,0 +1,225 @@
+# coding=utf-8
+"""Callejero sin conexión: provincias, municipios y vías del Catastro.
+
+Para crear una instantánea::
+
+    $ python -m pycatastro.gazetteer callejero.json.gz --provincia BARCELONA
+
+Y para consultarla::
+
+    callejero = Gazetteer.load('callejero.json.gz')
+    callejero.ConsultaVia('BARCELONA', 'BARCELONA', nombrevia='DIAGONAL')
+"""
+import argparse
+import gzip
+import io
+import json
+import time
+
+from pycatastro.batch import map_batch
+from pycatastro.utils import as_list, from_list, normalize, path
+
+
+FORMAT_VERSION = 1
+
+
+class Gazetteer(object):
+    """Instantánea de ConsultaProvincia, ConsultaMunicipio y ConsultaVia.
+
+       Los métodos de consulta tienen la misma firma y retornan la misma
+       estructura que los de :class:`pycatastro.PyCatastro`, pero se
+       resuelven en memoria. Si la provincia o el municipio no están en la
+       instantánea se lanza ``KeyError``.
+    """
+
+    def __init__(self, provincias, municipios, vias, created=None):
+        """Crea el callejero a partir de los datos compactos.
+
+           :param list: Tuplas (cpine, np)
+           :param dict: Por nombre de provincia, tuplas
+                        (nm, cd, cmc, cp, cm)
+           :param dict: Por "provincia|municipio", tuplas (cv, tv, nv)
+           :param float: Opcional, fecha de creación (timestamp)
+        """
+
+        self.created = created or time.time()
+        self.provincias = [tuple(p) for p in provincias]
+        self.municipios = dict(
+            (normalize(k), [tuple(m) for m in v]) for k, v in municipios.items()
+        )
+        self.vias = dict(
+            (normalize(k), [tuple(c) for c in v]) for k, v in vias.items()
+        )
+        self._nombres = dict(
+            (k, [(normalize(m[0]), m) for m in v])
+            for k, v in self.municipios.items()
+        )
+        self._calles = {}
+
+    @classmethod
+    def load(cls, filename):
+        """Carga una instantánea guardada con :meth:`save`.
+
+           :param str: Ruta del fichero (``.gz`` para comprimido)
+           :rtype: Gazetteer
+        """
+
+        opener = gzip.open if filename.endswith('.gz') else io.open
+        with opener(filename, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        if data.get('format') != FORMAT_VERSION:
+            raise ValueError('Unsupported gazetteer format: %s' % data.get('format'))
+        return cls(data['provincias'], data['municipios'], data['vias'],
+                   data['created'])
+
+    def save(self, filename):
+        """Guarda la instantánea en formato JSON.
+
+           :param str: Ruta del fichero (``.gz`` para comprimido)
+        """
+
+        data = {
+            'format': FORMAT_VERSION,
+            'created': self.created,
+            'provincias': self.provincias,
+            'municipios': self.municipios,
+            'vias': self.vias,
+        }
+        opener = gzip.open if filename.endswith('.gz') else io.open
+        with opener(filename, 'wb') as f:
+            f.write(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def build(cls, client, provincias=None, vias=True, workers=4):
+        """Crea una instantánea consultando el servicio.
+
+           Las consultas se hacen siempre con resultados ``'dict'``: si el
+           cliente retorna modelos o respuestas sin procesar se usa una
+           copia con :meth:`pycatastro.PyCatastro.with_options`.
+
+           :param pycatastro.PyCatastro: Cliente a utilizar
+           :param list: Opcional, nombres de las provincias a incluir (por
+                        defecto todas)
+           :param bool: Si es falso no se consultan las vías
+           :param int: Consultas simultáneas
+           :rtype: Gazetteer
+        """
+
+        if getattr(client, 'result', 'dict') != 'dict':
+            client = client.with_options(result='dict')
+        data = client.ConsultaProvincia()
+        todas = [
+            (p['cpine'], p['np']) for p in
+            as_list(path(data, 'consulta_provinciero', 'provinciero', 'prov'))
+        ]
+        if provincias:
+            wanted = set(normalize(p) for p in provincias)
+            todas = [p for p in todas if normalize(p[1]) in wanted]
+
+        municipios = {}
+        for result in map_batch(client.ConsultaMunicipio,
+                                ((np,) for _, np in todas), workers):
+            if result.error is not None:
+                raise result.error
+            municipios[result.item[0]] = [
+                (m['nm'], path(m, 'locat', 'cd'), path(m, 'locat', 'cmc'),
+                 path(m, 'loine', 'cp'), path(m, 'loine', 'cm'))
+                for m in as_list(path(result.result, 'consulta_municipiero',
+                                      'municipiero', 'muni'))
+            ]
+
+        calles = {}
+        if vias:
+            items = ((np, m[0]) for np, ms in municipios.items() for m in ms)
+            for result in map_batch(client.ConsultaVia, items, workers):
+                if result.error is not None:
+                    raise result.error
+                calles['|'.join(result.item)] = [
+                    (path(c, 'dir', 'cv'), path(c, 'dir', 'tv'),
+                     path(c, 'dir', 'nv'))
+                    for c in as_list(path(result.result, 'consulta_callejero',
+                                          'callejero', 'calle'))
+                ]
+        return cls(todas, municipios, calles)
+
+    def _municipios(self, provincia):
+        return self._nombres[normalize(provincia)]
+
+    def _vias(self, key):
+        calles = self._calles.get(key)
+        if calles is None:
+            calles = [(normalize(c[1]), normalize(c[2]), c)
+                      for c in self.vias[key]]
+            self._calles[key] = calles
+        return calles
+
+    def ConsultaProvincia(self):
+        """Listado de provincias, igual que :meth:`PyCatastro.ConsultaProvincia`."""
+
+        return {'consulta_provinciero': {
+            'control': {'cuprov': str(len(self.provincias))},
+            'provinciero': {'prov': from_list([
+                {'cpine': cpine, 'np': np} for cpine, np in self.provincias
+            ])},
+        }}
+
+    def ConsultaMunicipio(self, provincia, municipio=None):
+        """Listado de municipios, igual que :meth:`PyCatastro.ConsultaMunicipio`."""
+
+        nombre = normalize(municipio)
+        munis = [m for n, m in self._municipios(provincia) if nombre in n]
+        return {'consulta_municipiero': {
+            'control': {'cumun': str(len(munis))},
+            'municipiero': {'muni': from_list([
+                {'nm': nm,
+                 'locat': {'cd': cd, 'cmc': cmc},
+                 'loine': {'cp': cp, 'cm': cm}}
+                for nm, cd, cmc, cp, cm in munis
+            ])},
+        }}
+
+    def ConsultaVia(self, provincia, municipio, tipovia=None, nombrevia=None):
+        """Listado de vías, igual que :meth:`PyCatastro.ConsultaVia`."""
+
+        nombre_muni = normalize(municipio)
+        muni = None
+        for n, m in self._municipios(provincia):
+            if n == nombre_muni:
+                muni = m
+                break
+        if muni is None:
+            raise KeyError(municipio)
+        tipo = normalize(tipovia)
+        nombre = normalize(nombrevia)
+        key = normalize(provincia) + '|' + nombre_muni
+        calles = [c for t, n, c in self._vias(key)
+                  if (not tipo or t == tipo) and nombre in n]
+        return {'consulta_callejero': {
+            'control': {'cuca': str(len(calles))},
+            'callejero': {'calle': from_list([
+                {'loine': {'cp': muni[3], 'cm': muni[4]},
+                 'dir': {'cv': cv, 'tv': tv, 'nv': nv}}
+                for cv, tv, nv in calles
+            ])},
+        }}
+
+
+def main():
+    from pycatastro import PyCatastro
+
+    parser = argparse.ArgumentParser(
+        description='Crea una instantánea del callejero del Catastro')
+    parser.add_argument('filename', help='fichero de salida (.json o .json.gz)')
+    parser.add_argument('--provincia', action='append',
+                        help='provincia a incluir (se puede repetir)')
+    parser.add_argument('--sin-vias', action='store_true',
+                        help='no consulta las vías de los municipios')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    gazetteer = Gazetteer.build(PyCatastro.default(), args.provincia,
+                                not args.sin_vias, args.workers)
+    gazetteer.save(args.filename)
+
+
+if __name__ == '__main__':
+    main()
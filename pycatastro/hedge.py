@@ -0,0 +1,311 @@
+# coding=utf-8
+import heapq
+import itertools
+import threading
+from collections import deque
+from timeit import default_timer as timer
+
+
+class Hedger(object):
+    """Decide cuándo repetir una consulta lenta (hedged requests).
+
+       Guarda las últimas ``window`` latencias de cada consulta. Cuando una
+       consulta tarda más que el percentil ``percentile`` de las anteriores
+       del mismo tipo, el cliente lanza una copia y se queda con la
+       respuesta que llegue antes, así que las pocas respuestas muy lentas
+       dejan de marcar la latencia de cola::
+
+           client = PyCatastro(timeout=10, hedger=Hedger(percentile=95))
+
+       Como mucho se lanzan copias de una fracción ``budget`` de las
+       consultas, de manera que si el servidor se vuelve lento en general
+       las copias no doblan la carga.
+
+       ``stats`` cuenta las consultas (``calls``), las copias lanzadas
+       (``fired``) y las que han llegado antes que la original (``won``).
+    """
+
+    def __init__(self, percentile=95, min_samples=20, window=500,
+                 min_delay=0.0, max_delay=None, workers=16, refresh=10,
+                 budget=0.1):
+        """Crea el gestor.
+
+           :param float: Percentil de la latencia a partir del que se lanza
+                         la copia
+           :param int: Latencias necesarias antes de empezar a lanzar copias
+           :param int: Latencias que se guardan de cada consulta
+           :param float: Espera mínima antes de lanzar una copia (segundos)
+           :param float: Opcional, espera máxima antes de lanzar una copia
+           :param int: Hilos del cliente síncrono para las copias
+           :param int: Latencias nuevas entre dos cálculos del percentil
+           :param float: Fracción máxima de las consultas de las que se
+                         lanza una copia
+        """
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.workers = workers
+        self.refresh = refresh
+        self.budget = budget
+        self.stats = {'calls': 0, 'fired': 0, 'won': 0}
+        self._samples = {}
+        self._delays = {}
+        self._pending = {}
+        self._executor = None
+        self._timers = []
+        self._sequence = itertools.count()
+        self._scheduler = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+
+    @property
+    def executor(self):
+        """Pool de hilos donde el cliente síncrono hace las copias."""
+
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers)
+        return self._executor
+
+    def observe(self, endpoint, latency):
+        """Añade la latencia (segundos) de una consulta terminada."""
+
+        with self._lock:
+            self.stats['calls'] += 1
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(latency)
+            pending = self._pending.get(endpoint, 0) + 1
+            if len(samples) < self.min_samples:
+                self._pending[endpoint] = pending
+                return
+            if pending < self.refresh and endpoint in self._delays:
+                self._pending[endpoint] = pending
+                return
+            self._pending[endpoint] = 0
+            ordered = sorted(samples)
+            index = int(round(self.percentile / 100.0 * (len(ordered) - 1)))
+            delay = max(self.min_delay, ordered[index])
+            if self.max_delay is not None:
+                delay = min(self.max_delay, delay)
+            self._delays[endpoint] = delay
+
+    def delay(self, endpoint):
+        """Segundos tras los que hay que lanzar la copia, o ``None``.
+
+           :rtype: float
+        """
+
+        return self._delays.get(endpoint)
+
+    def allow(self):
+        """Indica si queda presupuesto para lanzar otra copia.
+
+           :rtype: bool
+        """
+
+        with self._lock:
+            return self.stats['fired'] < self.budget * self.stats['calls']
+
+    def fired(self):
+        """Anota una copia lanzada."""
+
+        with self._lock:
+            self.stats['fired'] += 1
+
+    def won(self):
+        """Anota una copia que ha llegado antes que la original."""
+
+        with self._lock:
+            self.stats['won'] += 1
+
+    def schedule(self, delay, func):
+        """Llama a ``func`` desde el hilo del gestor dentro de ``delay``
+           segundos.
+
+           ``func`` debe retornar enseguida (por ejemplo enviando la copia a
+           :attr:`executor`).
+
+           :return: Referencia para :meth:`unschedule`
+        """
+
+        entry = [timer() + delay, next(self._sequence), func]
+        with self._wakeup:
+            if self._closed:
+                raise RuntimeError('Hedger is closed')
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._run,
+                                                   name='pycatastro-hedger')
+                self._scheduler.daemon = True
+                self._scheduler.start()
+            heapq.heappush(self._timers, entry)
+            self._wakeup.notify()
+        return entry
+
+    @staticmethod
+    def unschedule(entry):
+        """Anula una llamada de :meth:`schedule` que todavía no se ha hecho."""
+
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while True:
+                    if self._closed:
+                        return
+                    if not self._timers:
+                        self._wakeup.wait()
+                        continue
+                    wait = self._timers[0][0] - timer()
+                    if wait <= 0:
+                        entry = heapq.heappop(self._timers)
+                        break
+                    self._wakeup.wait(wait)
+            func = entry[2]
+            if func is not None:
+                func()
+
+    def close(self):
+        """Termina el pool de hilos."""
+
+        with self._wakeup:
+            self._closed = True
+            self._timers = []
+            self._wakeup.notify()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_local = threading.local()
+
+
+class Attempt(object):
+    """Consulta del cliente síncrono que otro hilo puede cancelar.
+
+       Mientras se está dentro del bloque ``with``, las conexiones que usa el
+       hilo quedan anotadas (ver :func:`abortable`) y :meth:`cancel` las
+       cierra, de manera que el hilo deja de esperar la respuesta y la
+       consulta termina con un error.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._sockets = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        _local.attempt = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.attempt = None
+        with self._lock:
+            self._sockets.clear()
+
+    def track(self, sock):
+        with self._lock:
+            if not self.cancelled:
+                self._sockets.add(sock)
+                return
+        _shutdown(sock)
+
+    def untrack(self, sock):
+        with self._lock:
+            self._sockets.discard(sock)
+
+    def cancel(self):
+        """Cierra las conexiones de la consulta."""
+
+        with self._lock:
+            self.cancelled = True
+            sockets, self._sockets = self._sockets, set()
+        for sock in sockets:
+            _shutdown(sock)
+
+
+class Race(object):
+    """Una consulta y su copia: la primera que termina cancela la otra."""
+
+    def __init__(self):
+        self.attempts = (Attempt(), Attempt())
+        self.winner = None
+        self.result = None
+        self.finished = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def finish(self, attempt, result):
+        """Anota el resultado de ``attempt`` si es el primero.
+
+           :rtype: bool
+        """
+
+        with self.lock:
+            if self.winner is not None:
+                return False
+            self.winner = attempt
+            self.result = result
+            self.finished = timer()
+        for other in self.attempts:
+            if other is not attempt:
+                other.cancel()
+        return True
+
+
+def _shutdown(sock):
+    import socket
+
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+_pool_classes = {}
+
+
+def abortable(adapter):
+    """Hace que las consultas de un :class:`requests.adapters.HTTPAdapter`
+       se puedan cancelar con :class:`Attempt`.
+    """
+
+    if not _pool_classes:
+        from urllib3.connection import HTTPConnection, HTTPSConnection
+        from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+        def connection(base):
+            class Connection(base):
+                def getresponse(self, *args, **kwargs):
+                    attempt = getattr(_local, 'attempt', None)
+                    if attempt is not None and self.sock is not None:
+                        attempt.track(self.sock)
+                    return super(Connection, self).getresponse(*args, **kwargs)
+            return Connection
+
+        def pool(base, connection_cls):
+            class Pool(base):
+                ConnectionCls = connection_cls
+
+                def _put_conn(self, conn):
+                    # La conexión vuelve al pool: ya no es de esta consulta
+                    attempt = getattr(_local, 'attempt', None)
+                    if attempt is not None and conn is not None:
+                        attempt.untrack(conn.sock)
+                    return super(Pool, self)._put_conn(conn)
+            return Pool
+
+        _pool_classes.update({
+            'http': pool(HTTPConnectionPool, connection(HTTPConnection)),
+            'https': pool(HTTPSConnectionPool, connection(HTTPSConnection)),
+        })
+    adapter.poolmanager.pool_classes_by_scheme = _pool_classes
@@ -0,0 +1,532 @@
+# coding=utf-8
+"""Cola de consultas repartida en shards para varios procesos o máquinas.
+
+Las consultas se guardan en una base de datos SQLite compartida, agrupadas
+en shards por provincia y municipio (cada municipio se puede partir en
+``parts`` shards). Cada worker toma un shard con un lease de ``lease``
+segundos, lo renueva mientras trabaja (heartbeat) y lo libera al
+terminar. Si un worker muere, su lease caduca y otro worker retoma el
+shard con sólo las consultas pendientes::
+
+    queue = JobQueue('cola.db')
+    queue.add_many('Consulta_DNPRC', referencias)
+
+    # En cada proceso o máquina
+    Worker(PyCatastro(), 'cola.db').run()
+
+    for consulta, args, result in queue.results('Consulta_DNPRC'):
+        ...
+
+Cada consulta se guarda una sola vez (la clave son la operación y los
+parámetros) y su resultado se escribe sólo si todavía no estaba, así que
+repetirla es inocuo. Como mucho se repiten las consultas de un worker
+que muere antes de guardar sus resultados (cada ``commit_every``).
+
+Los leases usan la hora de cada máquina, que debe estar sincronizada, y
+el fichero debe estar en un sistema de ficheros con bloqueos de SQLite
+fiables.
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+from pycatastro.batch import map_batch
+from pycatastro.endpoints import ENDPOINTS
+
+
+PENDING, DONE, FAILED, LEASED = 0, 1, 2, 3
+
+Lease = namedtuple('Lease', ['shard', 'token'])
+"""Shard tomado por un worker; ``token`` cambia cada vez que se toma."""
+
+
+class LeaseLost(Exception):
+    """El lease del shard ha caducado y lo ha tomado otro worker."""
+
+
+def shard_key(params, parts=1, key=None):
+    """Retorna el shard de una consulta a partir de sus parámetros.
+
+       :param dict: Parámetros de la consulta (con ``Provincia`` y
+                    ``Municipio``)
+       :param int: Shards en que se parte cada municipio
+       :param str: Clave de la consulta, para repartirla entre las partes
+       :rtype: str
+    """
+
+    if not params or 'Provincia' not in params or 'Municipio' not in params:
+        raise ValueError('The query has no Provincia/Municipio, pass a shard')
+    shard = '%s/%s' % (params['Provincia'], params['Municipio'])
+    if parts > 1:
+        shard += '#%d' % (zlib.crc32(key.encode('utf-8')) % parts)
+    return shard
+
+
+class JobQueue(object):
+    """Consultas, shards y resultados en una base de datos SQLite."""
+
+    def __init__(self, filename, parts=None, timeout=60):
+        """Abre o crea la cola.
+
+           :param str: Fichero SQLite compartido
+           :param int: Opcional, shards en que se parte cada municipio
+                       (sólo al crear la cola, por defecto 1)
+           :param float: Segundos de espera cuando otro proceso bloquea la
+                         base de datos
+        """
+
+        self.filename = filename
+        self.conn = sqlite3.connect(filename, timeout=timeout,
+                                    isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.transaction():
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta'
+                ' (key TEXT PRIMARY KEY, value TEXT)')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS shards ('
+                ' shard TEXT PRIMARY KEY,'
+                ' state INTEGER NOT NULL DEFAULT 0,'
+                ' owner TEXT, token INTEGER NOT NULL DEFAULT 0,'
+                ' expires REAL, leases INTEGER NOT NULL DEFAULT 0)')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' key TEXT PRIMARY KEY, shard TEXT NOT NULL,'
+                ' consulta TEXT NOT NULL, args TEXT NOT NULL,'
+                ' state INTEGER NOT NULL DEFAULT 0,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' result TEXT, error TEXT, worker TEXT)')
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS jobs_shard ON jobs (shard, state)')
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS shards_state'
+                ' ON shards (state, expires)')
+            stored = self.meta('parts')
+            if stored is None:
+                stored = str(parts or 1)
+                self.conn.execute('INSERT INTO meta VALUES (?, ?)',
+                                  ('parts', stored))
+        self.parts = int(stored)
+
+    @contextmanager
+    def transaction(self):
+        """Transacción que bloquea la escritura desde el principio."""
+
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?',
+                                (key,)).fetchone()
+        return row[0] if row else default
+
+    def _job(self, consulta, args, shard):
+        try:
+            endpoint = ENDPOINTS[consulta]
+        except KeyError:
+            raise ValueError('Invalid endpoint: %s' % consulta)
+        params = endpoint.params(*args)
+        # Las consultas *_Codigos comparten clave con la original
+        key = '%s?%s' % (endpoint.operation,
+                         json.dumps(params, sort_keys=True))
+        if shard is None:
+            shard = shard_key(params, self.parts, key)
+        return key, shard, consulta, json.dumps(list(args))
+
+    def add(self, consulta, args, shard=None):
+        """Añade una consulta si no está ya en la cola.
+
+           :param str: Nombre de la consulta (ver
+                       :data:`pycatastro.endpoints.ENDPOINTS`)
+           :param tuple: Argumentos del método de la consulta
+           :param str: Opcional, shard (por defecto según la provincia y el
+                       municipio de la consulta)
+           :return: Si se ha añadido
+           :rtype: bool
+        """
+
+        return self.add_many(consulta, [args], shard) == 1
+
+    def add_many(self, consulta, argumentos, shard=None):
+        """Añade un lote de consultas en una transacción.
+
+           :return: Número de consultas añadidas
+           :rtype: int
+        """
+
+        jobs = [self._job(consulta, tuple(args), shard) for args in argumentos]
+        added = 0
+        shards = set()
+        with self.transaction() as conn:
+            for job in jobs:
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO jobs (key, shard, consulta, args)'
+                    ' VALUES (?, ?, ?, ?)', job)
+                if cursor.rowcount:
+                    added += 1
+                    shards.add(job[1])
+            conn.executemany('INSERT OR IGNORE INTO shards (shard) VALUES (?)',
+                             [(s,) for s in shards])
+            # Un shard terminado vuelve a estar pendiente si tiene consultas
+            # nuevas
+            conn.executemany(
+                'UPDATE shards SET state = ? WHERE shard = ? AND state = ?',
+                [(PENDING, s, DONE) for s in shards])
+        return added
+
+    def lease(self, owner, ttl=60, max_leases=5):
+        """Toma el siguiente shard pendiente o con el lease caducado.
+
+           Un shard que ha caducado ``max_leases`` veces (porque los
+           workers que lo toman mueren) se marca como fallido.
+
+           :param str: Nombre del worker
+           :param float: Segundos del lease
+           :param int: Máximo de veces que se toma un shard
+           :return: El lease o ``None`` si no hay shards disponibles
+           :rtype: Lease
+        """
+
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                'UPDATE shards SET state = ?, owner = NULL'
+                ' WHERE state = ? AND expires < ? AND leases >= ?',
+                (FAILED, LEASED, now, max_leases))
+            row = conn.execute(
+                'SELECT shard, token FROM shards'
+                ' WHERE state = ? OR (state = ? AND expires < ?)'
+                ' ORDER BY state, leases LIMIT 1',
+                (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            shard, token = row[0], row[1] + 1
+            conn.execute(
+                'UPDATE shards SET state = ?, owner = ?, token = ?,'
+                ' expires = ?, leases = leases + 1 WHERE shard = ?',
+                (LEASED, owner, token, now + ttl, shard))
+        return Lease(shard, token)
+
+    def renew(self, lease, ttl=60):
+        """Alarga el lease (heartbeat).
+
+           :return: Falso si el lease ya no es de este worker
+           :rtype: bool
+        """
+
+        cursor = self.conn.execute(
+            'UPDATE shards SET expires = ? WHERE shard = ? AND token = ?'
+            ' AND state = ?', (time.time() + ttl, lease.shard, lease.token,
+                               LEASED))
+        return cursor.rowcount == 1
+
+    def release(self, lease):
+        """Libera el shard; queda terminado si no le quedan consultas.
+
+           :return: Falso si el lease ya no es de este worker
+           :rtype: bool
+        """
+
+        with self.transaction() as conn:
+            pending = conn.execute(
+                'SELECT 1 FROM jobs WHERE shard = ? AND state = ? LIMIT 1',
+                (lease.shard, PENDING)).fetchone()
+            cursor = conn.execute(
+                'UPDATE shards SET state = ?, owner = NULL, expires = NULL,'
+                ' leases = 0 WHERE shard = ? AND token = ? AND state = ?',
+                (PENDING if pending else DONE, lease.shard, lease.token,
+                 LEASED))
+        return cursor.rowcount == 1
+
+    def pending(self, shard, limit):
+        """Retorna hasta ``limit`` consultas pendientes (key, consulta, args)."""
+
+        rows = self.conn.execute(
+            'SELECT key, consulta, args FROM jobs WHERE shard = ? AND state = ?'
+            ' LIMIT ?', (shard, PENDING, limit)).fetchall()
+        return [(key, consulta, tuple(json.loads(args)))
+                for key, consulta, args in rows]
+
+    def finish(self, worker, done, failed, retries, lease=None):
+        """Guarda en una transacción los resultados y errores de un worker.
+
+           Los resultados de las consultas ya terminadas no se modifican. Si
+           se indica ``lease`` y el shard ya no es de este worker, los
+           resultados se guardan pero los errores no cuentan como intentos.
+
+           :param str: Nombre del worker
+           :param list: Pares (key, resultado)
+           :param list: Pares (key, error)
+           :param int: Reintentos de una consulta antes de darla por fallida
+           :param Lease: Opcional, lease con el que se han hecho las consultas
+        """
+
+        with self.transaction() as conn:
+            if lease is not None and failed and conn.execute(
+                    'SELECT 1 FROM shards WHERE shard = ? AND token = ?'
+                    ' AND state = ?',
+                    (lease.shard, lease.token, LEASED)).fetchone() is None:
+                failed = []
+            conn.executemany(
+                'UPDATE jobs SET state = ?, result = ?, error = NULL,'
+                ' worker = ? WHERE key = ? AND state != ?',
+                [(DONE, json.dumps(result), worker, key, DONE)
+                 for key, result in done])
+            conn.executemany(
+                'UPDATE jobs SET attempts = attempts + 1, error = ?,'
+                ' worker = ?,'
+                ' state = CASE WHEN attempts + 1 > ? THEN ? ELSE state END'
+                ' WHERE key = ? AND state = ?',
+                [(repr(error), worker, retries, FAILED, key, PENDING)
+                 for key, error in failed])
+
+    def retry_failed(self):
+        """Vuelve a dejar pendientes las consultas y shards fallidos."""
+
+        with self.transaction() as conn:
+            rows = conn.execute(
+                'UPDATE jobs SET state = ?, attempts = 0 WHERE state = ?',
+                (PENDING, FAILED)).rowcount
+            conn.execute(
+                'UPDATE shards SET state = ?, leases = 0 WHERE state = ?'
+                ' OR (state = ? AND shard IN'
+                ' (SELECT shard FROM jobs WHERE state = ?))',
+                (PENDING, FAILED, DONE, PENDING))
+        return rows
+
+    def counts(self):
+        """Retorna el número de shards y de consultas por estado.
+
+           :return: Diccionario con los diccionarios ``'shards'`` y
+                    ``'jobs'``, de estado a número
+           :rtype: dict
+        """
+
+        counts = {}
+        for table in ('shards', 'jobs'):
+            rows = self.conn.execute(
+                'SELECT state, COUNT(*) FROM %s GROUP BY state' % table)
+            counts[table] = dict(rows.fetchall())
+        return counts
+
+    def results(self, consulta=None):
+        """Generador de (consulta, args, resultado) de las consultas terminadas."""
+
+        sql = 'SELECT consulta, args, result FROM jobs WHERE state = ?'
+        params = (DONE,)
+        if consulta is not None:
+            sql += ' AND consulta = ?'
+            params += (consulta,)
+        for consulta, args, result in self.conn.execute(sql + ' ORDER BY key',
+                                                        params):
+            yield consulta, tuple(json.loads(args)), json.loads(result)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Heartbeat(threading.Thread):
+
+    def __init__(self, filename, lease, ttl):
+        super(_Heartbeat, self).__init__()
+        self.daemon = True
+        self.filename = filename
+        self.lease = lease
+        self.ttl = ttl
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        # Las conexiones de SQLite no se comparten entre hilos
+        queue = JobQueue(self.filename)
+        try:
+            while not self.stopped.wait(self.ttl / 3.0):
+                if not queue.renew(self.lease, self.ttl):
+                    self.lost.set()
+                    return
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Worker(object):
+    """Worker que toma shards de una :class:`JobQueue` y hace sus consultas.
+
+       Se pueden lanzar tantos workers como se quiera, en el mismo o en
+       otros procesos o máquinas, contra el mismo fichero.
+    """
+
+    def __init__(self, client, filename, name=None, workers=8, lease=60,
+                 chunk=500, retries=3, commit_every=100, max_leases=5):
+        """Abre la cola.
+
+           :param pycatastro.PyCatastro: Cliente con resultados ``'dict'``
+           :param str: Fichero SQLite de la cola
+           :param str: Opcional, nombre del worker (por defecto
+                       ``máquina:pid``)
+           :param int: Consultas simultáneas
+           :param float: Segundos del lease de cada shard
+           :param int: Consultas que se leen de la cola cada vez
+           :param int: Reintentos de una consulta antes de darla por fallida
+           :param int: Consultas terminadas entre dos escrituras en la cola
+           :param int: Máximo de veces que se toma un shard
+        """
+
+        if getattr(client, 'result', 'dict') != 'dict':
+            raise ValueError('The worker needs a client with dict results')
+        self.client = client
+        self.queue = JobQueue(filename)
+        self.name = name or '%s:%d' % (socket.gethostname(), os.getpid())
+        self.workers = workers
+        self.lease = lease
+        self.chunk = chunk
+        self.retries = retries
+        self.commit_every = commit_every
+        self.max_leases = max_leases
+        self.stats = {'shards': 0, 'done': 0, 'failed': 0, 'lost': 0}
+
+    def close(self):
+        self.queue.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _call(self, key, consulta, args):
+        return getattr(self.client, consulta)(*args)
+
+    def _flush(self, done, failed, lease=None):
+        if not done and not failed:
+            return
+        self.queue.finish(self.name, done, failed, self.retries, lease)
+        self.stats['done'] += len(done)
+        self.stats['failed'] += len(failed)
+        del done[:]
+        del failed[:]
+
+    def process(self, lease):
+        """Hace las consultas pendientes de un shard tomado.
+
+           :raises LeaseLost: Si el lease caduca mientras tanto; las
+                              consultas terminadas o en curso se guardan
+                              igualmente y las demás no se hacen
+        """
+
+        heartbeat = _Heartbeat(self.queue.filename, lease, self.lease)
+
+        def call(key, consulta, args):
+            # Si otro worker tiene el shard las consultas que todavía no han
+            # empezado no se hacen, para no repetirlas; las que están en
+            # curso terminan y se guardan
+            if heartbeat.lost.is_set():
+                raise LeaseLost(lease.shard)
+            return self._call(key, consulta, args)
+
+        heartbeat.start()
+        done, failed = [], []
+        try:
+            while not heartbeat.lost.is_set():
+                jobs = self.queue.pending(lease.shard, self.chunk)
+                if not jobs:
+                    break
+                for r in map_batch(call, jobs, self.workers, ordered=False):
+                    if r.error is None:
+                        done.append((r.item[0], r.result))
+                    elif not isinstance(r.error, LeaseLost):
+                        failed.append((r.item[0], r.error))
+                    if len(done) + len(failed) >= self.commit_every:
+                        self._flush(done, failed, lease)
+                self._flush(done, failed, lease)
+        finally:
+            heartbeat.stop()
+            self._flush(done, failed, lease)
+        if heartbeat.lost.is_set() or not self.queue.release(lease):
+            self.stats['lost'] += 1
+            raise LeaseLost(lease.shard)
+        self.stats['shards'] += 1
+
+    def run(self, max_shards=None, wait=False, poll=5.0):
+        """Toma y procesa shards hasta que no queda ninguno.
+
+           :param int: Opcional, máximo de shards de esta ejecución
+           :param bool: Si es cierto, cuando no hay shards libres espera a
+                        que terminen o caduquen los que tienen otros workers
+           :param float: Segundos entre dos intentos cuando se espera
+           :return: :attr:`stats`
+           :rtype: dict
+        """
+
+        processed = 0
+        while max_shards is None or processed < max_shards:
+            lease = self.queue.lease(self.name, self.lease, self.max_leases)
+            if lease is None:
+                if wait and self.queue.counts()['shards'].get(LEASED):
+                    time.sleep(poll)
+                    continue
+                break
+            try:
+                self.process(lease)
+            except LeaseLost:
+                pass
+            processed += 1
+        return self.stats
+
+
+def main():
+    from pycatastro import PyCatastro
+
+    parser = argparse.ArgumentParser(
+        description='Cola de consultas del Catastro repartida en shards')
+    parser.add_argument('filename', help='fichero SQLite de la cola')
+    parser.add_argument('command', choices=['work', 'status', 'retry'])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--lease', type=float, default=60)
+    parser.add_argument('--wait', action='store_true',
+                        help='espera a los shards de otros workers')
+    args = parser.parse_args()
+    if args.command == 'work':
+        with Worker(PyCatastro.default(), args.filename,
+                    workers=args.workers, lease=args.lease) as worker:
+            stats = worker.run(wait=args.wait)
+        sys.stderr.write('%(shards)d shards, %(done)d done, %(failed)d failed,'
+                         ' %(lost)d leases lost\n' % stats)
+        return
+    with JobQueue(args.filename) as queue:
+        if args.command == 'retry':
+            sys.stderr.write('%d jobs pending again\n' % queue.retry_failed())
+        counts = queue.counts()
+    names = {PENDING: 'pending', LEASED: 'leased', DONE: 'done',
+             FAILED: 'failed'}
+    for table in ('shards', 'jobs'):
+        sys.stderr.write('%s: %s\n' % (table, ', '.join(
+            '%d %s' % (n, names[state])
+            for state, n in sorted(counts[table].items()))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# coding=utf-8
+import threading
+from collections import defaultdict
+
+
+class Call(object):
+    """Datos de una consulta que reciben los hooks del cliente.
+
+       Los tiempos están en segundos. ``connect`` es el tiempo hasta recibir
+       las cabeceras de la respuesta (conexión y espera del servidor),
+       ``transfer`` el de descarga del cuerpo y ``parse`` el de procesado
+       del XML. Cuando la respuesta sale de la caché ``cache_hit`` es cierto
+       y no hay tiempos de red. ``coalesced`` es cierto si la consulta ha
+       recibido el resultado de otra idéntica que estaba en curso.
+       ``hedged`` es cierto si se ha lanzado una copia de la consulta por
+       tardar demasiado y ``hedge_won`` si la copia ha llegado antes.
+    """
+
+    __slots__ = ('endpoint', 'connect', 'transfer', 'parse', 'bytes',
+                 'status', 'cache_hit', 'coalesced', 'hedged', 'hedge_won',
+                 'error')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.connect = 0.0
+        self.transfer = 0.0
+        self.parse = 0.0
+        self.bytes = 0
+        self.status = None
+        self.cache_hit = False
+        self.coalesced = False
+        self.hedged = False
+        self.hedge_won = False
+        self.error = None
+
+    @property
+    def total(self):
+        return self.connect + self.transfer + self.parse
+
+    def __repr__(self):
+        return '<Call %s status=%s bytes=%s cache_hit=%s total=%.4f>' % (
+            self.endpoint, self.status, self.bytes, self.cache_hit, self.total)
+
+
+class Histogram(object):
+    """Histograma acumulativo con los mismos cubos que Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics(object):
+    """Registro de métricas de las consultas.
+
+       Se usa como hook del cliente y acumula contadores e histogramas por
+       consulta (los de duración sólo de las fases que se han ejecutado),
+       que :meth:`render` retorna en el formato de texto de
+       Prometheus::
+
+           metrics = Metrics()
+           client = PyCatastro(hooks=[metrics])
+           ...
+           metrics.render()
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    PHASES = ('connect', 'transfer', 'parse')
+
+    def __init__(self, buckets=BUCKETS, prefix='pycatastro'):
+        """Crea un registro vacío.
+
+           :param tuple: Límites de los cubos de los histogramas (segundos)
+           :param str: Prefijo de los nombres de las métricas
+        """
+
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.hedges = defaultdict(int)
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, call):
+        status = str(call.status) if call.status is not None else ''
+        if call.cache_hit:
+            cache = 'hit'
+        elif call.coalesced:
+            cache = 'coalesced'
+        else:
+            cache = 'miss'
+        with self._lock:
+            self.requests[(call.endpoint, status, cache)] += 1
+            self.bytes[call.endpoint] += call.bytes
+            if call.hedged:
+                outcome = 'won' if call.hedge_won else 'lost'
+                self.hedges[(call.endpoint, outcome)] += 1
+            if call.error is not None:
+                self.errors[(call.endpoint, type(call.error).__name__)] += 1
+                return
+            if call.coalesced:
+                return
+            for phase in ('parse',) if call.cache_hit else self.PHASES:
+                key = (call.endpoint, phase)
+                histogram = self.durations.get(key)
+                if histogram is None:
+                    histogram = self.durations[key] = Histogram(self.buckets)
+                histogram.observe(getattr(call, phase))
+
+    def render(self):
+        """Retorna las métricas en el formato de texto de Prometheus.
+
+           :rtype: str
+        """
+
+        p = self.prefix
+        lines = []
+        with self._lock:
+            lines.append('# TYPE %s_requests_total counter' % p)
+            for (endpoint, status, cache), n in sorted(self.requests.items()):
+                lines.append('%s_requests_total{endpoint="%s",status="%s",cache="%s"} %d'
+                             % (p, endpoint, status, cache, n))
+            lines.append('# TYPE %s_errors_total counter' % p)
+            for (endpoint, error), n in sorted(self.errors.items()):
+                lines.append('%s_errors_total{endpoint="%s",error="%s"} %d'
+                             % (p, endpoint, error, n))
+            lines.append('# TYPE %s_response_bytes_total counter' % p)
+            for endpoint, n in sorted(self.bytes.items()):
+                lines.append('%s_response_bytes_total{endpoint="%s"} %d'
+                             % (p, endpoint, n))
+            lines.append('# TYPE %s_hedges_total counter' % p)
+            for (endpoint, outcome), n in sorted(self.hedges.items()):
+                lines.append('%s_hedges_total{endpoint="%s",outcome="%s"} %d'
+                             % (p, endpoint, outcome, n))
+            lines.append('# TYPE %s_duration_seconds histogram' % p)
+            for (endpoint, phase), h in sorted(self.durations.items()):
+                labels = 'endpoint="%s",phase="%s"' % (endpoint, phase)
+                for bound, n in zip(h.buckets, h.counts):
+                    lines.append('%s_duration_seconds_bucket{%s,le="%s"} %d'
+                                 % (p, labels, bound, n))
+                lines.append('%s_duration_seconds_bucket{%s,le="+Inf"} %d'
+                             % (p, labels, h.count))
+                lines.append('%s_duration_seconds_sum{%s} %f' % (p, labels, h.sum))
+                lines.append('%s_duration_seconds_count{%s} %d' % (p, labels, h.count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,351 @@
+# coding=utf-8
+"""Resultados tipados de las consultas.
+
+Con ``PyCatastro(result='model')`` las consultas que tienen modelo retornan
+una lista de objetos de este módulo en lugar del diccionario de
+``xmltodict``. Los objetos usan ``__slots__`` y guardan sólo los campos
+principales, así que ocupan mucha menos memoria cuando se mantienen muchos
+resultados a la vez. :meth:`to_dict` retorna el nodo original con la misma
+estructura que ``xmltodict``.
+
+Los modelos se construyen en una sola pasada de ``expat`` sobre la
+respuesta, sin crear el árbol del documento, así que procesar una
+respuesta como modelos no es más lento que con ``xmltodict``.
+"""
+import re
+from xml.etree.ElementTree import fromstring
+from xml.parsers import expat
+
+from pycatastro.exceptions import CatastroError
+from pycatastro.stream import element_to_dict
+from pycatastro.utils import as_list, path
+
+
+_BETWEEN_TAGS = re.compile(br'>\s+<')
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Model(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, ' '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__
+            if not name.startswith('_')
+        ))
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                all(getattr(self, n) == getattr(other, n) for n in self.__slots__
+                    if not n.startswith('_')))
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def to_dict(self):
+        """Retorna el nodo con la misma estructura que ``xmltodict``."""
+
+        raise NotImplementedError
+
+
+class Municipio(Model):
+    """Municipio de :meth:`PyCatastro.ConsultaMunicipio` (nodo ``muni``)."""
+
+    __slots__ = ('nombre', 'delegacion', 'codigo', 'provincia_ine',
+                 'municipio_ine')
+
+    def __init__(self, nombre, delegacion, codigo, provincia_ine, municipio_ine):
+        self.nombre = nombre
+        self.delegacion = delegacion
+        self.codigo = codigo
+        self.provincia_ine = provincia_ine
+        self.municipio_ine = municipio_ine
+
+    @classmethod
+    def _from_fields(cls, fields, joined, raw):
+        return cls(fields.get('nm'), fields.get('locat/cd'),
+                   fields.get('locat/cmc'), fields.get('loine/cp'),
+                   fields.get('loine/cm'))
+
+    def to_dict(self):
+        return {'nm': self.nombre,
+                'locat': {'cd': self.delegacion, 'cmc': self.codigo},
+                'loine': {'cp': self.provincia_ine, 'cm': self.municipio_ine}}
+
+
+class Via(Model):
+    """Vía de :meth:`PyCatastro.ConsultaVia` (nodo ``calle``)."""
+
+    __slots__ = ('codigo', 'tipo', 'nombre', 'provincia_ine', 'municipio_ine')
+
+    def __init__(self, codigo, tipo, nombre, provincia_ine, municipio_ine):
+        self.codigo = codigo
+        self.tipo = tipo
+        self.nombre = nombre
+        self.provincia_ine = provincia_ine
+        self.municipio_ine = municipio_ine
+
+    @classmethod
+    def _from_fields(cls, fields, joined, raw):
+        return cls(fields.get('dir/cv'), fields.get('dir/tv'),
+                   fields.get('dir/nv'), fields.get('loine/cp'),
+                   fields.get('loine/cm'))
+
+    def to_dict(self):
+        return {'loine': {'cp': self.provincia_ine, 'cm': self.municipio_ine},
+                'dir': {'cv': self.codigo, 'tv': self.tipo, 'nv': self.nombre}}
+
+
+class _RawModel(Model):
+    """Modelo que guarda el XML de su nodo para materializarlo a demanda."""
+
+    __slots__ = ('_raw', '_dict')
+
+    def _data(self):
+        if self._dict is None:
+            self._dict = element_to_dict(fromstring(self._raw))
+        return self._dict
+
+    def to_dict(self):
+        return self._data()
+
+
+class Inmueble(_RawModel):
+    """Datos de un inmueble (nodo ``bico`` de Consulta_DNPRC, DNPLOC o DNPPP).
+
+       Las construcciones y el resto de nodos se procesan la primera vez que
+       se accede a ellos.
+    """
+
+    __slots__ = ('rc', 'clase', 'provincia', 'municipio', 'direccion', 'uso',
+                 'superficie', 'coeficiente', 'antiguedad')
+
+    @classmethod
+    def _from_fields(cls, fields, joined, raw):
+        self = cls.__new__(cls)
+        self.rc = joined.get('bi/idbi/rc') or None
+        self.clase = fields.get('bi/idbi/cn')
+        self.provincia = fields.get('bi/dt/np')
+        self.municipio = fields.get('bi/dt/nm')
+        self.direccion = fields.get('bi/ldt')
+        self.uso = fields.get('bi/debi/luso')
+        self.superficie = _int(fields.get('bi/debi/sfc'))
+        self.coeficiente = fields.get('bi/debi/cpt')
+        self.antiguedad = _int(fields.get('bi/debi/ant'))
+        self._raw = raw
+        self._dict = None
+        return self
+
+    @property
+    def construcciones(self):
+        """Lista de construcciones (nodos ``cons``)."""
+
+        lcons = self._data().get('lcons') or {}
+        cons = lcons.get('cons')
+        if cons is None:
+            return []
+        return cons if isinstance(cons, list) else [cons]
+
+
+class Parcela(_RawModel):
+    """Referencia de la lista de resultados de Consulta_DNPRC o DNPLOC.
+
+       Corresponde a cada nodo ``rcdnp`` cuando la consulta coincide con
+       varios inmuebles.
+    """
+
+    __slots__ = ('rc', 'provincia', 'municipio')
+
+    @classmethod
+    def _from_fields(cls, fields, joined, raw):
+        self = cls.__new__(cls)
+        self.rc = joined.get('rc') or None
+        self.provincia = fields.get('dt/np')
+        self.municipio = fields.get('dt/nm')
+        self._raw = raw
+        self._dict = None
+        return self
+
+
+class Coordenada(Model):
+    """Parcela localizada por Consulta_RCCOOR, RCCOOR_Distancia o CPMRC.
+
+       ``distancia`` sólo tiene valor en Consulta_RCCOOR_Distancia.
+    """
+
+    __slots__ = ('rc', '_x', '_y', 'srs', 'direccion', 'distancia')
+
+    def __init__(self, rc, x, y, srs, direccion, distancia=None):
+        self.rc = rc
+        self._x = x
+        self._y = y
+        self.srs = srs
+        self.direccion = direccion
+        self.distancia = distancia
+
+    @classmethod
+    def _from_fields(cls, fields, joined, raw):
+        return cls(joined.get('pc') or None, fields.get('geo/xcen'),
+                   fields.get('geo/ycen'), fields.get('geo/srs'),
+                   fields.get('ldt'), fields.get('dis'))
+
+    @property
+    def x(self):
+        return float(self._x) if self._x is not None else None
+
+    @property
+    def y(self):
+        return float(self._y) if self._y is not None else None
+
+    def to_dict(self):
+        data = {'pc': {'pc1': self.rc[:7], 'pc2': self.rc[7:]} if self.rc else None,
+                'geo': {'xcen': self._x, 'ycen': self._y, 'srs': self.srs},
+                'ldt': self.direccion}
+        if self.distancia is not None:
+            data['dis'] = self.distancia
+        return data
+
+
+def as_coordenadas(result):
+    """Retorna las parcelas de una consulta de coordenadas como modelos.
+
+       Acepta tanto la lista de modelos como el diccionario de
+       Consulta_RCCOOR, Consulta_RCCOOR_Distancia o Consulta_CPMRC, así que
+       sirve sea cual sea el tipo de resultado del cliente.
+
+       :rtype: list of Coordenada
+    """
+
+    if isinstance(result, list):
+        return result
+    root = next(iter(result.values()))
+    nodes = as_list(path(root, 'coordenadas', 'coord'))
+    nodes += as_list(path(root, 'coordenadas_distancias', 'coordd', 'lpcd', 'pcd'))
+    coordenadas = []
+    for node in nodes:
+        pc = node.get('pc') or {}
+        geo = node.get('geo') or {}
+        rc = (pc.get('pc1') or '') + (pc.get('pc2') or '')
+        coordenadas.append(Coordenada(rc or None, geo.get('xcen'), geo.get('ycen'),
+                                      geo.get('srs'), node.get('ldt'),
+                                      node.get('dis')))
+    return coordenadas
+
+
+def _parse(content, tags):
+    """Construye los modelos de los nodos ``tags`` en una pasada de expat.
+
+       De cada nodo se guardan el texto de sus hojas por ruta relativa (el
+       de la primera hoja de cada ruta), el texto unido de las hojas de
+       cada nodo interior (las referencias catastrales vienen partidas en
+       varias hojas) y los bytes del nodo en la respuesta, sin los
+       espacios entre tags.
+
+       :param bytes: Contenido de la respuesta
+       :param tuple: Pares (tag, clase) en el orden de los resultados
+       :raises CatastroError: Si no hay resultados y la respuesta tiene
+                              errores
+       :rtype: list
+    """
+
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    classes = dict(tags)
+    found = dict((tag, []) for tag, _ in tags)
+    # Nodos abiertos: nombre, trozos de texto y si tienen hijos
+    names = []
+    texts = []
+    inner = []
+    # Nodos de modelos abiertos: tag, nivel, inicio, hojas, textos unidos
+    captures = []
+    error = {}
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+
+    def start(name, attrs):
+        if inner:
+            inner[-1] = True
+        if name in classes:
+            captures.append((name, len(names), parser.CurrentByteIndex, {}, {}))
+        names.append(name)
+        texts.append([])
+        inner.append(False)
+
+    def end(name):
+        text = ''.join(texts.pop()).strip() or None
+        level = len(names) - 1
+        if not inner.pop():
+            for _, start_level, _, fields, joined in captures:
+                key = '/'.join(names[start_level + 1:])
+                if key not in fields:
+                    fields[key] = text
+                parent = key.rpartition('/')[0]
+                joined[parent] = joined.get(parent, '') + (text or '')
+        if level >= 2 and names[1] == 'lerr' and 'err' not in error:
+            # Sólo el primer error, como root.find('lerr/err')
+            if level == 2 and name == 'err':
+                error['err'] = True
+            elif level == 3 and names[2] == 'err':
+                error.setdefault(name, text)
+        if captures and captures[-1][1] == level:
+            tag, _, begin, fields, joined = captures.pop()
+            finish = content.index(b'>', parser.CurrentByteIndex) + 1
+            raw = _BETWEEN_TAGS.sub(b'><', content[begin:finish])
+            found[tag].append(classes[tag]._from_fields(fields, joined, raw))
+        names.pop()
+
+    def data(text):
+        texts[-1].append(text)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = data
+    try:
+        parser.Parse(content, True)
+    finally:
+        # Los manejadores usan el parser: se rompe el ciclo para que se
+        # libere sin esperar al recolector
+        parser = None
+    results = []
+    for tag, _ in tags:
+        results.extend(found[tag])
+    if not results and 'err' in error:
+        raise CatastroError(error.get('cod'), error.get('des'))
+    return results
+
+
+def parse_municipios(content):
+    return _parse(content, (('muni', Municipio),))
+
+
+def parse_vias(content):
+    return _parse(content, (('calle', Via),))
+
+
+def parse_inmuebles(content):
+    return _parse(content, (('bico', Inmueble), ('rcdnp', Parcela)))
+
+
+def parse_coordenadas(content):
+    return _parse(content, (('coord', Coordenada), ('pcd', Coordenada)))
+
+
+PARSERS = {
+    'ConsultaMunicipio': parse_municipios,
+    'ConsultaVia': parse_vias,
+    'Consulta_DNPLOC': parse_inmuebles,
+    'Consulta_DNPRC': parse_inmuebles,
+    'Consulta_DNPPP': parse_inmuebles,
+    'Consulta_RCCOOR': parse_coordenadas,
+    'Consulta_RCCOOR_Distancia': parse_coordenadas,
+    'Consulta_CPMRC': parse_coordenadas,
+}
+"""Función que procesa la respuesta de cada consulta con modelo."""
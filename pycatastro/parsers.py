@@ -0,0 +1,139 @@
+# coding=utf-8
+"""Procesadores del XML de las respuestas.
+
+Todos retornan la misma estructura que ``xmltodict.parse(content,
+process_namespaces=False, xml_attribs=False)``, que es lo que retorna
+PyCatastro por defecto. Se elige con ``PyCatastro(parser='expat')``.
+"""
+from xml.etree.ElementTree import fromstring
+from xml.parsers import expat
+
+from pycatastro.stream import element_to_dict, local_name
+
+
+class Parser(object):
+    """Interfaz de los procesadores de XML."""
+
+    name = None
+
+    def parse(self, content):
+        """Procesa un documento.
+
+           :param bytes: Contenido de la respuesta
+           :rtype: dict
+        """
+
+        raise NotImplementedError
+
+
+class XmltodictParser(Parser):
+    """Procesador por defecto, usa ``xmltodict``."""
+
+    name = 'xmltodict'
+
+    def __init__(self):
+        import xmltodict
+        self._parse = xmltodict.parse
+
+    def parse(self, content):
+        return self._parse(content, process_namespaces=False, xml_attribs=False)
+
+
+class ExpatParser(Parser):
+    """Procesador con manejadores de ``pyexpat`` hechos a medida.
+
+       Construye directamente los diccionarios sin las opciones genéricas
+       de ``xmltodict``.
+    """
+
+    name = 'expat'
+
+    def parse(self, content):
+        root = {}
+        # Cada nivel es [nombre, hijos, trozos de texto]
+        stack = [[None, root, []]]
+        append = stack.append
+        pop = stack.pop
+
+        def start(name, attrs):
+            append([name, None, []])
+
+        def end(name):
+            node = pop()
+            children = node[1]
+            data = ''.join(node[2]).strip()
+            if children is None:
+                value = data or None
+            else:
+                value = children
+                if data:
+                    children['#text'] = data
+            parent = stack[-1]
+            siblings = parent[1]
+            if siblings is None:
+                siblings = parent[1] = {}
+            if name in siblings:
+                current = siblings[name]
+                if isinstance(current, list):
+                    current.append(value)
+                else:
+                    siblings[name] = [current, value]
+            else:
+                siblings[name] = value
+
+        def data(text):
+            stack[-1][2].append(text)
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = data
+        parser.Parse(content, True)
+        return root
+
+
+class ElementTreeParser(Parser):
+    """Procesador con el ``ElementTree`` de la librería estándar (en C)."""
+
+    name = 'etree'
+
+    def parse(self, content):
+        root = fromstring(content)
+        return {local_name(root.tag): element_to_dict(root)}
+
+
+class LxmlParser(Parser):
+    """Procesador con ``lxml``, que tiene que estar instalado."""
+
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree
+        self._fromstring = etree.fromstring
+
+    def parse(self, content):
+        root = self._fromstring(content)
+        return {local_name(root.tag): element_to_dict(root)}
+
+
+PARSERS = dict((p.name, p) for p in (
+    XmltodictParser, ExpatParser, ElementTreeParser, LxmlParser
+))
+
+
+def get_parser(parser):
+    """Retorna un procesador a partir de su nombre.
+
+       :param str,Parser: Nombre del procesador (``'xmltodict'``,
+                          ``'expat'``, ``'etree'`` o ``'lxml'``) o una
+                          instancia de :class:`Parser`
+       :rtype: Parser
+    """
+
+    if isinstance(parser, Parser):
+        return parser
+    try:
+        return PARSERS[parser]()
+    except KeyError:
+        raise ValueError('Invalid parser: %s' % parser)
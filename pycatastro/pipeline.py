@@ -0,0 +1,287 @@
+# coding=utf-8
+"""Procesado del XML en varios procesos para lotes grandes.
+
+Con las consultas en paralelo, procesar el XML de las respuestas pasa a ser
+el límite de un lote: el GIL no deja usar más de un núcleo. En este modo los
+hilos (o las corutinas) sólo descargan los bytes de cada respuesta con
+``result='raw'``, y un pool de procesos las procesa en lotes de
+``batch_size`` respuestas y retorna resultados compactos, por defecto las
+filas de :func:`pycatastro.export.flatten`::
+
+    for r in pipeline(client, 'Consulta_DNPRC', referencias, processes=4):
+        if r.error is None:
+            writer.write(r.result)
+
+Los lotes reducen el coste de pasar las respuestas entre procesos; el
+tamaño adecuado depende del tamaño de las respuestas.
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from pycatastro import models
+from pycatastro.batch import BatchResult, map_batch
+from pycatastro.export import SCHEMAS, flatten
+from pycatastro.parsers import get_parser
+from pycatastro.raw import RawResponse
+
+
+OUTPUTS = ('rows', 'model', 'dict')
+"""Resultados de :class:`ParsePool`: filas, modelos o diccionarios."""
+
+_parsers = {}
+
+
+def _parse(output, parser, endpoint, content):
+    if parser not in _parsers:
+        _parsers[parser] = get_parser(parser)
+    if output == 'model' and endpoint in models.PARSERS:
+        return models.PARSERS[endpoint](content)
+    data = _parsers[parser].parse(content)
+    if output != 'rows':
+        return data
+    rows = list(flatten(endpoint, data))
+    if not rows:
+        error = RawResponse(endpoint, content, None).error
+        if error is not None:
+            raise error
+    return rows
+
+
+def _parse_batch(output, parser, items):
+    # Se ejecuta en los procesos del pool: retorna (resultado, error) de
+    # cada respuesta para que un error no pierda el resto del lote
+    results = []
+    for endpoint, content in items:
+        try:
+            results.append((_parse(output, parser, endpoint, content), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def _mp_context():
+    # Los procesos no se crean con fork: heredarían los locks de los hilos
+    # que descargan en el estado en que estuvieran (y las conexiones del
+    # cliente)
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+class ParsePool(object):
+    """Pool de procesos que procesa respuestas en lotes.
+
+       :meth:`submit` retorna un :class:`concurrent.futures.Future` por
+       respuesta; las respuestas se envían a los procesos cuando hay
+       ``batch_size`` o al llamar a :meth:`flush`. Desde asyncio se puede
+       esperar con ``asyncio.wrap_future``.
+
+       Los procesos se arrancan con ``forkserver`` (o ``spawn`` donde no
+       existe) y no con ``fork``, ya que el pool se usa con hilos en marcha.
+    """
+
+    def __init__(self, output='rows', parser='expat', processes=None,
+                 batch_size=64):
+        """Crea el pool sin arrancar todavía los procesos.
+
+           :param str: ``'rows'`` para las filas de
+                       :func:`pycatastro.export.flatten`, ``'model'`` para
+                       los modelos de :mod:`pycatastro.models` o ``'dict'``
+                       para la estructura de ``xmltodict``
+           :param str: Nombre del procesador de XML (ver
+                       :func:`pycatastro.parsers.get_parser`)
+           :param int: Opcional, número de procesos (por defecto uno por
+                       núcleo)
+           :param int: Respuestas que se envían juntas a un proceso
+        """
+
+        if output not in OUTPUTS:
+            raise ValueError('Invalid output: %s' % output)
+        if not isinstance(parser, str):
+            # Los procesos crean su propio procesador a partir del nombre
+            parser = parser.name
+        self.output = output
+        self.parser = parser
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self._executor = None
+        self._batch = []
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.processes,
+                                                 mp_context=_mp_context())
+        return self._executor
+
+    def submit(self, endpoint, content):
+        """Añade una respuesta al lote en curso.
+
+           :param str: Nombre de la consulta (por ejemplo ``'Consulta_DNPRC'``)
+           :param bytes: Cuerpo de la respuesta
+           :rtype: concurrent.futures.Future
+        """
+
+        future = Future()
+        with self._lock:
+            self._batch.append((endpoint, content, future))
+            full = len(self._batch) >= self.batch_size
+        if full:
+            self.flush()
+        return future
+
+    def flush(self):
+        """Envía a los procesos las respuestas del lote en curso."""
+
+        with self._lock:
+            batch, self._batch = self._batch, []
+        if not batch:
+            return
+        job = self.executor.submit(_parse_batch, self.output, self.parser,
+                                   [(endpoint, content)
+                                    for endpoint, content, _ in batch])
+        job.add_done_callback(lambda job: self._resolve(batch, job))
+
+    @staticmethod
+    def _resolve(batch, job):
+        error = job.exception()
+        if error is not None:
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, _, future), (result, error) in zip(batch, job.result()):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        """Termina los procesos."""
+
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _endpoint(client, consulta, output):
+    try:
+        endpoint = client.endpoints[consulta].operation
+    except KeyError:
+        raise ValueError('Invalid endpoint: %s' % consulta)
+    if output == 'rows' and endpoint not in SCHEMAS:
+        raise ValueError('No export schema for %s' % endpoint)
+    return endpoint
+
+
+def _result(index, item, future):
+    error = future.exception()
+    if error is not None:
+        return BatchResult(index, item, None, error)
+    return BatchResult(index, item, future.result(), None)
+
+
+def pipeline(client, consulta, argumentos, output='rows', workers=8,
+             processes=None, batch_size=64, parser='expat', max_pending=None):
+    """Consulta un lote con hilos y procesa las respuestas en procesos.
+
+       Igual que :meth:`pycatastro.PyCatastro.lote`, pero las respuestas se
+       descargan sin procesar y se procesan en un :class:`ParsePool`. La
+       caché y el limitador del cliente se aplican a las descargas.
+
+       :param pycatastro.PyCatastro: Cliente
+       :param str: Nombre de la consulta
+       :param iterable: Tuplas con los argumentos de cada llamada
+       :param str: Resultado, ver :class:`ParsePool`
+       :param int: Número de hilos que descargan las respuestas
+       :param int: Opcional, número de procesos
+       :param int: Respuestas que se envían juntas a un proceso
+       :param str: Nombre del procesador de XML
+       :param int: Opcional, máximo de respuestas pendientes de procesar
+                   (por defecto cuatro lotes por proceso)
+       :return: Generador de :class:`pycatastro.batch.BatchResult` en el
+                orden en el que terminan las descargas
+    """
+
+    _endpoint(client, consulta, output)
+    func = getattr(client.with_options(result='raw'), consulta)
+    with ParsePool(output, parser, processes, batch_size) as pool:
+        max_pending = max_pending or 4 * batch_size * pool.processes
+        pending = deque()
+        for r in map_batch(func, argumentos, workers, ordered=False):
+            if r.error is not None:
+                yield r
+                continue
+            pending.append((r.index, r.item,
+                             pool.submit(r.result.endpoint, r.result.content)))
+            if len(pending) >= max_pending:
+                pool.flush()
+                pending[0][2].exception()
+            while pending and pending[0][2].done():
+                yield _result(*pending.popleft())
+        pool.flush()
+        while pending:
+            yield _result(*pending.popleft())
+
+
+async def async_pipeline(client, consulta, argumentos, output='rows',
+                         processes=None, batch_size=64, parser='expat',
+                         max_pending=None):
+    """Versión de :func:`pipeline` para :class:`pycatastro.aio.AsyncPyCatastro`.
+
+       Las descargas son corutinas; como mucho hay en curso el doble del
+       ``concurrency`` del cliente. Es un generador asíncrono::
+
+           async for r in async_pipeline(client, 'Consulta_DNPRC', referencias):
+               ...
+    """
+
+    import asyncio
+
+    _endpoint(client, consulta, output)
+    func = getattr(client.with_options(result='raw'), consulta)
+    items = enumerate(argumentos)
+    running = {}
+    pending = deque()
+    with ParsePool(output, parser, processes, batch_size) as pool:
+        max_pending = max_pending or 4 * batch_size * pool.processes
+        while True:
+            while len(running) < 2 * client.concurrency:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    break
+                item = tuple(item)
+                running[asyncio.ensure_future(func(*item))] = (index, item)
+            if not running:
+                break
+            done, _ = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, item = running.pop(task)
+                if task.exception() is not None:
+                    yield BatchResult(index, item, None, task.exception())
+                    continue
+                response = task.result()
+                pending.append((index, item,
+                                pool.submit(response.endpoint,
+                                            response.content)))
+            if len(pending) >= max_pending:
+                pool.flush()
+                await asyncio.wait([asyncio.wrap_future(pending[0][2])])
+            while pending and pending[0][2].done():
+                yield _result(*pending.popleft())
+        pool.flush()
+        while pending:
+            await asyncio.wait([asyncio.wrap_future(pending[0][2])])
+            yield _result(*pending.popleft())
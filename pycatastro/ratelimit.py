@@ -0,0 +1,210 @@
+# coding=utf-8
+import sys
+import threading
+import time
+
+
+def endpoint_group(path):
+    """Retorna el servicio de una consulta (``OVCCallejero`` u ``OVCCoordenadas``)."""
+
+    return path.lstrip('/').split('.', 1)[0]
+
+
+def transport_error(error):
+    """Indica si un error es de conexión o de tiempo de espera.
+
+       Los errores del servicio (:class:`pycatastro.exceptions.CatastroError`)
+       y los del procesado del XML no lo son: el servicio ha respondido.
+       Sólo se consultan los módulos de ``requests``, ``asyncio`` y
+       ``aiohttp`` si ya están cargados.
+
+       :rtype: bool
+    """
+
+    errors = [ConnectionError, TimeoutError]
+    asyncio = sys.modules.get('asyncio')
+    if asyncio is not None:
+        errors.append(asyncio.TimeoutError)
+    requests = sys.modules.get('requests')
+    if requests is not None:
+        errors.extend([requests.ConnectionError, requests.Timeout])
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is not None:
+        errors.append(aiohttp.ClientError)
+    return isinstance(error, tuple(errors))
+
+
+class TokenBucket(object):
+    """Cubo de tokens que se rellena a ``rate`` tokens por segundo.
+
+       :meth:`reserve` no bloquea: reserva un token y retorna los segundos
+       que hay que esperar para usarlo, así sirve tanto para hilos como para
+       asyncio. ``clock`` es la función que retorna la hora en segundos.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.time):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Reserva un token y retorna los segundos de espera."""
+
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def try_reserve(self):
+        """Reserva un token sólo si hay uno disponible ahora."""
+
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RateLimiter(object):
+    """Limitador de tasa adaptativo (AIMD) por servicio.
+
+       Hay un :class:`TokenBucket` por servicio (``OVCCallejero`` y
+       ``OVCCoordenadas``). Hasta la primera señal de saturación cada
+       consulta correcta suma una consulta por segundo a la tasa de su
+       servicio, que se dobla cada segundo. Después cada consulta correcta
+       la aumenta en ``increase / rate`` (unas ``increase`` consultas por
+       segundo más por cada segundo sin errores) y cada señal de saturación
+       la multiplica por ``decrease``, como mucho una vez cada ``cooldown``
+       segundos. Son señales de saturación los errores de conexión y de
+       tiempo de espera (ver :func:`transport_error`), los estados HTTP 429
+       y 5xx y, si se indica ``latency_target``, las consultas más lentas que
+       ese valor. Así la tasa se mantiene cerca de la máxima que acepta el
+       servicio::
+
+           client = PyCatastro(rate_limiter=RateLimiter(rate=5))
+    """
+
+    def __init__(self, rate=5, min_rate=0.5, max_rate=100, increase=2.0,
+                 decrease=0.7, burst=1, latency_target=None, cooldown=1.0,
+                 clock=time.time):
+        """Crea el limitador.
+
+           :param float: Consultas por segundo iniciales de cada servicio
+           :param float: Tasa mínima
+           :param float: Tasa máxima
+           :param float: Incremento aditivo por segundo sin errores
+           :param float: Factor multiplicativo al detectar saturación
+           :param int: Consultas que se pueden hacer de golpe
+           :param float: Opcional, latencia (segundos) a partir de la que
+                         se considera que el servicio está saturado
+           :param float: Segundos mínimos entre dos reducciones
+           :param callable: Función que retorna la hora en segundos (para
+                            las pruebas)
+        """
+
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.clock = clock
+        self.buckets = {}
+        self.stats = {'throttled': 0, 'decreases': 0, 'waited': 0.0}
+        self._decreased = {}
+        self._slow_start = set()
+        self._lock = threading.Lock()
+
+    def _bucket(self, group):
+        bucket = self.buckets.get(group)
+        if bucket is None:
+            with self._lock:
+                bucket = self.buckets.get(group)
+                if bucket is None:
+                    bucket = TokenBucket(self.rate, self.burst, self.clock)
+                    self.buckets[group] = bucket
+                    self._slow_start.add(group)
+        return bucket
+
+    def rates(self):
+        """Retorna la tasa actual de cada servicio.
+
+           :rtype: dict
+        """
+
+        return dict((group, b.rate) for group, b in self.buckets.items())
+
+    def reserve(self, path):
+        """Reserva una consulta y retorna los segundos que hay que esperar.
+
+           :param str: Ruta de la consulta
+           :rtype: float
+        """
+
+        delay = self._bucket(endpoint_group(path)).reserve()
+        if delay:
+            self.stats['waited'] += delay
+        return delay
+
+    def try_reserve(self, path):
+        """Reserva una consulta si se puede hacer sin esperar.
+
+           :rtype: bool
+        """
+
+        return self._bucket(endpoint_group(path)).try_reserve()
+
+    def wait(self, path):
+        """Espera (bloqueando el hilo) hasta poder hacer la consulta."""
+
+        delay = self.reserve(path)
+        if delay:
+            time.sleep(delay)
+
+    def feedback(self, path, call):
+        """Ajusta la tasa del servicio con el resultado de una consulta.
+
+           :param str: Ruta de la consulta
+           :param pycatastro.metrics.Call: Datos de la consulta
+        """
+
+        group = endpoint_group(path)
+        bucket = self._bucket(group)
+        saturated = (
+            (call.error is not None and transport_error(call.error))
+            or call.status == 429
+            or (call.status is not None and call.status >= 500)
+            or (self.latency_target is not None
+                and call.connect + call.transfer > self.latency_target)
+        )
+        with self._lock:
+            if not saturated:
+                if group in self._slow_start:
+                    increase = 1.0
+                else:
+                    increase = self.increase / bucket.rate
+                bucket.rate = min(self.max_rate, bucket.rate + increase)
+                return
+            self.stats['throttled'] += 1
+            self._slow_start.discard(group)
+            now = self.clock()
+            last = self._decreased.get(group)
+            if last is not None and now - last < self.cooldown:
+                return
+            self._decreased[group] = now
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            self.stats['decreases'] += 1
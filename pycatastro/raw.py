@@ -0,0 +1,115 @@
+# coding=utf-8
+import io
+import re
+
+from pycatastro.exceptions import CatastroError
+from pycatastro.stream import ElementStream
+
+
+_ERROR = re.compile(
+    br'<(?:\w+:)?err>\s*<(?:\w+:)?cod>([^<]*)</(?:\w+:)?cod>\s*'
+    br'<(?:\w+:)?des>([^<]*)</(?:\w+:)?des>')
+
+
+class RawResponse(object):
+    """Respuesta sin procesar de las consultas con ``result='raw'``.
+
+       Guarda los bytes de la respuesta y sólo procesa el XML la primera
+       vez que se accede a :attr:`data` o a :meth:`to_model`, así que
+       archivar respuestas o comprobar si hay resultados no tiene el coste
+       de procesarlas::
+
+           client = PyCatastro(result='raw')
+           response = client.Consulta_DNPRC(provincia, municipio, rc)
+           if response.error is None:
+               response.save('%s.xml' % rc)
+    """
+
+    __slots__ = ('endpoint', 'content', '_parser', '_data')
+
+    def __init__(self, endpoint, content, parser):
+        """Crea la respuesta.
+
+           :param str: Nombre de la consulta
+           :param bytes: Cuerpo de la respuesta
+           :param pycatastro.parsers.Parser: Procesador para :attr:`data`
+        """
+
+        self.endpoint = endpoint
+        self.content = content
+        self._parser = parser
+        self._data = None
+
+    def __len__(self):
+        return len(self.content)
+
+    def __repr__(self):
+        return '<RawResponse %s bytes=%d>' % (self.endpoint, len(self.content))
+
+    @property
+    def data(self):
+        """Resultado con la estructura de ``xmltodict``, procesado una vez."""
+
+        if self._data is None:
+            self._data = self._parser.parse(self.content)
+        return self._data
+
+    def to_model(self):
+        """Procesa la respuesta con los modelos de :mod:`pycatastro.models`.
+
+           :return: Lista de modelos, o el diccionario de :attr:`data` si la
+                    consulta no tiene modelos
+        """
+
+        from pycatastro.models import PARSERS
+
+        parser = PARSERS.get(self.endpoint)
+        if parser is None:
+            return self.data
+        return parser(self.content)
+
+    @property
+    def error(self):
+        """Primer error del nodo ``lerr``, sin procesar el resto del XML.
+
+           :return: El error o ``None`` si la respuesta no tiene errores
+           :rtype: pycatastro.exceptions.CatastroError
+        """
+
+        if b'lerr>' not in self.content:
+            return None
+        match = _ERROR.search(self.content)
+        if match is None:
+            return CatastroError(None, None)
+        return CatastroError(match.group(1).strip().decode('utf-8'),
+                             match.group(2).strip().decode('utf-8'))
+
+    def write_to(self, fileobj):
+        """Escribe la respuesta en un fichero binario o buffer sin copiarla.
+
+           :return: Bytes escritos
+           :rtype: int
+        """
+
+        fileobj.write(memoryview(self.content))
+        return len(self.content)
+
+    def save(self, filename):
+        """Guarda la respuesta en un fichero."""
+
+        with io.open(filename, 'wb') as f:
+            return self.write_to(f)
+
+    def iter_elements(self, tag, chunk_size=64 * 1024):
+        """Generador de los elementos ``tag`` procesando la respuesta a trozos.
+
+           Ver :func:`pycatastro.stream.iter_elements`.
+        """
+
+        view = memoryview(self.content)
+        stream = ElementStream(tag)
+        for start in range(0, len(view), chunk_size):
+            for item in stream.feed(view[start:start + chunk_size]):
+                yield item
+        for item in stream.close():
+            yield item
@@ -0,0 +1,59 @@
+# coding=utf-8
+import threading
+
+
+class _Flight(object):
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Agrupa las llamadas idénticas que están en curso a la vez.
+
+       Mientras se ejecuta una llamada con una clave, los demás hilos que
+       piden la misma clave esperan y reciben el mismo resultado (o la misma
+       excepción) en lugar de repetirla. ``stats`` cuenta las llamadas y
+       cuántas se han ahorrado.
+    """
+
+    def __init__(self):
+        self.stats = {'calls': 0, 'coalesced': 0}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Ejecuta ``func()`` o espera a la ejecución en curso con ``key``.
+
+           :param hashable: Clave de la llamada
+           :param callable: Función a ejecutar
+           :return: Tupla (resultado, si se ha compartido una llamada en curso)
+        """
+
+        with self._lock:
+            self.stats['calls'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.stats['coalesced'] += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+        return flight.result, False
+
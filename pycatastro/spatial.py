@@ -0,0 +1,250 @@
+# coding=utf-8
+import gzip
+import io
+import json
+import math
+import threading
+
+from pycatastro.models import Coordenada, as_coordenadas
+from pycatastro.utils import from_list
+
+
+FORMAT_VERSION = 1
+
+GEOGRAPHIC_SRS = frozenset(['EPSG:4326', 'EPSG:4258', 'EPSG:4230'])
+"""Sistemas de coordenadas geográficas, en los que no se calcula cobertura."""
+
+DISTANCIA = 25.0
+"""Mitad del lado del cuadrado de Consulta_RCCOOR_Distancia (metros)."""
+
+ENDPOINTS = frozenset(['Consulta_RCCOOR', 'Consulta_RCCOOR_Distancia',
+                       'Consulta_CPMRC'])
+"""Consultas cuyos resultados se guardan en el índice."""
+
+
+def normalize_srs(srs):
+    srs = str(srs).strip().upper()
+    return srs if ':' in srs else 'EPSG:' + srs
+
+
+class SpatialIndex(object):
+    """Índice en rejilla de las parcelas descubiertas por el cliente.
+
+       Con ``PyCatastro(spatial_index=SpatialIndex())`` el cliente guarda
+       las parcelas de Consulta_RCCOOR, Consulta_RCCOOR_Distancia y
+       Consulta_CPMRC, que se pueden buscar con :meth:`nearby` sin consultar
+       el servicio.
+
+       Además, en sistemas de coordenadas proyectados (en metros), el
+       índice recuerda qué zona han cubierto las consultas
+       Consulta_RCCOOR_Distancia que han retornado la lista de parcelas del
+       cuadrado de 50 metros. Si ``answer`` es cierto, una nueva
+       Consulta_RCCOOR_Distancia cuyo cuadrado ya está cubierto se responde
+       con las parcelas del índice. Es una aproximación: el servicio
+       retornaría sólo la parcela que contiene el punto si existe, y el
+       índice no conoce la geometría de las parcelas.
+    """
+
+    endpoints = ENDPOINTS
+
+    def __init__(self, cell_size=50.0, coverage_size=10.0, answer=False):
+        """Crea un índice vacío.
+
+           :param float: Lado de las celdas donde se agrupan las parcelas
+           :param float: Lado de las celdas de cobertura
+           :param bool: Si es cierto se responden localmente las consultas
+                        Consulta_RCCOOR_Distancia de zonas cubiertas
+        """
+
+        self.cell_size = float(cell_size)
+        self.coverage_size = float(coverage_size)
+        self.answer = answer
+        self.stats = {'answered': 0}
+        self._parcelas = {}
+        self._cells = {}
+        self._covered = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._parcelas)
+
+    def add(self, coordenadas, srs=None):
+        """Añade parcelas al índice.
+
+           :param list: :class:`pycatastro.models.Coordenada`
+           :param str: Opcional, sistema de coordenadas si no lo indica la
+                       parcela
+        """
+
+        with self._lock:
+            for c in coordenadas:
+                c_srs = c.srs or srs
+                if not c.rc or not c_srs or c.x is None or c.y is None:
+                    continue
+                c_srs = normalize_srs(c_srs)
+                key = (c_srs, c.rc)
+                old = self._parcelas.get(key)
+                if old is not None:
+                    self._cells[self._cell(c_srs, old.x, old.y)].discard(c.rc)
+                parcela = Coordenada(c.rc, c._x, c._y, c_srs, c.direccion)
+                self._parcelas[key] = parcela
+                self._cells.setdefault(self._cell(c_srs, c.x, c.y), set()).add(c.rc)
+
+    def _coverage(self, x, y, half):
+        # Celdas de cobertura que quedan enteras dentro del cuadrado; la
+        # franja del borde que no llena una celda no cuenta
+        size = self.coverage_size
+        return [(i, j)
+                for i in range(int(math.ceil((x - half) / size)),
+                               int(math.floor((x + half) / size)))
+                for j in range(int(math.ceil((y - half) / size)),
+                               int(math.floor((y + half) / size)))]
+
+    def cover(self, srs, x, y, half=DISTANCIA):
+        """Marca como cubierto el cuadrado de lado ``2 * half`` centrado en x, y.
+
+           Se marcan las celdas de cobertura que quedan enteras dentro del
+           cuadrado.
+        """
+
+        srs = normalize_srs(srs)
+        if srs in GEOGRAPHIC_SRS:
+            return
+        with self._lock:
+            for i, j in self._coverage(x, y, half):
+                self._covered.add((srs, i, j))
+
+    def covered(self, srs, x, y, half=DISTANCIA):
+        """Cierto si el cuadrado centrado en x, y está cubierto.
+
+           Se comprueban las mismas celdas que marcaría :meth:`cover` para
+           ese cuadrado, así que una consulta repetida siempre está
+           cubierta.
+        """
+
+        srs = normalize_srs(srs)
+        if srs in GEOGRAPHIC_SRS:
+            return False
+        cells = self._coverage(x, y, half)
+        if not cells:
+            return False
+        with self._lock:
+            return all((srs, i, j) in self._covered for i, j in cells)
+
+    def nearby(self, srs, x, y, half=DISTANCIA):
+        """Parcelas conocidas dentro del cuadrado centrado en x, y.
+
+           :return: :class:`pycatastro.models.Coordenada` ordenadas por
+                    distancia, con ``distancia`` calculada en unidades del
+                    sistema de coordenadas
+           :rtype: list
+        """
+
+        srs = normalize_srs(srs)
+        found = []
+        size = self.cell_size
+        with self._lock:
+            for i in range(int(math.floor((x - half) / size)),
+                           int(math.floor((x + half) / size)) + 1):
+                for j in range(int(math.floor((y - half) / size)),
+                               int(math.floor((y + half) / size)) + 1):
+                    for rc in self._cells.get((srs, i, j), ()):
+                        p = self._parcelas[(srs, rc)]
+                        if abs(p.x - x) <= half and abs(p.y - y) <= half:
+                            distancia = math.hypot(p.x - x, p.y - y)
+                            found.append((distancia, p))
+        found.sort(key=lambda item: item[0])
+        return [Coordenada(p.rc, p._x, p._y, p.srs, p.direccion, '%.2f' % d)
+                for d, p in found]
+
+    def _cell(self, srs, x, y):
+        return (srs, int(math.floor(x / self.cell_size)),
+                int(math.floor(y / self.cell_size)))
+
+    def observe(self, endpoint, params, result):
+        """Guarda el resultado de una consulta del cliente."""
+
+        coordenadas = as_coordenadas(result)
+        srs = params.get('SRS') or None
+        self.add(coordenadas, srs)
+        if (endpoint == 'Consulta_RCCOOR_Distancia' and coordenadas
+                and all(c.distancia and float(c.distancia) > 0
+                        for c in coordenadas)):
+            self.cover(srs, float(params['Coordenada_X']),
+                       float(params['Coordenada_Y']))
+
+    def lookup(self, endpoint, params, result_type):
+        """Responde una Consulta_RCCOOR_Distancia si la zona está cubierta.
+
+           :return: Resultado con la misma estructura que el servicio o
+                    ``None`` si hay que consultarlo
+        """
+
+        if not self.answer or endpoint != 'Consulta_RCCOOR_Distancia':
+            return None
+        srs = params.get('SRS')
+        x = float(params['Coordenada_X'])
+        y = float(params['Coordenada_Y'])
+        if not self.covered(srs, x, y):
+            return None
+        self.stats['answered'] += 1
+        parcelas = self.nearby(srs, x, y)
+        if result_type == 'model':
+            return parcelas
+        return {'consulta_coordenadas_distancias': {
+            'control': {'cucoor': str(len(parcelas)), 'cuerr': '0'},
+            'coordenadas_distancias': {'coordd': {'lpcd': {
+                'pcd': from_list([p.to_dict() for p in parcelas]),
+            }}},
+        }}
+
+    def dump(self):
+        """Retorna el contenido del índice como un diccionario serializable.
+
+           :rtype: dict
+        """
+
+        with self._lock:
+            return {
+                'format': FORMAT_VERSION,
+                'cell_size': self.cell_size,
+                'coverage_size': self.coverage_size,
+                'parcelas': [(p.srs, p.rc, p._x, p._y, p.direccion)
+                             for p in self._parcelas.values()],
+                'covered': sorted(self._covered),
+            }
+
+    @classmethod
+    def from_dict(cls, data, answer=False):
+        """Crea un índice a partir del resultado de :meth:`dump`.
+
+           :rtype: SpatialIndex
+        """
+
+        if data.get('format') != FORMAT_VERSION:
+            raise ValueError('Unsupported spatial index format: %s' % data.get('format'))
+        index = cls(data['cell_size'], data['coverage_size'], answer)
+        index.add([Coordenada(rc, x, y, srs, direccion)
+                   for srs, rc, x, y, direccion in data['parcelas']])
+        index._covered = set(tuple(c) for c in data['covered'])
+        return index
+
+    def save(self, filename):
+        """Guarda el índice en JSON (``.gz`` para comprimido)."""
+
+        data = json.dumps(self.dump(), separators=(',', ':'))
+        opener = gzip.open if filename.endswith('.gz') else io.open
+        with opener(filename, 'wb') as f:
+            f.write(data.encode('utf-8'))
+
+    @classmethod
+    def load(cls, filename, answer=False):
+        """Carga un índice guardado con :meth:`save`.
+
+           :rtype: SpatialIndex
+        """
+
+        opener = gzip.open if filename.endswith('.gz') else io.open
+        with opener(filename, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        return cls.from_dict(data, answer)
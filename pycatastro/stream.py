@@ -0,0 +1,101 @@
+# coding=utf-8
+from xml.etree.ElementTree import XMLPullParser
+
+
+def local_name(tag):
+    """Retorna el nombre de un tag sin el espacio de nombres."""
+
+    return tag.rsplit('}', 1)[-1]
+
+
+def element_to_dict(element):
+    """Convierte un elemento en la misma estructura que ``xmltodict``.
+
+       Equivale a ``xmltodict.parse`` con ``xml_attribs=False``: los nodos
+       sin hijos son texto (o ``None`` si están vacíos), los nodos con hijos
+       son diccionarios y los hijos repetidos se agrupan en listas.
+    """
+
+    children = list(element)
+    if not children:
+        text = element.text.strip() if element.text else None
+        return text or None
+    data = {}
+    parts = [element.text] if element.text else []
+    for child in children:
+        if child.tail:
+            parts.append(child.tail)
+        if callable(child.tag):
+            continue
+        key = local_name(child.tag)
+        value = element_to_dict(child)
+        if key in data:
+            current = data[key]
+            if isinstance(current, list):
+                current.append(value)
+            else:
+                data[key] = [current, value]
+        else:
+            data[key] = value
+    text = ''.join(parts).strip()
+    if text:
+        data['#text'] = text
+    return data
+
+
+class ElementStream(object):
+    """Procesa un XML a trozos y retorna los elementos ``tag`` completos.
+
+       Cada elemento se descarta del árbol una vez retornado, de manera que
+       la memoria no depende del tamaño del documento::
+
+           stream = ElementStream('calle')
+           for chunk in chunks:
+               for calle in stream.feed(chunk):
+                   ...
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self._parser = XMLPullParser(events=('start', 'end'))
+        self._stack = []
+
+    def feed(self, data):
+        """Añade datos y retorna la lista de elementos completados."""
+
+        self._parser.feed(data)
+        return self._items()
+
+    def close(self):
+        """Termina el documento y retorna los elementos pendientes."""
+
+        self._parser.close()
+        return self._items()
+
+    def _items(self):
+        items = []
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                self._stack.append(element)
+                continue
+            self._stack.pop()
+            if local_name(element.tag) == self.tag:
+                items.append(element_to_dict(element))
+                if self._stack:
+                    self._stack[-1].remove(element)
+        return items
+
+
+def iter_elements(chunks, tag):
+    """Generador de los elementos ``tag`` de un XML leído a trozos.
+
+       :param iterable: Trozos del documento (bytes)
+       :param str: Nombre del elemento, sin espacio de nombres
+    """
+
+    stream = ElementStream(tag)
+    for chunk in chunks:
+        for item in stream.feed(chunk):
+            yield item
+    for item in stream.close():
+        yield item
@@ -0,0 +1,154 @@
+# coding=utf-8
+import threading
+from bisect import bisect_left, bisect_right
+
+from pycatastro.utils import as_list, from_list, normalize, path
+
+
+RANGO = 5
+"""ConsultaNumero retorna los números a esta distancia del pedido si no existe."""
+
+NO_EXISTE = '43'
+"""Código del error de ConsultaNumero cuando el número no existe."""
+
+
+def numero(value):
+    """Retorna el número de portal como entero, o ``None`` si no lo es."""
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Calle(object):
+    __slots__ = ('numeros', 'nodos', 'tramos')
+
+    def __init__(self):
+        self.numeros = []
+        self.nodos = {}
+        self.tramos = []
+
+    def add(self, n, nodo):
+        if n not in self.nodos:
+            self.numeros.insert(bisect_left(self.numeros, n), n)
+        self.nodos[n] = nodo
+
+    def complete(self, lo, hi):
+        tramos = []
+        for a, b in self.tramos:
+            if b < lo - 1 or a > hi + 1:
+                tramos.append((a, b))
+            else:
+                lo, hi = min(lo, a), max(hi, b)
+        tramos.append((lo, hi))
+        tramos.sort()
+        self.tramos = tramos
+
+    def covers(self, lo, hi):
+        for a, b in self.tramos:
+            if a <= lo and hi <= b:
+                return True
+        return False
+
+    def between(self, lo, hi):
+        return self.numeros[bisect_left(self.numeros, lo):
+                            bisect_right(self.numeros, hi)]
+
+
+class NumberIndex(object):
+    """Índice por vía de los números y referencias de ConsultaNumero.
+
+       Cuando el número pedido no existe, ConsultaNumero retorna los números
+       que existen hasta cinco por encima y cinco por debajo, con sus
+       referencias catastrales. Con ``PyCatastro(number_index=NumberIndex())``
+       el cliente guarda todos los números de cada respuesta y los tramos de
+       cada vía de los que conoce todos los números, y responde localmente:
+
+       * los números ya vistos, con la respuesta del servicio cuando el
+         número existe;
+       * los números que no existen si ya se conocen todos los números a
+         cinco por encima y por debajo, con el error del servicio y esos
+         números.
+
+       Así las direcciones de una misma vía consultadas en orden sólo
+       necesitan una consulta cada pocos números.
+    """
+
+    endpoints = frozenset(['ConsultaNumero'])
+
+    def __init__(self):
+        self.stats = {'answered': 0}
+        self._calles = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(c.numeros) for c in self._calles.values())
+
+    @staticmethod
+    def _key(params):
+        return tuple(normalize(params.get(k)) for k in
+                     ('Provincia', 'Municipio', 'TipoVia', 'NomVia'))
+
+    def observe(self, endpoint, params, result):
+        """Guarda los números de una respuesta de ConsultaNumero."""
+
+        pedido = numero(params.get('Numero'))
+        if pedido is None:
+            return
+        root = next(iter(result.values()))
+        error = path(root, 'lerr', 'err')
+        if error is not None and (isinstance(error, list)
+                                  or error.get('cod') != NO_EXISTE):
+            return
+        nodos = []
+        for nump in as_list(path(root, 'numerero', 'nump')):
+            n = numero(path(nump, 'num', 'pnp'))
+            if n is not None:
+                nodos.append((n, nump))
+        if error is None and not nodos:
+            return
+        key = self._key(params)
+        with self._lock:
+            calle = self._calles.get(key)
+            if calle is None:
+                calle = self._calles[key] = _Calle()
+            for n, nump in nodos:
+                calle.add(n, nump)
+            if error is None:
+                calle.complete(pedido, pedido)
+            else:
+                calle.complete(pedido - RANGO, pedido + RANGO)
+
+    def lookup(self, endpoint, params, result_type):
+        """Responde ConsultaNumero si el número o los próximos son conocidos.
+
+           :return: Resultado con la misma estructura que el servicio o
+                    ``None`` si hay que consultarlo
+        """
+
+        pedido = numero(params.get('Numero'))
+        if pedido is None:
+            return None
+        with self._lock:
+            calle = self._calles.get(self._key(params))
+            if calle is None:
+                return None
+            if pedido in calle.nodos:
+                nodos = [calle.nodos[pedido]]
+                existe = True
+            elif calle.covers(pedido - RANGO, pedido + RANGO):
+                nodos = [calle.nodos[n] for n in
+                         calle.between(pedido - RANGO, pedido + RANGO)]
+                existe = False
+            else:
+                return None
+        self.stats['answered'] += 1
+        data = {'control': {'cunum': str(len(nodos)),
+                            'cuerr': '0' if existe else '1'}}
+        if not existe:
+            data['lerr'] = {'err': {'cod': NO_EXISTE,
+                                    'des': 'EL NUMERO NO EXISTE'}}
+        if nodos:
+            data['numerero'] = {'nump': from_list(nodos)}
+        return {'consulta_numerero': data}
@@ -0,0 +1,305 @@
+# coding=utf-8
+"""Enumeración de las parcelas de una zona con un quadtree adaptativo.
+
+Se empieza con una rejilla de celdas de ``start_size`` metros y se
+consulta Consulta_RCCOOR_Distancia en el centro de cada celda. Cada
+consulta que retorna la lista de parcelas del cuadrado de 50 metros (o
+ninguna) cubre ese cuadrado en el :class:`pycatastro.spatial.SpatialIndex`.
+Las celdas que todavía no están cubiertas por los cuadrados de las
+consultas se dividen en cuatro y se consultan de nuevo hasta llegar a
+``min_size``, y las ya cubiertas no se consultan::
+
+    parcelas = sweep(client, 'EPSG:25831',
+                     bbox=(430000, 4581000, 431000, 4582000),
+                     checkpoint='sweep.json')
+
+Con ``checkpoint`` el estado se guarda periódicamente y una nueva
+ejecución con el mismo fichero continúa donde se había quedado.
+"""
+import json
+import os
+import time
+
+from pycatastro.batch import map_batch
+from pycatastro.exceptions import CatastroError
+from pycatastro.models import as_coordenadas
+from pycatastro.spatial import GEOGRAPHIC_SRS, SpatialIndex, normalize_srs
+
+
+FORMAT_VERSION = 1
+
+ENDPOINT = 'Consulta_RCCOOR_Distancia'
+
+
+def point_in_polygon(x, y, polygon):
+    """Cierto si el punto está dentro del polígono (lista de vértices x, y)."""
+
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _segment_in_box(x1, y1, x2, y2, box):
+    # Recorte de Liang-Barsky del segmento con la caja
+    xmin, ymin, xmax, ymax = box
+    dx, dy = x2 - x1, y2 - y1
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x1 - xmin), (dx, xmax - x1),
+                 (-dy, y1 - ymin), (dy, ymax - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+            continue
+        t = float(q) / p
+        if p < 0:
+            t0 = max(t0, t)
+        else:
+            t1 = min(t1, t)
+        if t0 > t1:
+            return False
+    return True
+
+
+def box_intersects_polygon(box, polygon):
+    """Cierto si la caja (xmin, ymin, xmax, ymax) toca el polígono."""
+
+    xmin, ymin, xmax, ymax = box
+    if point_in_polygon((xmin + xmax) / 2.0, (ymin + ymax) / 2.0, polygon):
+        return True
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        (x1, y1), (x2, y2) = polygon[j], polygon[i]
+        if _segment_in_box(x1, y1, x2, y2, box):
+            return True
+        j = i
+    return False
+
+
+class QuadtreeSweep(object):
+    """Recorrido reanudable de las parcelas de una caja o un polígono.
+
+       Requiere un sistema de coordenadas proyectado en metros (por ejemplo
+       ``EPSG:25830``), ya que el cuadrado de Consulta_RCCOOR_Distancia se
+       mide en metros.
+    """
+
+    def __init__(self, client, srs, bbox=None, polygon=None, start_size=400.0,
+                 min_size=25.0, workers=8, checkpoint=None, checkpoint_every=30.0,
+                 retries=2):
+        """Prepara el recorrido, o lo recupera de ``checkpoint`` si existe.
+
+           :param pycatastro.PyCatastro: Cliente para las consultas
+           :param str,int: Sistema de coordenadas proyectado
+           :param tuple: Opcional, caja (xmin, ymin, xmax, ymax)
+           :param list: Opcional, vértices (x, y) del polígono; si no se
+                        indica ``bbox`` se usa su caja
+           :param float: Lado de las celdas iniciales (metros)
+           :param float: Lado mínimo de las celdas (metros)
+           :param int: Consultas simultáneas
+           :param str: Opcional, fichero JSON donde se guarda el estado
+           :param float: Segundos entre dos guardados del estado
+           :param int: Reintentos de una celda antes de abortar
+        """
+
+        srs = normalize_srs(srs)
+        if srs in GEOGRAPHIC_SRS:
+            raise ValueError('A projected SRS is required: %s' % srs)
+        if polygon is not None:
+            polygon = [(float(x), float(y)) for x, y in polygon]
+            if bbox is None:
+                xs, ys = zip(*polygon)
+                bbox = (min(xs), min(ys), max(xs), max(ys))
+        if bbox is None:
+            raise ValueError('A bbox or a polygon is required')
+        self.client = client
+        self.srs = srs
+        self.bbox = tuple(float(v) for v in bbox)
+        self.polygon = polygon
+        self.min_size = float(min_size)
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.retries = retries
+        self.stats = {'queries': 0, 'skipped': 0, 'errors': 0}
+        self._failures = {}
+        if checkpoint and os.path.exists(checkpoint):
+            self._restore(checkpoint)
+        else:
+            self.index = SpatialIndex()
+            self.pending = set(self._tiles(float(start_size)))
+
+    def _tiles(self, size):
+        xmin, ymin, xmax, ymax = self.bbox
+        y = ymin
+        while y < ymax:
+            x = xmin
+            while x < xmax:
+                if self._inside_box((x, y, x + size, y + size)):
+                    yield (x, y, size)
+                x += size
+            y += size
+
+    def _inside_box(self, box):
+        if self.polygon is None:
+            return True
+        return box_intersects_polygon(box, self.polygon)
+
+    def _inside(self, x, y):
+        xmin, ymin, xmax, ymax = self.bbox
+        if not (xmin <= x <= xmax and ymin <= y <= ymax):
+            return False
+        return self.polygon is None or point_in_polygon(x, y, self.polygon)
+
+    @property
+    def parcelas(self):
+        """Parcelas encontradas dentro de la zona, por referencia catastral.
+
+           :rtype: dict
+        """
+
+        xmin, ymin, xmax, ymax = self.bbox
+        half = max(xmax - xmin, ymax - ymin) / 2.0
+        found = self.index.nearby(self.srs, (xmin + xmax) / 2.0,
+                                  (ymin + ymax) / 2.0, half)
+        return dict((p.rc, p) for p in found if self._inside(p.x, p.y))
+
+    def _query(self, x, y):
+        try:
+            result = self.client.Consulta_RCCOOR_Distancia(self.srs, x, y)
+        except CatastroError:
+            return []
+        return as_coordenadas(result)
+
+    def _visit(self, cell, coordenadas):
+        x0, y0, size = cell
+        x, y = x0 + size / 2.0, y0 + size / 2.0
+        self.index.observe(ENDPOINT, {'SRS': self.srs, 'Coordenada_X': x,
+                                      'Coordenada_Y': y}, coordenadas)
+        if not coordenadas:
+            # No hay ninguna parcela en el cuadrado
+            self.index.cover(self.srs, x, y)
+        self.pending.discard(cell)
+        if (self.index.covered(self.srs, x, y, size / 2.0)
+                or size / 2.0 < self.min_size):
+            return
+        half = size / 2.0
+        for cx, cy in ((x0, y0), (x, y0), (x0, y), (x, y)):
+            child = (cx, cy, half)
+            if self._inside_box((cx, cy, cx + half, cy + half)):
+                self.pending.add(child)
+
+    def run(self, max_queries=None, progress=None):
+        """Recorre las celdas pendientes hasta terminar.
+
+           :param int: Opcional, número máximo de consultas de esta ejecución
+           :param callable: Opcional, función a la que se llama con el
+                            recorrido después de cada celda
+           :return: Parcelas encontradas por referencia catastral
+           :rtype: dict
+        """
+
+        queries = 0
+        saved = time.time()
+        try:
+            while self.pending:
+                level = []
+                for cell in sorted(self.pending, key=lambda c: (-c[2], c[1], c[0])):
+                    x0, y0, size = cell
+                    if self.index.covered(self.srs, x0 + size / 2.0,
+                                          y0 + size / 2.0, size / 2.0):
+                        self.pending.discard(cell)
+                        self.stats['skipped'] += 1
+                    else:
+                        level.append(cell)
+                if max_queries is not None:
+                    level = level[:max(0, max_queries - queries)]
+                    if not level:
+                        break
+                results = map_batch(
+                    self._query,
+                    ((c[0] + c[2] / 2.0, c[1] + c[2] / 2.0) for c in level),
+                    workers=self.workers, ordered=False)
+                for r in results:
+                    queries += 1
+                    self.stats['queries'] += 1
+                    cell = level[r.index]
+                    if r.error is not None:
+                        self.stats['errors'] += 1
+                        failures = self._failures.get(cell, 0) + 1
+                        self._failures[cell] = failures
+                        if failures > self.retries:
+                            raise r.error
+                        continue
+                    self._visit(cell, r.result)
+                    if progress is not None:
+                        progress(self)
+                    if (self.checkpoint
+                            and time.time() - saved >= self.checkpoint_every):
+                        self.save()
+                        saved = time.time()
+        finally:
+            if self.checkpoint:
+                self.save()
+        return self.parcelas
+
+    def save(self, filename=None):
+        """Guarda el estado del recorrido en JSON."""
+
+        filename = filename or self.checkpoint
+        data = {
+            'format': FORMAT_VERSION,
+            'srs': self.srs,
+            'bbox': self.bbox,
+            'polygon': self.polygon,
+            'min_size': self.min_size,
+            'pending': sorted(self.pending),
+            'failures': [list(cell) + [n] for cell, n in
+                         sorted(self._failures.items())],
+            'stats': self.stats,
+            'index': self.index.dump(),
+        }
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, filename)
+
+    def _restore(self, filename):
+        with open(filename) as f:
+            data = json.load(f)
+        if data.get('format') != FORMAT_VERSION:
+            raise ValueError('Unsupported checkpoint format: %s' % data.get('format'))
+        if data['srs'] != self.srs:
+            raise ValueError('Checkpoint SRS mismatch: %s' % data['srs'])
+        if tuple(data['bbox']) != self.bbox:
+            raise ValueError('Checkpoint bbox mismatch: %s' % (data['bbox'],))
+        polygon = data.get('polygon')
+        if polygon is not None:
+            polygon = [tuple(p) for p in polygon]
+        if polygon != self.polygon:
+            raise ValueError('Checkpoint polygon mismatch')
+        self.stats.update(data['stats'])
+        self.pending = set(tuple(c) for c in data['pending'])
+        self._failures = dict((tuple(f[:3]), f[3])
+                              for f in data.get('failures', ()))
+        self.index = SpatialIndex.from_dict(data['index'])
+
+
+def sweep(client, srs, bbox=None, polygon=None, **kwargs):
+    """Retorna todas las parcelas de una caja o un polígono.
+
+       Atajo de ``QuadtreeSweep(client, srs, bbox, polygon, ...).run()``.
+
+       :return: :class:`pycatastro.models.Coordenada` por referencia catastral
+       :rtype: dict
+    """
+
+    max_queries = kwargs.pop('max_queries', None)
+    progress = kwargs.pop('progress', None)
+    return QuadtreeSweep(client, srs, bbox, polygon, **kwargs).run(
+        max_queries, progress)
@@ -0,0 +1,43 @@
+# coding=utf-8
+
+
+def as_list(value):
+    """Retorna los elementos de un nodo repetible de la respuesta.
+
+       ``xmltodict`` retorna un diccionario cuando un nodo aparece una sola
+       vez y una lista cuando aparece varias, y ``None`` si no existe.
+
+       :rtype: list
+    """
+
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def from_list(items):
+    """Inverso de :func:`as_list`, retorna la misma forma que ``xmltodict``."""
+
+    if not items:
+        return None
+    if len(items) == 1:
+        return items[0]
+    return items
+
+
+def path(data, *keys):
+    """Retorna ``data[k1][k2]...`` o ``None`` si falta algún nivel."""
+
+    for key in keys:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def normalize(text):
+    """Normaliza un nombre para compararlo con los del Catastro."""
+
+    return ' '.join((text or '').upper().split())
@@ -0,0 +1,105 @@
+# coding=utf-8
+"""Consultas masivas de coordenadas sobre arrays de NumPy.
+
+Requiere ``numpy``.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from pycatastro.batch import map_batch
+from pycatastro.exceptions import CatastroError
+from pycatastro.models import as_coordenadas
+
+
+ResultadoCoordenadas = namedtuple(
+    'ResultadoCoordenadas', ['rc', 'direccion', 'error', 'consultas'])
+"""Resultado de :func:`consulta_rccoor`, alineado con los puntos de entrada.
+
+   ``rc`` y ``direccion`` son arrays de objetos (``None`` donde no hay
+   parcela), ``error`` es un array booleano que indica los puntos cuya
+   consulta ha fallado y ``consultas`` el número de consultas hechas.
+"""
+
+
+def quantize(x, y, tolerance):
+    """Agrupa los puntos en celdas de ``tolerance`` de lado.
+
+       :return: Tupla (índice del primer punto de cada celda, celda de cada
+                punto como índice del array anterior)
+    """
+
+    if tolerance:
+        cells = np.column_stack((np.floor(x / tolerance), np.floor(y / tolerance)))
+    else:
+        cells = np.column_stack((x, y))
+    _, first, inverse = np.unique(cells, axis=0, return_index=True,
+                                  return_inverse=True)
+    return first, inverse.reshape(-1)
+
+
+def consulta_rccoor(client, srs, x, y, tolerance=0, workers=8):
+    """Consulta_RCCOOR para arrays de coordenadas.
+
+       Los puntos se agrupan en una rejilla de ``tolerance`` de lado (en las
+       unidades del sistema de coordenadas) y sólo se consulta un punto de
+       cada celda, de manera que los puntos cercanos de una traza GPS
+       comparten consulta. Las consultas se hacen en paralelo y los
+       resultados se reparten a todos los puntos de cada celda.
+
+       :param pycatastro.PyCatastro: Cliente a utilizar
+       :param str,int: Sistema de coordenadas
+       :param array_like: Coordenadas X
+       :param array_like: Coordenadas Y
+       :param float: Lado de la celda, 0 para agrupar sólo puntos idénticos
+       :param int: Número de hilos
+       :rtype: ResultadoCoordenadas
+    """
+
+    x, y, first, inverse = _cells(x, y, tolerance)
+    items = ((srs, float(x[i]), float(y[i])) for i in first)
+    results = map_batch(client.Consulta_RCCOOR, items, workers, ordered=False)
+    return _collect(results, first, inverse)
+
+
+async def consulta_rccoor_async(client, srs, x, y, tolerance=0, workers=8):
+    """Versión de :func:`consulta_rccoor` para
+       :class:`pycatastro.aio.AsyncPyCatastro`.
+
+       ``workers`` es el máximo de consultas en curso a la vez.
+    """
+
+    from pycatastro.aio import map_batch_async
+
+    x, y, first, inverse = _cells(x, y, tolerance)
+    items = ((srs, float(x[i]), float(y[i])) for i in first)
+    results = [r async for r in map_batch_async(
+        client.Consulta_RCCOOR, items, workers, ordered=False)]
+    return _collect(results, first, inverse)
+
+
+def _cells(x, y, tolerance):
+    x = np.asarray(x, dtype=float).reshape(-1)
+    y = np.asarray(y, dtype=float).reshape(-1)
+    if x.shape != y.shape:
+        raise ValueError('x and y must have the same length')
+    first, inverse = quantize(x, y, tolerance)
+    return x, y, first, inverse
+
+
+def _collect(results, first, inverse):
+    rc = np.full(len(first), None, dtype=object)
+    direccion = np.full(len(first), None, dtype=object)
+    error = np.zeros(len(first), dtype=bool)
+    for result in results:
+        if isinstance(result.error, CatastroError):
+            continue
+        if result.error is not None:
+            error[result.index] = True
+            continue
+        coordenadas = as_coordenadas(result.result)
+        if coordenadas:
+            rc[result.index] = coordenadas[0].rc
+            direccion[result.index] = coordenadas[0].direccion
+    return ResultadoCoordenadas(rc[inverse], direccion[inverse], error[inverse],
+                                len(first))
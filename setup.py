@@ -1,16 +1,30 @@
+import io
+import re
+
 from setuptools import setup, find_packages
 
+# La versión se lee sin importar el paquete, que necesita sus dependencias
+with io.open('pycatastro/version.py', encoding='utf-8') as f:
+    version = re.search(r"__version__ = '([^']+)'", f.read()).group(1)
+
 setup(
     name='pycatastro',
-    version='0.1.4',
+    version=version,
     packages=find_packages(),
     url='https://github.com/gisce/pycatastro',
     license='GPLv3',
+    python_requires='>=3.7',
     author='GISCE-TI, SL',
     author_email='devel@gisce.net',
     install_requires=[
         'requests',
         'xmltodict',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'lxml': ['lxml'],
+        'numpy': ['numpy'],
+        'parquet': ['pyarrow'],
+    },
     description='Module for Spanish Catastro'
 )
@@ -0,0 +1,71 @@
+# coding=utf-8
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from pycatastro.aio import AsyncPyCatastro
+from pycatastro.cache import SqliteCache
+from server import StandinServer, load_payloads
+
+
+@pytest.fixture(scope='module')
+def server():
+    with StandinServer(load_payloads()) as server:
+        yield server
+
+
+class ThreadCache(SqliteCache):
+    """SqliteCache que apunta desde qué hilos se usa."""
+
+    def __init__(self, *args, **kwargs):
+        super(ThreadCache, self).__init__(*args, **kwargs)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super(ThreadCache, self).get(key)
+
+    def set(self, key, value, size):
+        self.threads.append(threading.get_ident())
+        return super(ThreadCache, self).set(key, value, size)
+
+
+def test_sqlite_cache_runs_in_executor(server, tmp_path):
+    cache = ThreadCache(str(tmp_path / 'cache.sqlite'))
+
+    async def main():
+        async with AsyncPyCatastro(base_url=server.url, cache=cache) as client:
+            first = await client.ConsultaProvincia()
+            second = await client.ConsultaProvincia()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0}
+    # get, set y get, ninguno en el hilo del bucle
+    assert len(cache.threads) == 3
+    assert threading.get_ident() not in cache.threads
+
+
+def test_stream_releases_semaphore_while_iterating(server):
+    async def main():
+        async with AsyncPyCatastro(base_url=server.url,
+                                   concurrency=1) as client:
+            stream = client.ConsultaMunicipio_Iter('BARCELONA')
+            first = await stream.__anext__()
+            # Con el iterador a medias la única plaza del semáforo está libre
+            provincias = await asyncio.wait_for(client.ConsultaProvincia(), 5)
+            rest = [m async for m in stream]
+        return first, provincias, rest
+
+    first, provincias, rest = asyncio.run(main())
+    assert 'nm' in first
+    assert provincias
+    assert rest
@@ -0,0 +1,223 @@
+# coding=utf-8
+import os
+
+import pytest
+
+from pycatastro import cache as cache_module
+from pycatastro.cache import (DAY, DEFAULT_TTL, MemoryCache, SqliteCache,
+                              cache_key, endpoint_name)
+
+
+class Clock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+def key(n, endpoint='ConsultaMunicipio'):
+    return cache_key('/OVCCallejero.asmx/' + endpoint, {'Provincia': n})
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache.sqlite')
+
+
+def test_cache_key_normalisation():
+    path = '/OVCCallejero.asmx/ConsultaVia'
+    a = cache_key(path, {'Provincia': ' barcelona', 'Municipio': 'Sabadell ',
+                         'TipoVia': None, 'NombreVia': 'mallorca'})
+    b = cache_key(path, {'NombreVia': 'MALLORCA', 'Municipio': 'SABADELL',
+                         'Provincia': 'BARCELONA'})
+    assert a == b == (path, (('Municipio', 'SABADELL'),
+                             ('NombreVia', 'MALLORCA'),
+                             ('Provincia', 'BARCELONA')))
+    assert cache_key(path, {'Numero': 7}) == cache_key(path, {'Numero': '7'})
+    assert cache_key(path) == cache_key(path, {}) == (path, ())
+    assert endpoint_name(a) == 'ConsultaVia'
+
+
+def test_memory_lru_order(clock):
+    cache = MemoryCache(max_entries=3)
+    for i in range(3):
+        cache.set(key(i), i, 1)
+    # Leer la 0 la hace la más reciente: se expulsa la 1
+    assert cache.get(key(0)) == 0
+    cache.set(key(3), 3, 1)
+    assert cache.get(key(1)) is None
+    assert [cache.get(key(i)) for i in (0, 2, 3)] == [0, 2, 3]
+    # Reescribir una clave también la hace la más reciente
+    cache.set(key(0), 'new', 1)
+    cache.set(key(4), 4, 1)
+    assert cache.get(key(2)) is None
+    assert cache.get(key(0)) == 'new'
+    assert len(cache) == 3
+
+
+def test_memory_max_entries(clock):
+    cache = MemoryCache(max_entries=2)
+    for i in range(5):
+        cache.set(key(i), i, 1)
+    assert len(cache) == 2 and cache.size == 2
+    assert cache.stats['evictions'] == 3
+
+
+def test_memory_max_bytes(clock):
+    cache = MemoryCache(max_bytes=250)
+    for i in range(3):
+        cache.set(key(i), i, 100)
+    assert len(cache) == 2 and cache.size == 200
+    assert cache.get(key(0)) is None
+    # Una entrada mayor que max_bytes no se guarda ni expulsa nada
+    cache.set(key(9), 9, 300)
+    assert cache.get(key(9)) is None
+    assert len(cache) == 2
+    # Reescribir una clave descuenta su tamaño anterior
+    cache.set(key(1), 1, 50)
+    assert cache.size == 150
+    assert cache.stats['evictions'] == 1
+
+
+def test_memory_ttls(clock):
+    cache = MemoryCache(ttl=10)
+    cache.set(key(1, 'ConsultaProvincia'), 'provincias', 1)
+    cache.set(key(1, 'Consulta_DNPRC'), 'inmueble', 1)
+    cache.set(key(1, 'OtraConsulta'), 'otra', 1)
+    clock.now += 10
+    # OtraConsulta usa el ttl por defecto
+    assert cache.get(key(1, 'OtraConsulta')) is None
+    clock.now += DEFAULT_TTL
+    assert cache.get(key(1, 'Consulta_DNPRC')) is None
+    clock.now += 29 * DAY
+    assert cache.get(key(1, 'ConsultaProvincia')) == 'provincias'
+    clock.now += DAY
+    assert cache.get(key(1, 'ConsultaProvincia')) is None
+    # Las caducadas se eliminan al leerlas
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_memory_custom_ttls(clock):
+    cache = MemoryCache(ttl=100, ttls={'ConsultaVia': 5})
+    cache.set(key(1, 'ConsultaVia'), 'vias', 1)
+    cache.set(key(1, 'ConsultaProvincia'), 'provincias', 1)
+    clock.now += 5
+    assert cache.get(key(1, 'ConsultaVia')) is None
+    assert cache.get(key(1, 'ConsultaProvincia')) == 'provincias'
+
+
+def test_memory_stats(clock):
+    cache = MemoryCache(max_entries=1, ttl=10, ttls={})
+    assert cache.get(key(1)) is None
+    cache.set(key(1), 1, 1)
+    assert cache.get(key(1)) == 1
+    assert cache.get(key(1)) == 1
+    cache.set(key(2), 2, 1)
+    assert cache.get(key(1)) is None
+    clock.now += 10
+    assert cache.get(key(2)) is None
+    assert cache.stats == {'hits': 2, 'misses': 3, 'evictions': 1}
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+
+def fill(cache, clock, n, size=100):
+    for i in range(n):
+        cache.set(key(i), b'x' * size, size)
+        clock.now += 1
+
+
+def test_get_set(path, clock):
+    cache = SqliteCache(path)
+    assert cache.get(key(1)) is None
+    cache.set(key(1), b'<xml/>', 6)
+    assert cache.get(cache_key('/OVCCallejero.asmx/ConsultaMunicipio',
+                               {'Provincia': ' 1 '})) == b'<xml/>'
+    assert len(cache) == 1 and cache.size == 6
+    assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0}
+    # Persiste entre instancias
+    assert SqliteCache(path).get(key(1)) == b'<xml/>'
+
+
+def test_ttl_expiry(path, clock):
+    cache = SqliteCache(path, ttl=10, ttls={'ConsultaProvincia': 100})
+    cache.set(key(1), b'a', 1)
+    cache.set(key(2, 'ConsultaProvincia'), b'b', 1)
+    clock.now += 10
+    assert cache.get(key(1)) is None
+    assert cache.get(key(2, 'ConsultaProvincia')) == b'b'
+    clock.now += 90
+    assert cache.get(key(2, 'ConsultaProvincia')) is None
+
+
+def test_purge(path, clock):
+    cache = SqliteCache(path, ttl=10, ttls={})
+    fill(cache, clock, 5)
+    clock.now += 7
+    # Caducan las creadas en 1000, 1001 y 1002
+    assert cache.purge() == 3
+    assert len(cache) == 2
+    assert cache.purge() == 0
+
+
+def test_shrink_removes_oldest(path, clock):
+    cache = SqliteCache(path, max_bytes=250)
+    fill(cache, clock, 5)
+    cache.shrink()
+    assert cache.size == 200
+    assert [cache.get(key(i)) is not None for i in range(5)] == [
+        False, False, False, True, True]
+    assert cache.stats['evictions'] == 3
+
+
+def test_shrink_argument(path, clock):
+    cache = SqliteCache(path, max_bytes=1000)
+    fill(cache, clock, 3)
+    cache.shrink(0)
+    assert len(cache) == 0
+
+
+def test_shrink_without_max_bytes(path, clock):
+    cache = SqliteCache(path, ttl=10, ttls={})
+    fill(cache, clock, 3)
+    clock.now += 7
+    cache.shrink()
+    # Sólo elimina las caducadas
+    assert len(cache) == 2
+
+
+def test_shrink_every_check_every_writes(path, clock):
+    cache = SqliteCache(path, max_bytes=300, check_every=5)
+    fill(cache, clock, 4)
+    assert cache.size == 400
+    fill(cache, clock, 1)
+    assert cache.size == 300
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+def test_reopen_after_fork(path):
+    cache = SqliteCache(path)
+    cache.set(key(1), b'parent', 6)
+    parent = cache.connection
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            if (cache.connection is not parent
+                    and cache.get(key(1)) == b'parent'):
+                cache.set(key(2), b'child', 5)
+                code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert cache.connection is parent
+    assert cache.get(key(2)) == b'child'
@@ -0,0 +1,110 @@
+# coding=utf-8
+import pytest
+
+from pycatastro import PyCatastro
+from pycatastro.crawler import Crawler
+from pycatastro.streets import NO_EXISTE, RANGO, NumberIndex
+
+# Portales de cada vía
+CALLES = {
+    ('CL', 'MALLORCA'): [1, 3, 5, 14],
+    ('CL', 'ARAGO'): [6, 7],
+    ('AV', 'DIAGONAL'): [2, 30],
+}
+
+
+def rc(tv, nv, n):
+    return '%s%02d%04dDF3800F' % (nv[:3], len(tv), n)
+
+
+def nump(tv, nv, n):
+    ref = rc(tv, nv, n)
+    return {'pc': {'pc1': ref[:7], 'pc2': ref[7:]}, 'num': {'pnp': str(n)}}
+
+
+class FakeCatastro(PyCatastro):
+    """Cliente que responde como el servicio a partir de :data:`CALLES`."""
+
+    def __init__(self, **kwargs):
+        super(FakeCatastro, self).__init__(**kwargs)
+        self.requests = []
+
+    def _load(self, path, params, call, key):
+        endpoint = path.rsplit('/', 1)[-1]
+        self.requests.append((endpoint, params))
+        if endpoint == 'ConsultaVia':
+            return {'consulta_callejero': {'callejero': {'calle': [
+                {'dir': {'tv': tv, 'nv': nv}} for tv, nv in sorted(CALLES)]}}}
+        if endpoint == 'Consulta_DNPRC':
+            return {'consulta_dnp': {'bico': {'bi': {'idbi': {'rc': {}}}}}}
+        calle = (params['TipoVia'], params['NomVia'])
+        n = int(params['Numero'])
+        numeros = CALLES[calle]
+        if n in numeros:
+            return {'consulta_numerero': {
+                'control': {'cunum': '1', 'cuerr': '0'},
+                'numerero': {'nump': nump(calle[0], calle[1], n)}}}
+        # Si el número no existe se retornan los que hay a distancia RANGO
+        cerca = [nump(calle[0], calle[1], m) for m in numeros
+                 if abs(m - n) <= RANGO]
+        data = {'control': {'cunum': str(len(cerca)), 'cuerr': '1'},
+                'lerr': {'err': {'cod': NO_EXISTE,
+                                 'des': 'EL NUMERO NO EXISTE'}}}
+        if cerca:
+            data['numerero'] = {'nump': cerca}
+        return {'consulta_numerero': data}
+
+    def numeros(self, nv):
+        return [int(p['Numero']) for e, p in self.requests
+                if e == 'ConsultaNumero' and p['NomVia'] == nv]
+
+
+def crawl(client, filename, max_gap=10):
+    with Crawler(client, filename, 'BARCELONA', 'BARCELONA', units=False,
+                 workers=1, max_gap=max_gap) as crawler:
+        state = crawler.run()
+        found = sorted(key for key, _ in crawler.results('dnprc'))
+    assert state.pending == 0 and state.failed == 0
+    return found
+
+
+def test_gap_walk(tmp_path):
+    client = FakeCatastro()
+    found = crawl(client, str(tmp_path / 'inventario.db'))
+    # Los números que no existen avanzan RANGO + 1 y los que existen uno
+    assert client.numeros('MALLORCA') == [0, 6, 12, 18, 24]
+    assert client.numeros('ARAGO') == [0, 6, 7, 8, 14]
+    # La vía termina cuando el siguiente supera en max_gap al último portal:
+    # el 30 de DIAGONAL queda a más de 10 del 2
+    assert client.numeros('DIAGONAL') == [0, 6, 12]
+    assert found == sorted(rc(tv, nv, n) for (tv, nv), numeros in CALLES.items()
+                           for n in numeros if (nv, n) != ('DIAGONAL', 30))
+
+
+@pytest.mark.parametrize('max_gap, numeros', [
+    (5, [0, 6]),
+    (30, [0, 6, 12, 18, 24, 30, 31, 37, 43, 49, 55]),
+])
+def test_max_gap(tmp_path, max_gap, numeros):
+    client = FakeCatastro()
+    found = crawl(client, str(tmp_path / 'inventario.db'), max_gap)
+    assert client.numeros('DIAGONAL') == numeros
+    assert (rc('AV', 'DIAGONAL', 30) in found) == (30 in numeros)
+
+
+def test_number_index_short_circuit(tmp_path):
+    index = NumberIndex()
+    client = FakeCatastro(number_index=index)
+    first = crawl(client, str(tmp_path / 'primero.db'))
+    # El recorrido nunca pide un número que el índice pueda responder: cada
+    # consulta sale del tramo que cubre la anterior
+    assert index.stats['answered'] == 0
+    assert client.numeros('MALLORCA') == [0, 6, 12, 18, 24]
+    # Un segundo recorrido de las mismas vías se responde entero desde el
+    # índice, sin consultar ConsultaNumero
+    requests = len(client.requests)
+    numeros = len([r for r in client.requests if r[0] == 'ConsultaNumero'])
+    assert crawl(client, str(tmp_path / 'segundo.db')) == first
+    assert [r[0] for r in client.requests[requests:]] == (
+        ['ConsultaVia'] + ['Consulta_DNPRC'] * len(first))
+    assert index.stats['answered'] == numeros
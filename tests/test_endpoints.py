@@ -0,0 +1,194 @@
+# coding=utf-8
+import inspect
+
+import pytest
+
+from pycatastro import PyCatastro
+from pycatastro.endpoints import ENDPOINTS
+
+C = '/OVCCallejero.asmx/'
+K = '/OVCCoordenadas.asmx/'
+
+# Métodos escritos a mano antes del registro: ruta, argumentos (los
+# opcionales con ``=``), parámetros del servicio en el orden de los
+# argumentos y primera línea de la documentación. Las diferencias
+# intencionadas están en OLD_CHANGES.
+OLD = {
+    'ConsultaProvincia': (
+        C + 'ConsultaProvincia', [], [],
+        'Proporciona un listado de las provincias.'),
+    'ConsultaMunicipio': (
+        C + 'ConsultaMunicipio', ['provincia', 'municipio='],
+        ['Provincia', 'Municipio'],
+        'Proporciona un listado de todos los municipios de una provincia.'),
+    'ConsultaVia': (
+        C + 'ConsultaVia', ['provincia', 'municipio', 'tipovia=', 'nombrevia='],
+        ['Provincia', 'Municipio', 'TipoVia', 'NombreVia'],
+        'Proporciona un listado de todas las vías de un municipio.'),
+    'ConsultaNumero': (
+        C + 'ConsultaNumero',
+        ['provincia', 'municipio', 'tipovia', 'nombrevia', 'numero'],
+        ['Provincia', 'Municipio', 'TipoVia', 'NomVia', 'Numero'],
+        'Proporciona la referencia catastral de la finca correspondiente.'),
+    'Consulta_DNPLOC': (
+        C + 'Consulta_DNPLOC',
+        ['provincia', 'municipio', 'sigla', 'calle', 'numero', 'bloque=',
+         'escalera=', 'planta=', 'puerta='],
+        ['Provincia', 'Municipio', 'Sigla', 'Calle', 'Numero', 'Bloque',
+         'Escalera', 'Planta', 'Puerta'],
+        'Proporciona la lista de todos los inmuebles coincidentes o sus datos.'),
+    'Consulta_DNPRC': (
+        C + 'Consulta_DNPRC', ['provincia', 'municipio', 'rc'],
+        ['Provincia', 'Municipio', 'RC'],
+        'Proporciona los datos catastrales no protegidos de un inmueble'),
+    'Consulta_DNPPP': (
+        C + 'Consulta_DNPPP', ['provincia', 'municipio', 'poligono', 'parcela'],
+        ['Provincia', 'Municipio', 'Poligono', 'Parcela'],
+        'Proporciona los datos catastrales no protegidos de un inmueble'),
+    'ConsultaMunicipioCodigos': (
+        C + 'ConsultaMunicipio', ['provincia', 'municipio'],
+        ['Provincia', 'Municipio'],
+        'Proporciona un listado de todos los nombres de los municipios de una'
+        ' provincia.'),
+    'ConsultaViaCodigos': (
+        C + 'ConsultaVia', ['provincia', 'municipio', 'tipovia=', 'nombrevia='],
+        ['Provincia', 'Municipio', 'TipoVia', 'NombreVia'],
+        'Proporciona un listado de las vías de un municipio'),
+    'ConsultaNumeroCodigos': (
+        C + 'ConsultaVia',
+        ['provincia', 'municipio', 'tipovia', 'nombrevia', 'numero'],
+        ['Provincia', 'Municipio', 'TipoVia', 'NomVia', 'Numero'],
+        'Proporciona la referencia catastral de la finca correspondiente.'),
+    'Consulta_DNPLOC_Codigos': (
+        C + 'Consulta_DNPLOC',
+        ['provincia', 'municipio', 'sigla', 'nombrevia', 'numero', 'bloque=',
+         'escalera=', 'planta=', 'puerta='],
+        ['Provincia', 'Municipio', 'Sigla', 'Calle', 'Numero', 'Bloque',
+         'Escalera', 'Planta', 'Puerta'],
+        'Proporciona la lista de todos los inmuebles que coinciden.'),
+    'Consulta_DNPRC_Codigos': (
+        C + 'Consulta_DNPRC', ['provincia', 'municipio', 'rc'],
+        ['Provincia', 'Municipio', 'RC'],
+        'Proporciona los datos catastrales de un inmueble,'),
+    'Consulta_DNPPP_Codigos': (
+        C + 'Consulta_DNPPP', ['provincia', 'municipio', 'poligono', 'parcela'],
+        ['Provincia', 'Municipio', 'Poligono', 'Parcela'],
+        'Proporciona los datos catastrales de un inmueble.'),
+    'Consulta_RCCOOR': (
+        K + 'Consulta_RCCOOR', ['srs', 'x', 'y'],
+        ['SRS', 'Coordenada_X', 'Coordenada_Y'],
+        'A partir de unas coordenadas se obtiene la referencia catastral.'),
+    'Consulta_RCCOOR_Distancia': (
+        K + 'Consulta_RCCOOR_Distancia', ['srs', 'x', 'y'],
+        ['SRS', 'Coordenada_X', 'Coordenada_Y'],
+        'Proporciona la referencia catastral a partir de unas coordenadas.'),
+    'Consulta_CPMRC': (
+        K + 'Consulta_CPMRC', ['provicia', 'municipio', 'srs', 'rc'],
+        ['Provincia', 'Municipio', 'SRS', 'RC'],
+        'Proporciona la localizacion de una parcela.'),
+}
+
+# Cambios respecto a los métodos escritos a mano
+OLD_CHANGES = {
+    # Consultaba ConsultaVia por error
+    'ConsultaNumeroCodigos': {'path': C + 'ConsultaNumero'},
+    # El municipio es opcional como en ConsultaMunicipio
+    'ConsultaMunicipioCodigos': {'args': ['provincia', 'municipio=']},
+    # provicia sigue aceptándose por nombre
+    'Consulta_CPMRC': {'args': ['provincia', 'municipio', 'srs', 'rc']},
+}
+
+
+def expected(name):
+    path, args, keys, summary = OLD[name]
+    changes = OLD_CHANGES.get(name, {})
+    return changes.get('path', path), changes.get('args', args), keys, summary
+
+
+class Recorder(PyCatastro):
+    def _get(self, path, params=None):
+        return path, params
+
+
+@pytest.fixture
+def client():
+    return Recorder()
+
+
+def test_registry_is_complete():
+    assert set(ENDPOINTS) == set(OLD)
+
+
+@pytest.mark.parametrize('name', sorted(OLD))
+def test_path_and_params(client, name):
+    path, args, keys, _ = expected(name)
+    values = ['v%d' % i for i in range(len(args))]
+    result = getattr(client, name)(*values)
+    assert result == (path, dict(zip(keys, values)) or None)
+    assert ENDPOINTS[name].path == path
+
+
+@pytest.mark.parametrize('name', sorted(OLD))
+def test_optional_params(client, name):
+    path, args, keys, _ = expected(name)
+    required = [a for a in args if not a.endswith('=')]
+    values = ['v%d' % i for i in range(len(required))]
+    _, params = getattr(client, name)(*values)
+    assert params == (dict(zip(keys, values + [''] * len(args)))
+                      if args else None)
+
+
+@pytest.mark.parametrize('name', sorted(OLD))
+def test_signature_parity(name):
+    _, args, _, _ = expected(name)
+    signature = inspect.signature(vars(PyCatastro)[name].func)
+    parameters = list(signature.parameters.values())
+    assert parameters[0].name == 'self'
+    assert [p.name + ('=' if p.default is None else '')
+            for p in parameters[1:]] == args
+
+
+@pytest.mark.parametrize('name', sorted(OLD))
+def test_docstring_parity(name):
+    _, args, _, summary = expected(name)
+    method = vars(PyCatastro)[name]
+    for doc in (method.__doc__, method.func.__doc__):
+        lines = [l.strip() for l in doc.strip().splitlines()]
+        assert lines[0].rstrip('.,') == summary.rstrip('.,')
+        assert len([l for l in lines if l.startswith(':param')]) == len(args)
+        assert lines[-2:] == [
+            ':return: Retorna un dicionario con los datos de la consulta',
+            ':rtype: dict']
+    assert method.__name__ == name
+
+
+def test_numero_codigos_calls_consulta_numero(client):
+    path, params = client.ConsultaNumeroCodigos('BARCELONA', 'BARCELONA', 'CL',
+                                                'MALLORCA', 401)
+    assert path == C + 'ConsultaNumero'
+    assert params['Numero'] == '401'
+
+
+@pytest.mark.parametrize('srs, expected', [
+    (25831, 'EPSG:25831'), ('EPSG:4326', 'EPSG:4326'), ('', ''),
+    (None, None),
+])
+def test_cpmrc_srs(client, srs, expected):
+    _, params = client.Consulta_CPMRC('BARCELONA', 'BARCELONA', srs,
+                                      '9872023VH5797S')
+    assert params['SRS'] == expected
+
+
+@pytest.mark.parametrize('name', ['Consulta_RCCOOR', 'Consulta_RCCOOR_Distancia'])
+def test_coordinates_srs(client, name):
+    _, params = getattr(client, name)(25831, 430000.5, 4581000)
+    assert params == {'SRS': 'EPSG:25831', 'Coordenada_X': '430000.5',
+                      'Coordenada_Y': '4581000'}
+
+
+def test_cpmrc_provicia_alias(client):
+    expected = client.Consulta_CPMRC('BARCELONA', 'BARCELONA', '', 'RC')
+    assert client.Consulta_CPMRC(provicia='BARCELONA', municipio='BARCELONA',
+                                 srs='', rc='RC') == expected
+    assert client.Consulta_CPMRC(provincia='BARCELONA', municipio='BARCELONA',
+                                 srs='', rc='RC') == expected
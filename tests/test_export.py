@@ -0,0 +1,46 @@
+# coding=utf-8
+import io
+import os
+
+import pytest
+
+from pycatastro import models
+from pycatastro.export import INMUEBLES, export, flatten
+from pycatastro.parsers import get_parser
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'payloads')
+COLUMNS = [name for name, _ in INMUEBLES]
+
+
+def payload(endpoint):
+    with open(os.path.join(PAYLOADS, endpoint + '.xml'), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('result', ['dict', 'model'])
+def test_rustica_location(result):
+    content = payload('Consulta_DNPPP')
+    if result == 'model':
+        data = models.PARSERS['Consulta_DNPPP'](content)
+    else:
+        data = get_parser('xmltodict').parse(content)
+    row = dict(zip(COLUMNS, next(flatten('Consulta_DNPPP', data))))
+    assert row['clase'] == 'RU'
+    assert (row['poligono'], row['parcela'], row['paraje']) == ('1', '12', 'CAN PUIG')
+    assert row['via'] is None
+
+
+def test_urbana_location():
+    data = get_parser('xmltodict').parse(payload('Consulta_DNPRC'))
+    row = dict(zip(COLUMNS, next(flatten('Consulta_DNPRC', data))))
+    assert (row['tipo_via'], row['via'], row['numero']) == ('CL', 'MALLORCA', '401')
+    assert row['poligono'] is None and row['paraje'] is None
+
+
+def test_export_to_file_object():
+    data = get_parser('xmltodict').parse(payload('Consulta_DNPPP'))
+    f = io.StringIO()
+    assert export([data, None], 'Consulta_DNPPP', f) == 1
+    header, row = f.getvalue().splitlines()
+    assert header.split(',') == COLUMNS
+    assert 'CAN PUIG' in row
@@ -0,0 +1,32 @@
+# coding=utf-8
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from pycatastro import PyCatastro
+from pycatastro.gazetteer import Gazetteer
+from server import StandinServer, load_payloads
+
+
+@pytest.fixture(scope='module')
+def server():
+    with StandinServer(load_payloads()) as server:
+        yield server
+
+
+@pytest.mark.parametrize('result', ['dict', 'model', 'raw'])
+def test_build_with_any_result_type(server, result, tmp_path):
+    client = PyCatastro(base_url=server.url, result=result)
+    gazetteer = Gazetteer.build(client, provincias=['barcelona'], workers=4)
+    # El cliente original no cambia
+    assert client.result == result
+    assert [np for _, np in gazetteer.provincias] == ['BARCELONA']
+    assert len(gazetteer.municipios['BARCELONA']) == 50
+    filename = str(tmp_path / 'callejero.json.gz')
+    gazetteer.save(filename)
+    loaded = Gazetteer.load(filename)
+    vias = loaded.ConsultaVia('BARCELONA', 'ABRERA', nombrevia='MALLORCA')
+    assert vias['consulta_callejero']['callejero']['calle']
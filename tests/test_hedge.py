@@ -0,0 +1,111 @@
+# coding=utf-8
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from pycatastro import PyCatastro
+from pycatastro.hedge import Hedger
+from server import StandinServer
+
+
+class Script(object):
+    """Sustituye el ``random`` del servidor: decide qué consultas son lentas."""
+
+    def __init__(self, *values):
+        self.values = list(values)
+
+    def random(self):
+        return self.values.pop(0) if self.values else 1.0
+
+
+SLOW, FAST = 0.0, 1.0
+
+
+@pytest.fixture
+def server():
+    with StandinServer(slow_fraction=0.5, slow_delay=1.0) as server:
+        yield server
+
+
+def client(server, hedger, calls):
+    # Con una latencia de 50 ms observada, las copias salen a los 50 ms
+    hedger.observe('ConsultaProvincia', 0.05)
+    return PyCatastro(base_url=server.url, hedger=hedger, hooks=[calls.append])
+
+
+def test_deadline():
+    with StandinServer(delay=1.0) as server:
+        client = PyCatastro(base_url=server.url, timeout=0.2)
+        start = time.time()
+        with pytest.raises(requests.Timeout):
+            client.ConsultaProvincia()
+        assert time.time() - start < 0.8
+
+
+def test_hedge_wins_and_cancels_original(server):
+    server.httpd.random = Script(SLOW, FAST)
+    hedger = Hedger(min_samples=1, budget=1.0)
+    calls = []
+    start = time.time()
+    client(server, hedger, calls).ConsultaProvincia()
+    elapsed = time.time() - start
+    hedger.close()
+    # La original sigue en el servidor; el cliente no la ha esperado
+    assert elapsed < 0.5
+    assert calls[0].hedged and calls[0].hedge_won
+    assert hedger.stats['fired'] == 1 and hedger.stats['won'] == 1
+    # Se observa la latencia de la original (al menos hasta la copia), no
+    # la de la copia
+    assert hedger._samples['ConsultaProvincia'][-1] >= 0.05
+
+
+def test_original_wins_and_cancels_hedge():
+    with StandinServer(delay=0.2, slow_fraction=0.5, slow_delay=1.0) as server:
+        server.httpd.random = Script(FAST, SLOW)
+        hedger = Hedger(min_samples=1, budget=1.0, workers=1)
+        calls = []
+        client(server, hedger, calls).ConsultaProvincia()
+        assert calls[0].hedged and not calls[0].hedge_won
+        assert hedger.stats['won'] == 0
+        # La copia se ha cortado: el único hilo del pool queda libre
+        # enseguida en lugar de esperar al segundo que tarda la copia
+        start = time.time()
+        hedger.executor.submit(lambda: None).result()
+        assert time.time() - start < 0.5
+        hedger.close()
+
+
+def test_budget():
+    hedger = Hedger(min_samples=1, budget=0.5)
+    assert not hedger.allow()
+    hedger.observe('ConsultaProvincia', 0.05)
+    hedger.observe('ConsultaProvincia', 0.05)
+    assert hedger.allow()
+    hedger.fired()
+    assert not hedger.allow()
+
+
+def test_no_budget_no_hedge(server):
+    server.httpd.random = Script(SLOW)
+    hedger = Hedger(min_samples=1, budget=0)
+    calls = []
+    start = time.time()
+    client(server, hedger, calls).ConsultaProvincia()
+    assert time.time() - start >= 1.0
+    assert not calls[0].hedged
+    assert hedger.stats['fired'] == 0
+    hedger.close()
+
+
+def test_pool_classes_only_with_hedger():
+    def pool_class(client):
+        adapter = client.session.get_adapter('http://')
+        return adapter.poolmanager.pool_classes_by_scheme['http']
+
+    assert pool_class(PyCatastro()).__module__.startswith('urllib3')
+    assert pool_class(PyCatastro(hedger=Hedger())).__module__ == 'pycatastro.hedge'
@@ -0,0 +1,112 @@
+# coding=utf-8
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from pycatastro.jobs import DONE, FAILED, JobQueue, LeaseLost, Worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'cola.db'))
+    queue.add_many('Consulta_DNPRC', [
+        ('BARCELONA', 'BARCELONA', '9872023VH5797S0001WX'),
+        ('BARCELONA', 'BARCELONA', '9872023VH5797S0002EM'),
+    ])
+    yield queue
+    queue.close()
+
+
+def test_expired_lease_is_taken_over(queue):
+    stale = queue.lease('a', ttl=-1)
+    fresh = queue.lease('b', ttl=60)
+    assert fresh.shard == stale.shard
+    assert fresh.token != stale.token
+    assert queue.lease('c') is None
+
+
+def test_stale_owner_cannot_renew_or_release(queue):
+    stale = queue.lease('a', ttl=-1)
+    fresh = queue.lease('b', ttl=60)
+    assert not queue.renew(stale)
+    assert not queue.release(stale)
+    assert queue.renew(fresh)
+    assert queue.release(fresh)
+
+
+def test_live_lease_is_not_taken(queue):
+    queue.lease('a', ttl=60)
+    assert queue.lease('b') is None
+
+
+def test_finish_does_not_overwrite_done(queue):
+    lease = queue.lease('a')
+    key = queue.pending(lease.shard, 1)[0][0]
+    queue.finish('a', [(key, {'primero': True})], [], retries=3)
+    queue.finish('b', [(key, {'primero': False})], [], retries=3)
+    queue.finish('b', [], [(key, ValueError('tarde'))], retries=0)
+    results = [result for _, _, result in queue.results('Consulta_DNPRC')]
+    assert results == [{'primero': True}]
+    assert queue.counts()['jobs'][DONE] == 1
+
+
+def test_shard_fails_after_max_leases(queue):
+    for owner in ('a', 'b'):
+        assert queue.lease(owner, ttl=-1, max_leases=2) is not None
+    assert queue.lease('c', max_leases=2) is None
+    assert queue.counts()['shards'][FAILED] == 1
+
+
+class StealingClient(object):
+    """Cliente cuya primera consulta deja el shard a otro worker.
+
+       La segunda consulta falla.
+    """
+
+    result = 'dict'
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def Consulta_DNPRC(self, provincia, municipio, rc):
+        with self.lock:
+            self.calls.append(rc)
+            n = len(self.calls)
+        if n == 1:
+            conn = sqlite3.connect(self.filename)
+            with conn:
+                conn.execute('UPDATE shards SET token = token + 1')
+            conn.close()
+        # El heartbeat detecta la pérdida mientras las consultas siguen en
+        # curso
+        time.sleep(0.5)
+        if n == 2:
+            raise ValueError('respuesta incorrecta')
+        return {'rc': rc}
+
+
+def test_lease_lost_finishes_in_flight_calls(tmp_path):
+    filename = str(tmp_path / 'cola.db')
+    queue = JobQueue(filename)
+    queue.add_many('Consulta_DNPRC', [
+        ('BARCELONA', 'BARCELONA', 'RC%02d' % i) for i in range(10)])
+    lease = queue.lease('a', ttl=0.3)
+    client = StealingClient(filename)
+    worker = Worker(client, filename, name='a', workers=2, lease=0.3)
+    with pytest.raises(LeaseLost):
+        worker.process(lease)
+    worker.close()
+    # Sólo se han hecho las dos consultas que estaban en curso
+    assert len(client.calls) == 2
+    done = [result for _, _, result in queue.results('Consulta_DNPRC')]
+    errors = queue.conn.execute(
+        'SELECT COUNT(*) FROM jobs WHERE attempts > 0').fetchone()[0]
+    queue.close()
+    # Los resultados se guardan; el error no cuenta, el shard es de otro
+    assert done == [{'rc': client.calls[0]}]
+    assert errors == 0
+    assert worker.stats['lost'] == 1
@@ -0,0 +1,103 @@
+# coding=utf-8
+import os
+
+import pytest
+
+from pycatastro import models
+from pycatastro.exceptions import CatastroError
+from pycatastro.parsers import get_parser
+from pycatastro.utils import as_list, path
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'payloads')
+
+
+def payload(endpoint):
+    with open(os.path.join(PAYLOADS, endpoint + '.xml'), 'rb') as f:
+        return f.read()
+
+
+def parse(endpoint):
+    content = payload(endpoint)
+    root = get_parser('xmltodict').parse(content)
+    return models.PARSERS[endpoint](content), next(iter(root.values()))
+
+
+def rc(node):
+    return ''.join(v or '' for v in node.values()) or None
+
+
+def test_municipios():
+    result, root = parse('ConsultaMunicipio')
+    nodes = as_list(path(root, 'municipiero', 'muni'))
+    assert len(result) == len(nodes) == 50
+    for municipio, node in zip(result, nodes):
+        assert municipio.to_dict() == node
+
+
+def test_vias():
+    result, root = parse('ConsultaVia')
+    nodes = as_list(path(root, 'callejero', 'calle'))
+    assert [v.to_dict() for v in result] == nodes
+
+
+@pytest.mark.parametrize('endpoint', ['Consulta_DNPRC', 'Consulta_DNPPP'])
+def test_inmueble(endpoint):
+    result, root = parse(endpoint)
+    node = path(root, 'bico')
+    inmueble, = result
+    assert inmueble.rc == rc(path(node, 'bi', 'idbi', 'rc'))
+    assert inmueble.clase == path(node, 'bi', 'idbi', 'cn')
+    assert inmueble.provincia == path(node, 'bi', 'dt', 'np')
+    assert inmueble.direccion == path(node, 'bi', 'ldt')
+    sfc = path(node, 'bi', 'debi', 'sfc')
+    assert inmueble.superficie == (int(sfc) if sfc else None)
+    # El nodo completo se procesa a demanda
+    assert inmueble.to_dict() == node
+    assert inmueble.construcciones == as_list(path(node, 'lcons', 'cons'))
+
+
+def test_parcelas():
+    result, root = parse('Consulta_DNPLOC')
+    nodes = as_list(path(root, 'lrcdnp', 'rcdnp'))
+    assert len(result) == len(nodes) > 1
+    for parcela, node in zip(result, nodes):
+        assert isinstance(parcela, models.Parcela)
+        assert parcela.rc == rc(node['rc'])
+        assert parcela.municipio == path(node, 'dt', 'nm')
+        assert parcela.to_dict() == node
+
+
+@pytest.mark.parametrize('endpoint', [
+    'Consulta_RCCOOR', 'Consulta_RCCOOR_Distancia', 'Consulta_CPMRC'])
+def test_coordenadas(endpoint):
+    content = payload(endpoint)
+    result = models.PARSERS[endpoint](content)
+    expected = models.as_coordenadas(get_parser('xmltodict').parse(content))
+    assert result and result == expected
+
+
+def test_first_error_is_raised():
+    content = (b'<?xml version="1.0" encoding="utf-8"?>'
+               b'<consulta_dnp xmlns="http://www.catastro.meh.es/">'
+               b'<control><cuerr>2</cuerr></control><lerr>'
+               b'<err><cod>12</cod><des>LA PROVINCIA NO EXISTE</des></err>'
+               b'<err><cod>13</cod><des>EL MUNICIPIO NO EXISTE</des></err>'
+               b'</lerr></consulta_dnp>')
+    with pytest.raises(CatastroError) as error:
+        models.parse_inmuebles(content)
+    assert (error.value.code, error.value.description) == (
+        '12', 'LA PROVINCIA NO EXISTE')
+
+
+def test_text_input_and_empty_result():
+    content = payload('ConsultaVia').decode('utf-8')
+    assert len(models.parse_vias(content)) == 480
+    assert models.parse_vias(b'<consulta_callejero><control/>'
+                             b'</consulta_callejero>') == []
+
+
+def test_raw_node_without_whitespace():
+    content = payload('Consulta_DNPRC')
+    inmueble, = models.parse_inmuebles(content)
+    assert inmueble._raw.startswith(b'<bico><bi><idbi>')
+    assert b'>\n' not in inmueble._raw
@@ -0,0 +1,27 @@
+# coding=utf-8
+import os
+
+from pycatastro.pipeline import ParsePool
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'payloads')
+
+
+def payload(endpoint):
+    with open(os.path.join(PAYLOADS, endpoint + '.xml'), 'rb') as f:
+        return f.read()
+
+
+def test_processes_are_not_forked():
+    with ParsePool(processes=1) as pool:
+        method = pool.executor._mp_context.get_start_method()
+        assert method in ('forkserver', 'spawn')
+
+
+def test_parse_batch():
+    content = payload('Consulta_DNPRC')
+    with ParsePool(output='rows', processes=1, batch_size=2) as pool:
+        futures = [pool.submit('Consulta_DNPRC', content),
+                   pool.submit('Consulta_DNPRC', b'<roto')]
+        rows = futures[0].result(timeout=30)
+        assert futures[1].exception(timeout=30) is not None
+    assert rows and rows[0][0] == '9872023VH5797S0001WX'
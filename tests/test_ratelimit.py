@@ -0,0 +1,122 @@
+# coding=utf-8
+import asyncio
+
+import pytest
+import requests
+
+from pycatastro.exceptions import CatastroError
+from pycatastro.metrics import Call
+from pycatastro.ratelimit import RateLimiter, TokenBucket, transport_error
+
+CALLEJERO = '/OVCCallejero.asmx/ConsultaProvincia'
+COORDENADAS = '/OVCCoordenadas.asmx/Consulta_RCCOOR'
+
+
+class Clock(object):
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def call(status=200, error=None, latency=0.0):
+    c = Call('ConsultaProvincia')
+    c.status = status
+    c.error = error
+    c.connect = latency
+    return c
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_token_bucket(clock):
+    bucket = TokenBucket(rate=2, burst=1, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert not bucket.try_reserve()
+    clock.now += 1.5
+    assert bucket.try_reserve()
+
+
+def test_slow_start_doubles_per_second(clock):
+    limiter = RateLimiter(rate=5, clock=clock)
+    for _ in range(5):
+        limiter.feedback(CALLEJERO, call())
+    # Un segundo de consultas a 5/s dobla la tasa
+    assert limiter.rates()['OVCCallejero'] == 10
+
+
+def test_additive_increase_after_first_decrease(clock):
+    limiter = RateLimiter(rate=10, increase=2.0, decrease=0.5, clock=clock)
+    limiter.feedback(CALLEJERO, call(503))
+    assert limiter.rates()['OVCCallejero'] == 5
+    # Un segundo de consultas a 5/s suma ``increase``
+    for _ in range(5):
+        limiter.feedback(CALLEJERO, call())
+    assert limiter.rates()['OVCCallejero'] == pytest.approx(7, rel=0.05)
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_multiplicative_decrease(clock, status):
+    limiter = RateLimiter(rate=10, decrease=0.7, clock=clock)
+    limiter.feedback(CALLEJERO, call(status))
+    assert limiter.rates()['OVCCallejero'] == pytest.approx(7)
+    assert limiter.stats['decreases'] == 1
+    # Cada servicio tiene su tasa
+    limiter.feedback(COORDENADAS, call())
+    assert limiter.rates()['OVCCoordenadas'] == 11
+
+
+def test_cooldown(clock):
+    limiter = RateLimiter(rate=10, decrease=0.5, cooldown=1.0, min_rate=1,
+                          clock=clock)
+    limiter.feedback(CALLEJERO, call(503))
+    clock.now += 0.5
+    limiter.feedback(CALLEJERO, call(503))
+    assert limiter.rates()['OVCCallejero'] == 5
+    assert limiter.stats == {'throttled': 2, 'decreases': 1, 'waited': 0.0}
+    clock.now += 0.6
+    limiter.feedback(CALLEJERO, call(503))
+    assert limiter.rates()['OVCCallejero'] == 2.5
+    for _ in range(5):
+        clock.now += 1
+        limiter.feedback(CALLEJERO, call(503))
+    assert limiter.rates()['OVCCallejero'] == 1
+
+
+def test_latency_target(clock):
+    limiter = RateLimiter(rate=10, decrease=0.5, latency_target=1.0,
+                          clock=clock)
+    limiter.feedback(CALLEJERO, call(latency=0.5))
+    limiter.feedback(CALLEJERO, call(latency=2.0))
+    assert limiter.rates()['OVCCallejero'] == 5.5
+
+
+def test_service_errors_do_not_throttle(clock):
+    limiter = RateLimiter(rate=10, clock=clock)
+    limiter.feedback(CALLEJERO, call(error=CatastroError('43', 'NO EXISTE')))
+    limiter.feedback(CALLEJERO, call(error=ValueError('XML')))
+    assert limiter.rates()['OVCCallejero'] == 12
+    limiter.feedback(CALLEJERO, call(None, requests.ConnectionError()))
+    assert limiter.stats['decreases'] == 1
+
+
+@pytest.mark.parametrize('error', [
+    ConnectionError(), ConnectionResetError(), TimeoutError(),
+    asyncio.TimeoutError(), requests.ConnectionError(), requests.Timeout(),
+    requests.ReadTimeout(),
+])
+def test_transport_errors(error):
+    assert transport_error(error)
+
+
+@pytest.mark.parametrize('error', [
+    CatastroError('43', 'EL NUMERO NO EXISTE'), ValueError('XML'),
+    KeyError('lerr'), requests.HTTPError(),
+])
+def test_not_transport_errors(error):
+    assert not transport_error(error)
@@ -0,0 +1,78 @@
+# coding=utf-8
+from pycatastro.models import as_coordenadas
+from pycatastro.spatial import SpatialIndex
+
+SRS = 'EPSG:25831'
+
+
+def params(x, y):
+    return {'SRS': SRS, 'Coordenada_X': str(x), 'Coordenada_Y': str(y)}
+
+
+def distancia(*parcelas):
+    return {'consulta_coordenadas_distancias': {
+        'control': {'cucoor': str(len(parcelas)), 'cuerr': '0'},
+        'coordenadas_distancias': {'coordd': {'lpcd': {'pcd': [
+            {'pc': {'pc1': rc[:7], 'pc2': rc[7:]},
+             'geo': {'xcen': str(x), 'ycen': str(y), 'srs': SRS},
+             'ldt': 'CL MALLORCA %s' % rc, 'dis': '%.2f' % dis}
+            for rc, x, y, dis in parcelas
+        ]}}},
+    }}
+
+
+def test_cover_then_covered():
+    index = SpatialIndex()
+    for x, y in ((1005, 2005), (1003.7, 2001.2), (1000, 2000)):
+        index.cover(SRS, x, y)
+        assert index.covered(SRS, x, y)
+
+
+def test_not_covered():
+    index = SpatialIndex()
+    index.cover(SRS, 1005, 2005)
+    assert not index.covered(SRS, 1030, 2005)
+    assert not index.covered('EPSG:25830', 1005, 2005)
+    # En coordenadas geográficas no se calcula cobertura
+    index.cover('EPSG:4326', 2.16, 41.39)
+    assert not index.covered('EPSG:4326', 2.16, 41.39)
+
+
+def test_union_of_squares_is_covered():
+    index = SpatialIndex()
+    index.cover(SRS, 1000, 2000)
+    index.cover(SRS, 1040, 2000)
+    assert index.covered(SRS, 1020, 2000)
+
+
+def test_lookup_repeated_distancia():
+    index = SpatialIndex(answer=True)
+    result = distancia(('9872023DF3897S', 1010.0, 2004.0, 10.8),
+                       ('9872024DF3897S', 995.0, 1990.0, 18.0))
+    endpoint = 'Consulta_RCCOOR_Distancia'
+    assert index.lookup(endpoint, params(1003.7, 2001.2), 'dict') is None
+    index.observe(endpoint, params(1003.7, 2001.2), result)
+    answer = index.lookup(endpoint, params(1003.7, 2001.2), 'dict')
+    assert [c.rc for c in as_coordenadas(answer)] == [
+        '9872023DF3897S', '9872024DF3897S']
+    models = index.lookup(endpoint, params(1003.7, 2001.2), 'model')
+    assert [c.rc for c in models] == ['9872023DF3897S', '9872024DF3897S']
+    assert index.stats['answered'] == 2
+    assert index.lookup(endpoint, params(1100, 2001.2), 'dict') is None
+    assert index.lookup('Consulta_RCCOOR', params(1003.7, 2001.2), 'dict') is None
+
+
+def test_lookup_disabled():
+    index = SpatialIndex()
+    endpoint = 'Consulta_RCCOOR_Distancia'
+    index.observe(endpoint, params(1000, 2000),
+                  distancia(('9872023DF3897S', 1010.0, 2004.0, 10.8)))
+    assert index.covered(SRS, 1000, 2000)
+    assert index.lookup(endpoint, params(1000, 2000), 'dict') is None
+
+
+def test_dump_keeps_coverage():
+    index = SpatialIndex()
+    index.cover(SRS, 1005, 2005)
+    copy = SpatialIndex.from_dict(index.dump())
+    assert copy.covered(SRS, 1005, 2005)
@@ -0,0 +1,61 @@
+# coding=utf-8
+from pycatastro.streets import NO_EXISTE, NumberIndex
+
+CALLE = {'Provincia': 'BARCELONA', 'Municipio': 'BARCELONA',
+         'TipoVia': 'CL', 'NomVia': 'MALLORCA'}
+
+
+def params(numero, **extra):
+    params = dict(CALLE, Numero=str(numero))
+    params.update(extra)
+    return params
+
+
+def nump(numero):
+    return {'pc': {'pc1': '%07d' % numero, 'pc2': 'DF3800F'},
+            'num': {'pnp': str(numero)}}
+
+
+def no_existe(*numeros):
+    return {'consulta_numerero': {
+        'control': {'cunum': str(len(numeros)), 'cuerr': '1'},
+        'lerr': {'err': {'cod': NO_EXISTE, 'des': 'EL NUMERO NO EXISTE'}},
+        'numerero': {'nump': [nump(n) for n in numeros]},
+    }}
+
+
+def numeros(result):
+    nodos = result['consulta_numerero']['numerero']['nump']
+    if not isinstance(nodos, list):
+        nodos = [nodos]
+    return [int(n['num']['pnp']) for n in nodos]
+
+
+def test_covered_miss_is_answered():
+    index = NumberIndex()
+    index.observe('ConsultaNumero', params(10), no_existe(6, 7, 9, 11, 15))
+    index.observe('ConsultaNumero', params(20), no_existe(15, 17, 23))
+    # 9..19 está dentro de los tramos conocidos 5..15 y 15..25
+    result = index.lookup('ConsultaNumero', params(14), 'dict')
+    assert result['consulta_numerero']['lerr']['err']['cod'] == NO_EXISTE
+    assert numeros(result) == [9, 11, 15, 17]
+    assert index.stats['answered'] == 1
+
+
+def test_known_number_is_answered():
+    index = NumberIndex()
+    index.observe('ConsultaNumero', params(10), no_existe(6, 7, 9, 11, 15))
+    result = index.lookup('ConsultaNumero', params(9), 'dict')
+    assert 'lerr' not in result['consulta_numerero']
+    assert numeros(result) == [9]
+
+
+def test_uncovered_miss_is_not_answered():
+    index = NumberIndex()
+    index.observe('ConsultaNumero', params(10), no_existe(6, 7, 9, 11, 15))
+    # 3..13 no está cubierto del todo
+    assert index.lookup('ConsultaNumero', params(8), 'dict') is None
+    assert index.lookup('ConsultaNumero', params(16), 'dict') is None
+    assert index.lookup('ConsultaNumero', params(10, NomVia='ARAGO'),
+                        'dict') is None
+    assert index.stats['answered'] == 0
@@ -0,0 +1,101 @@
+# coding=utf-8
+import json
+import math
+
+import pytest
+
+from pycatastro.exceptions import CatastroError
+from pycatastro.models import Coordenada
+from pycatastro.sweep import QuadtreeSweep, sweep
+
+SRS = 'EPSG:25831'
+
+
+class FakeClient(object):
+    """Consulta_RCCOOR_Distancia sobre una lista de parcelas (rc, x, y)."""
+
+    def __init__(self, parcelas, fail=()):
+        self.parcelas = parcelas
+        self.fail = set(fail)
+        self.calls = []
+
+    def Consulta_RCCOOR_Distancia(self, srs, x, y):
+        self.calls.append((x, y))
+        if (x, y) in self.fail:
+            self.fail.discard((x, y))
+            raise IOError('connection reset')
+        found = [Coordenada(rc, str(px), str(py), srs, rc,
+                            '%.2f' % max(math.hypot(px - x, py - y), 0.01))
+                 for rc, px, py in self.parcelas
+                 if abs(px - x) <= 25 and abs(py - y) <= 25]
+        if not found:
+            raise CatastroError('21', 'NO HAY PARCELAS')
+        return found
+
+
+# Parcelas lejos del centro de la celda de 400 m: la primera consulta no
+# encuentra nada
+PARCELAS = [('0000001DF0000A', 30.0, 30.0), ('0000002DF0000A', 370.0, 370.0),
+            ('0000003DF0000A', 210.0, 60.0)]
+
+
+def test_sweep_finds_parcels_away_from_the_centre():
+    client = FakeClient(PARCELAS)
+    found = sweep(client, SRS, bbox=(0, 0, 400, 400), workers=1)
+    assert sorted(found) == sorted(rc for rc, _, _ in PARCELAS)
+    # Ninguna consulta repetida
+    assert len(client.calls) == len(set(client.calls))
+
+
+def test_sweep_polygon_filters_parcels():
+    client = FakeClient(PARCELAS)
+    found = sweep(client, SRS, polygon=[(0, 0), (400, 0), (0, 400)],
+                  start_size=200, workers=1)
+    assert sorted(found) == ['0000001DF0000A', '0000003DF0000A']
+
+
+def test_checkpoint_resume(tmp_path):
+    checkpoint = str(tmp_path / 'sweep.json')
+    full = FakeClient(PARCELAS)
+    expected = sweep(full, SRS, bbox=(0, 0, 400, 400), workers=1)
+
+    first = FakeClient(PARCELAS)
+    partial = QuadtreeSweep(first, SRS, bbox=(0, 0, 400, 400), workers=1,
+                            checkpoint=checkpoint)
+    partial.run(max_queries=10)
+    assert partial.pending
+
+    second = FakeClient(PARCELAS)
+    resumed = QuadtreeSweep(second, SRS, bbox=(0, 0, 400, 400), workers=1,
+                            checkpoint=checkpoint)
+    assert sorted(resumed.run()) == sorted(expected)
+    assert len(first.calls) + len(second.calls) == len(full.calls)
+    assert resumed.stats['queries'] == len(full.calls)
+
+
+def test_checkpoint_keeps_failures(tmp_path):
+    checkpoint = str(tmp_path / 'sweep.json')
+    client = FakeClient(PARCELAS, fail=[(200.0, 200.0)])
+    partial = QuadtreeSweep(client, SRS, bbox=(0, 0, 400, 400), workers=1,
+                            checkpoint=checkpoint)
+    partial.run(max_queries=1)
+    with open(checkpoint) as f:
+        assert json.load(f)['failures'] == [[0.0, 0.0, 400.0, 1]]
+    resumed = QuadtreeSweep(client, SRS, bbox=(0, 0, 400, 400),
+                            checkpoint=checkpoint)
+    assert resumed._failures == {(0.0, 0.0, 400.0): 1}
+
+
+def test_checkpoint_of_another_zone(tmp_path):
+    checkpoint = str(tmp_path / 'sweep.json')
+    client = FakeClient(PARCELAS)
+    QuadtreeSweep(client, SRS, bbox=(0, 0, 400, 400),
+                  checkpoint=checkpoint).run(max_queries=1)
+    with pytest.raises(ValueError):
+        QuadtreeSweep(client, SRS, bbox=(0, 0, 800, 800), checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        QuadtreeSweep(client, SRS, polygon=[(0, 0), (400, 0), (400, 400),
+                                            (0, 400)], checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        QuadtreeSweep(client, 'EPSG:25830', bbox=(0, 0, 400, 400),
+                      checkpoint=checkpoint)